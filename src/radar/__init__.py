@@ -1,5 +1,7 @@
 __version__ = "1.6"
 
+import sys
+import types
 import importlib
 
 from typing import TYPE_CHECKING
@@ -8,17 +10,50 @@ from .common import *
 
 
 _sub_ = ["chart", "cosmetics", "product"]
-_misc_ = ["print", "FIFOBuffer"]
-_read_ = ["read", "read_tarinfo", "set_logger"]
-_write_ = ["write"]
+_misc_ = ["print", "open", "ChunkAssembler", "FIFOBuffer", "Sweep", "read_many"]
+_read_ = [
+    "read",
+    "read_tarinfo",
+    "read_volume",
+    "iter_volume",
+    "raw2ind",
+    "raw2ind_table",
+    "raw2val",
+    "raw2val_table",
+    "quantize",
+    "val2ind",
+    "cache_info",
+    "cache_clear",
+    "set_cache_size",
+    "set_logger",
+    "sweep_from_radials",
+    "post_process",
+]
+_write_ = ["write", "write_bytes", "write_volume", "SweepWriter"]
 
 if TYPE_CHECKING:
-    from .read import read, read_tarinfo, set_logger
-    from .write import write
+    from .read import read, read_tarinfo, read_volume, iter_volume, set_logger
+    from .read import raw2ind, raw2ind_table, raw2val, raw2val_table, quantize, val2ind
+    from .read import cache_info, cache_clear, set_cache_size, sweep_from_radials, post_process
+    from .write import write, write_bytes, write_volume, SweepWriter
+    from .assembler import ChunkAssembler
+    from .batch import read_many
+    from .sweep import Sweep
     from .fifobuffer import FIFOBuffer
     from .cosmetics import dict_print as print
+    from .read import open_sweep as open
     from . import chart, cosmetics, product
 
+class _Package(types.ModuleType):
+    # The import system binds a submodule to the package when it is loaded, also through another submodule or
+    # "from radar.read import ...", but radar.read and radar.write are the functions, not the modules
+    def __setattr__(self, name, value):
+        if name in ("read", "write") and isinstance(value, types.ModuleType):
+            return
+        super().__setattr__(name, value)
+
+sys.modules[__name__].__class__ = _Package
+
 def __dir__():
     return sorted(list(globals().keys()) + _sub_ + _read_ + _write_ +_misc_)
 
@@ -37,11 +72,31 @@ def __getattr__(name):
         value = getattr(module, name)
         globals()[name] = value
         return value
+    elif name == "ChunkAssembler":
+        module = importlib.import_module(".assembler", __name__)
+        value = module.ChunkAssembler
+        globals()[name] = value
+        return value
+    elif name == "Sweep":
+        module = importlib.import_module(".sweep", __name__)
+        value = module.Sweep
+        globals()[name] = value
+        return value
+    elif name == "read_many":
+        module = importlib.import_module(".batch", __name__)
+        value = module.read_many
+        globals()[name] = value
+        return value
     elif name == "FIFOBuffer":
         module = importlib.import_module(".fifobuffer", __name__)
         value = module.FIFOBuffer
         globals()[name] = value
         return value
+    elif name == "open":
+        module = importlib.import_module(".read", __name__)
+        value = module.open_sweep
+        globals()[name] = value
+        return value
     elif name == "print":
         module = importlib.import_module(".cosmetics", __name__)
         value = module.dict_print
@@ -0,0 +1,171 @@
+import os
+import logging
+import datetime
+import numpy as np
+
+from typing import List, Optional
+
+from .cosmetics import colorize
+from .nexrad import (
+    RADIAL_STATUS_END_OF_ELEVATION,
+    RADIAL_STATUS_END_OF_VOLUME,
+    Radials,
+    _blob_from_content,
+    _nrays_from_vcp,
+    _scan_messages,
+    _timestamp_from_volume_header,
+    re_parts_stripped,
+)
+from .read import post_process, sweep_from_radials
+
+logger = logging.getLogger("radar-data")
+
+
+class ChunkAssembler:
+    """
+    Assembles sweeps from the stripped L2 chunks of a NEXRAD volume as they arrive
+
+    Each chunk is decompressed and scanned once. A sweep is emitted as soon as the radial
+    with the end-of-elevation (or end-of-volume) status has arrived and the sweep has all
+    the radials of the VCP, or when a later sweep has ended, i.e., a chunk went missing.
+    Radials are put in the order of their azimuth numbers, so chunks may arrive out of
+    order, and the radials of a chunk that arrives twice are used once.
+
+    assembler = ChunkAssembler(symbols=["Z", "V"])
+    for file in incoming_files:
+        for sweep in assembler.add(file):
+            ...
+    """
+
+    def __init__(
+        self, symbols=["Z", "V", "W", "D", "P", "R"], partial=False, u8=False, finite=False, masked=True, verbose=0
+    ):
+        """
+        :param symbols: Products to assemble.
+        :param partial: If True, add() also returns the sweep in progress, marked with "partial": True.
+        :param u8: Convert values to uint8 as in read().
+        :param finite: Convert NaN to 0 as in read().
+        :param masked: Products as masked arrays, False for float32 arrays with NaN as in read().
+        :param verbose: Verbosity level.
+        """
+        self.symbols = symbols
+        self.partial = partial
+        self.u8 = u8
+        self.finite = finite
+        self.masked = masked
+        self.verbose = verbose
+        self.reset()
+
+    def reset(self):
+        """
+        Discards the state of the current volume
+        """
+        self.key = None
+        self.vcp = None
+        self.timestamp: Optional[float] = None
+        # Sweep of the latest radial
+        self.sweep_index: Optional[int] = None
+        # (blob, offsets, azimuth numbers) pieces of each sweep that is not emitted yet
+        self.pieces = {}
+        # Sweeps with their last radial, and sweeps that are emitted
+        self.ended = set()
+        self.emitted = set()
+
+    def add(self, source: str | bytes | bytearray | memoryview) -> List[dict]:
+        """
+        Adds a chunk, either a path to a -S / -I / -E file or its content
+
+        :return: A list of sweeps completed by this chunk, in the same layout as read().
+        """
+        myname = colorize("ChunkAssembler.add()", "green")
+        if isinstance(source, str):
+            parts = re_parts_stripped.match(os.path.basename(source))
+            if parts is None:
+                raise ValueError(f"{myname} Invalid filename format: {source}")
+            parts = parts.groupdict()
+            key = (parts["icao"], parts["time"], parts["scan"])
+            if key != self.key:
+                self.reset()
+                self.key = key
+                timestamp = datetime.datetime.strptime(parts["time"], r"%Y%m%d-%H%M%S")
+                self.timestamp = timestamp.replace(tzinfo=datetime.timezone.utc).timestamp()
+            if self.verbose > 1:
+                logger.debug(f"{myname} {colorize(source, 'yellow')}")
+            with open(source, "rb") as f:
+                content = f.read()
+        else:
+            content = bytes(source)
+            if content[:6] == b"AR2V00" and self.vcp is not None:
+                # A volume header with another time in raw bytes marks a new volume
+                if _timestamp_from_volume_header(content) != self.timestamp:
+                    self.reset()
+        if content[:6] == b"AR2V00" and self.timestamp is None:
+            self.timestamp = _timestamp_from_volume_header(content)
+        blob = _blob_from_content(content)
+        vcp, offsets = _scan_messages(blob)
+        if vcp is not None:
+            self.vcp = vcp
+        if len(offsets):
+            self._split(blob, offsets)
+        output = self._flush()
+        if self.partial and self.sweep_index in self.pieces and self.vcp is not None and self.timestamp is not None:
+            sweep = self._sweep(self.sweep_index)
+            sweep["partial"] = True
+            output.append(sweep)
+        return output
+
+    def _split(self, blob: bytearray, offsets: np.ndarray):
+        """
+        Distributes the radials of a chunk to their sweeps, radials of emitted sweeps are dropped
+        """
+        myname = colorize("ChunkAssembler._split()", "green")
+        radials = Radials(blob, offsets)
+        indices = radials.elevation_numbers - 1
+        ends = np.isin(radials.radial_status, [RADIAL_STATUS_END_OF_ELEVATION, RADIAL_STATUS_END_OF_VOLUME])
+        for sweep_index in np.unique(indices).tolist():
+            rows = indices == sweep_index
+            if sweep_index in self.emitted:
+                logger.debug(f"{myname} Dropped {np.sum(rows)} radials of sweep {sweep_index}, already emitted")
+                continue
+            self.pieces.setdefault(sweep_index, []).append((blob, offsets[rows], radials.azimuth_numbers[rows]))
+            if np.any(ends[rows]):
+                self.ended.add(sweep_index)
+        self.sweep_index = int(indices[-1])
+
+    def _flush(self) -> List[dict]:
+        if self.vcp is None or self.timestamp is None:
+            return []
+        nrays = _nrays_from_vcp(self.vcp)
+        last = max(self.ended, default=-1)
+        output = []
+        for sweep_index in sorted(self.pieces):
+            count = len(np.unique(np.concatenate([numbers for _, _, numbers in self.pieces[sweep_index]])))
+            complete = sweep_index in self.ended and count >= nrays[min(sweep_index, len(nrays) - 1)]
+            if complete or sweep_index < last:
+                output.append(self._sweep(sweep_index))
+                del self.pieces[sweep_index]
+                self.emitted.add(sweep_index)
+        return output
+
+    def _sweep(self, sweep_index: int) -> dict:
+        pieces = self.pieces[sweep_index]
+        if len(pieces) == 1:
+            blob, offsets, numbers = pieces[0]
+        else:
+            blobs, shifted, origin = [], [], 0
+            for blob, offsets, _ in pieces:
+                blobs.append(blob)
+                shifted.append(offsets + origin)
+                origin += len(blob)
+            blob, offsets = bytearray().join(blobs), np.concatenate(shifted)
+            numbers = np.concatenate([numbers for _, _, numbers in pieces])
+        radials = Radials(blob, offsets)
+        # Radials in the order of their azimuth numbers, once each
+        _, order = np.unique(numbers, return_index=True)
+        if not np.array_equal(order, np.arange(len(numbers))):
+            radials = radials[order]
+        sweep = sweep_from_radials(
+            self.vcp, radials, self.timestamp, sweep_index, symbols=self.symbols, masked=self.masked
+        )
+        post_process(sweep, u8=self.u8, finite=self.finite)
+        return sweep
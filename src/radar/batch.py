@@ -0,0 +1,243 @@
+import os
+import atexit
+import signal
+import logging
+import collections
+import numpy as np
+import concurrent.futures
+
+from multiprocessing import resource_tracker, shared_memory
+from typing import Iterable, Iterator, Optional, Tuple
+
+from .cosmetics import colorize
+from .sweep import Sweep, aligned_empty
+
+logger = logging.getLogger("radar-data")
+
+# Arrays are placed on this alignment in the shared memory block
+ALIGNMENT = 64
+
+_pool: Optional[concurrent.futures.ProcessPoolExecutor] = None
+_pool_workers = 0
+
+
+class _Array:
+    """
+    Placeholder of an array in a shared memory block
+    """
+
+    __slots__ = ("offset", "dtype", "shape", "mask", "fill_value")
+
+    def __init__(self, offset, dtype, shape, mask=None, fill_value=None):
+        self.offset = offset
+        self.dtype = dtype
+        self.shape = shape
+        self.mask = mask
+        self.fill_value = fill_value
+
+
+class _Sweep:
+    """
+    Placeholder of a Sweep, its block is one array in the shared memory block
+    """
+
+    __slots__ = ("header", "block")
+
+    def __init__(self, header, block):
+        self.header = header
+        self.block = block
+
+
+def _pack(obj, arrays):
+    # Replaces arrays with placeholders, arrays collects (placeholder, array) to copy
+    if isinstance(obj, Sweep):
+        header, _ = obj.to_buffer()
+        placeholder = _Array(0, obj.block.dtype.str, obj.block.shape)
+        arrays.append((placeholder, obj.block))
+        return _Sweep(header, placeholder)
+    if isinstance(obj, dict):
+        return {key: _pack(value, arrays) for key, value in obj.items()}
+    if isinstance(obj, tuple):
+        return tuple(_pack(value, arrays) for value in obj)
+    if isinstance(obj, np.ndarray) and obj.dtype.hasobject is False:
+        if np.ma.isMaskedArray(obj):
+            mask = np.ma.getmask(obj)
+            placeholder = _Array(0, obj.dtype.str, obj.shape, fill_value=obj.fill_value)
+            arrays.append((placeholder, np.ma.getdata(obj)))
+            if mask is not np.ma.nomask:
+                placeholder.mask = _Array(0, mask.dtype.str, mask.shape)
+                arrays.append((placeholder.mask, mask))
+            return placeholder
+        placeholder = _Array(0, obj.dtype.str, obj.shape)
+        arrays.append((placeholder, obj))
+        return placeholder
+    return obj
+
+
+def _unpack(obj, block):
+    if isinstance(obj, _Sweep):
+        return Sweep.from_buffer(obj.header, _unpack(obj.block, block))
+    if isinstance(obj, dict):
+        return {key: _unpack(value, block) for key, value in obj.items()}
+    if isinstance(obj, tuple):
+        return tuple(_unpack(value, block) for value in obj)
+    if isinstance(obj, _Array):
+        dtype = np.dtype(obj.dtype)
+        count = int(np.prod(obj.shape, dtype=np.int64))
+        array = block[obj.offset : obj.offset + count * dtype.itemsize].view(dtype).reshape(obj.shape)
+        if obj.fill_value is None:
+            return array
+        mask = np.ma.nomask if obj.mask is None else _unpack(obj.mask, block)
+        return np.ma.array(array, mask=mask, fill_value=obj.fill_value, copy=False)
+    return obj
+
+
+def _initializer():
+    # Warm up the workers with the readers, interrupts are handled by the parent
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    from . import read  # noqa: F401
+
+
+def _read_to_shared_memory(path, kwargs):
+    from .read import read
+
+    output = read(path, **kwargs)
+    arrays = []
+    head = _pack(output, arrays)
+    size = 0
+    for placeholder, array in arrays:
+        placeholder.offset = size
+        size += (array.nbytes + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+    if size == 0:
+        return head, None, 0
+    shm = shared_memory.SharedMemory(create=True, size=size)
+    try:
+        block = np.ndarray((size,), dtype=np.uint8, buffer=shm.buf)
+        for placeholder, array in arrays:
+            view = block[placeholder.offset : placeholder.offset + array.nbytes]
+            view.view(array.dtype).reshape(array.shape)[...] = array
+        del block, view
+    except Exception:
+        shm.close()
+        shm.unlink()
+        raise
+    shm.close()
+    # The parent takes over the block, it is registered again when the parent attaches to it
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return head, shm.name, size
+
+
+def _collect(future):
+    # Copies the block out of shared memory once and releases it, the arrays are views of the copy
+    head, name, size = future.result()
+    if name is None:
+        return _unpack(head, None)
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        block = aligned_empty(size)
+        block[:] = np.ndarray((size,), dtype=np.uint8, buffer=shm.buf)
+    finally:
+        shm.close()
+        shm.unlink()
+    return _unpack(head, block)
+
+
+def _discard(future):
+    if future.cancel() or future.exception() is not None:
+        return
+    _, name, _ = future.result()
+    if name is None:
+        return
+    shm = shared_memory.SharedMemory(name=name)
+    shm.close()
+    shm.unlink()
+
+
+def _get_pool(workers):
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != workers:
+        shutdown()
+        _pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_initializer)
+        _pool_workers = workers
+    return _pool
+
+
+def shutdown():
+    """
+    Stops the worker processes of read_many(), they are started again on demand
+    """
+    global _pool, _pool_workers
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+    _pool, _pool_workers = None, 0
+
+
+atexit.register(shutdown)
+
+
+def read_many(
+    paths: Iterable[str], workers: Optional[int] = None, ordered: bool = False, **kwargs
+) -> Iterator[Tuple[str, Optional[dict]]]:
+    """
+    read_many(paths, workers=None, ordered=False, **kwargs):
+
+    Read many files with radar.read() in a pool of worker processes.
+
+    Parameters:
+    paths: iterable of str - Paths to the files
+    workers: int - Number of worker processes, default = None for os.cpu_count()
+    ordered: bool - Yield in the order of paths, default = False for the order of completion
+
+    Other keyword arguments are passed to radar.read()
+
+    Yields (path, sweep) where sweep is None if the file could not be read. The arrays of a
+    sweep come back through a shared memory block instead of a pickle. The pool stays up for
+    the next call until shutdown() or the end of the program.
+
+    for path, sweep in radar.read_many(files, workers=8, symbols=["Z", "V"]):
+        ...
+    """
+    myname = colorize("radar.read_many()", "green")
+    workers = workers or os.cpu_count() or 1
+    pool = _get_pool(workers)
+    # Enough reads in flight to keep the workers busy without piling up shared memory blocks
+    depth = 2 * workers
+    paths = iter(paths)
+    pending = {}
+    queue = collections.deque()
+
+    def submit():
+        for path in paths:
+            future = pool.submit(_read_to_shared_memory, path, kwargs)
+            pending[future] = path
+            if ordered:
+                queue.append(future)
+            return True
+        return False
+
+    def result(future):
+        path = pending.pop(future)
+        try:
+            return path, _collect(future)
+        except Exception as e:
+            logger.error(f"{myname} Failed to read {path}   e = {e}")
+            return path, None
+
+    try:
+        while len(pending) < depth and submit():
+            pass
+        while pending:
+            if ordered:
+                done = [queue.popleft()]
+            else:
+                done, _ = concurrent.futures.wait(list(pending), return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                submit()
+                yield result(future)
+    finally:
+        # The caller stopped early, release what the workers already put in shared memory
+        for future in pending:
+            try:
+                _discard(future)
+            except Exception:
+                pass
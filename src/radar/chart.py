@@ -463,8 +463,8 @@ class _ChartLayout:
             if "map" in kwargs:
                 value = kwargs["map"](sweep["products"][symbol])
                 cmap = kwargs.get("cmap", blib.colormap.matplotlibColormap("zmapx"))
-                vmin = kwargs.get("vmin", np.min(value.flatten()))
-                vmax = kwargs.get("vmax", np.max(value.flatten()))
+                vmin = kwargs.get("vmin", np.ma.min(np.ma.masked_invalid(value)))
+                vmax = kwargs.get("vmax", np.ma.max(np.ma.masked_invalid(value)))
             elif symbol[0] == "Z":
                 value = sweep["products"][symbol]
                 cmap = blib.colormap.matplotlibColormap("rsz")
@@ -501,8 +501,8 @@ class _ChartLayout:
             else:
                 value = sweep["products"][symbol]
                 cmap = kwargs.get("cmap", blib.colormap.matplotlibColormap("zmapx"))
-                vmin = kwargs.get("vmin", np.min(value.flatten()))
-                vmax = kwargs.get("vmax", np.max(value.flatten()))
+                vmin = kwargs.get("vmin", np.ma.min(np.ma.masked_invalid(value)))
+                vmax = kwargs.get("vmax", np.ma.max(np.ma.masked_invalid(value)))
             self.ms[k] = ax.pcolormesh(xx, yy, value, cmap=cmap, vmin=vmin, vmax=vmax, **props)
         self._update_limits(sweep["sweepMode"], np.hypot(np.max(np.abs(xx)), np.max(np.abs(yy))), **kwargs)
 
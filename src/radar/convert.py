@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import sys
+import glob
+import time
+import signal
+import logging
+import argparse
+import textwrap
+import concurrent.futures
+
+srcDir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../src"))
+if os.path.exists(srcDir):
+    sys.path.insert(0, srcDir)
+
+import radar
+
+from radar.nexrad import is_nexrad_format, re_parts_stripped
+
+__prog__ = "radar-convert"
+logger = logging.getLogger(__prog__)
+
+# Extensions of the tar archives, e.g., PX-20240529-150246-E4.0.txz
+TAR_EXTENSIONS = (".tar.xz", ".txz", ".tgz", ".tar")
+
+
+def is_source(path):
+    """
+    Whether a file is a NEXRAD volume or a tar archive. A stripped NEXRAD volume is
+    represented by its start chunk, e.g., KTLX-20250426-121335-999-1-S
+    """
+    basename = os.path.basename(path)
+    if basename.endswith(TAR_EXTENSIONS):
+        return True
+    parts = re_parts_stripped.match(basename)
+    if parts:
+        return parts.group("flag") == "S"
+    try:
+        return is_nexrad_format(path)
+    except Exception:
+        return False
+
+
+def find_sources(paths):
+    """
+    Expands globs and directories into a sorted list of sources, directories are walked recursively
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for folder, _, names in os.walk(path):
+                files += [os.path.join(folder, name) for name in names]
+        elif glob.glob(path):
+            files += glob.glob(path)
+        else:
+            logger.warning(f"No files match {path}")
+    return sorted({file for file in files if os.path.isfile(file) and is_source(file)})
+
+
+def source_files(source):
+    """
+    The files that make up a source, all chunks of a stripped NEXRAD volume or the source itself
+    """
+    folder, basename = os.path.split(source)
+    parts = re_parts_stripped.match(basename)
+    if parts is None:
+        return [source]
+    pattern = f"{parts.group('icao')}-{parts.group('time')}-{parts.group('scan')}-*"
+    return glob.glob(os.path.join(folder, pattern)) or [source]
+
+
+def output_stem(source, folder=None):
+    """
+    Path of the outputs without the sweep suffix, next to the source if folder is None
+    """
+    source_folder, basename = os.path.split(source)
+    parts = re_parts_stripped.match(basename)
+    if parts:
+        stem = f"{parts.group('icao')}-{parts.group('time')}-{parts.group('scan')}"
+    else:
+        stem = re.sub("|".join(re.escape(ext) + "$" for ext in TAR_EXTENSIONS), "", basename)
+    return os.path.join(source_folder if folder is None else folder, stem)
+
+
+def is_volume(source):
+    return not os.path.basename(source).endswith(TAR_EXTENSIONS)
+
+
+def output_name(stem, index, volume):
+    # A tar archive is a single sweep and keeps the stem, sweeps of a volume are numbered by their sweep index
+    return f"{stem}-{index:02d}.nc" if volume else f"{stem}.nc"
+
+
+def first_output(source, folder=None):
+    """
+    The output of sweep 0, which is moved into place last, its presence marks a complete conversion
+    """
+    return output_name(output_stem(source, folder), 0, is_volume(source))
+
+
+def is_up_to_date(source, folder=None):
+    output = first_output(source, folder)
+    if not os.path.exists(output):
+        return False
+    return os.path.getmtime(output) >= max(os.path.getmtime(file) for file in source_files(source))
+
+
+def convert(source, folder=None, symbols=["Z", "V", "W", "D", "P", "R"], **encoding):
+    """
+    Converts a source to CF-Radial files, a NEXRAD volume is decoded once for all its sweeps
+
+    Sweeps are written to hidden files and moved into place afterwards, the first sweep last.
+
+    :return: A tuple of (source, number of sweeps, bytes read, bytes written)
+    """
+    stem = output_stem(source, folder)
+    head, tail = os.path.split(stem)
+    temps, outputs = [], []
+    try:
+        for index, sweep in radar.iter_volume(source, symbols=symbols, masked=False, want_index=True):
+            if sweep is None:
+                continue
+            temp = os.path.join(head, f".{tail}-{index:02d}.nc")
+            temps.append(temp)
+            outputs.append(output_name(stem, index, is_volume(source)))
+            radar.write(temp, sweep, **encoding)
+    except Exception:
+        for temp in temps:
+            if os.path.exists(temp):
+                os.remove(temp)
+        raise
+    if not temps:
+        raise ValueError(f"No sweeps in {source}")
+    for temp, output in reversed(list(zip(temps, outputs))):
+        os.replace(temp, output)
+    size = sum(os.path.getsize(file) for file in source_files(source))
+    return source, len(outputs), size, sum(os.path.getsize(output) for output in outputs)
+
+
+def _initializer():
+    # Interrupts are handled by the parent, which cancels the pending sources
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def get_chunks(string):
+    if string is None or string == "sweep":
+        return string
+    chunks = tuple(int(value) for value in string.split(","))
+    return chunks[0] if len(chunks) == 1 else chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog=__prog__,
+        formatter_class=argparse.RawTextHelpFormatter,
+        description=textwrap.dedent(
+            f"""\
+        Converts NEXRAD volumes and tar archives to CF-Radial
+
+        Examples:
+            {__prog__} -v /mnt/data/KTLX/20250217
+            {__prog__} -j 16 -p u1 -z 4 -o /mnt/data/cfradial "/mnt/data/PX1000/2024/*/*.txz"
+        """
+        ),
+        epilog="Copyright (c) Boonleng Cheong",
+    )
+    parser.add_argument("source", nargs="+", help="files, globs or directories")
+    parser.add_argument("-c", "--chunks", type=str, default=None, help="chunks, sweep, rays or rays,gates")
+    parser.add_argument("-f", "--force", action="store_true", help="convert outputs that are up to date")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="number of worker processes")
+    parser.add_argument("-o", "--output", type=str, default=None, help="output directory")
+    parser.add_argument("-p", "--packing", type=str, default="i2", choices=["u1", "i2", "f4"], help="packing")
+    parser.add_argument("-s", "--symbols", type=str, default="ZVWDPR", help="symbols")
+    parser.add_argument("-z", "--complevel", type=int, default=0, help="compression level 0-9")
+    parser.add_argument("-v", dest="verbose", default=0, action="count", help="increases verbosity")
+    parser.add_argument("--version", action="version", version="%(prog)s " + radar.__version__)
+    args = parser.parse_args()
+
+    logging.basicConfig(format=radar.cosmetics.log_format, level=logging.DEBUG if args.verbose > 1 else logging.INFO)
+    if args.verbose < 2:
+        logging.getLogger("radar-data").setLevel(logging.WARNING)
+
+    sources = find_sources(args.source)
+    if not args.force:
+        count = len(sources)
+        sources = [source for source in sources if not is_up_to_date(source, args.output)]
+        if count > len(sources):
+            logger.info(f"Skipping {count - len(sources):,d} sources that are up to date")
+    if not sources:
+        logger.info("Nothing to convert")
+        return
+    if args.output:
+        os.makedirs(args.output, exist_ok=True)
+
+    workers = args.workers or os.cpu_count() or 1
+    options = dict(folder=args.output, symbols=list(args.symbols), packing=args.packing, complevel=args.complevel)
+    options["chunks"] = get_chunks(args.chunks)
+    logger.info(f"Converting {len(sources):,d} sources with {workers} workers ...")
+
+    done, failed, sweeps, size_in, size_out = 0, 0, 0, 0, 0
+    tic = time.time()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_initializer) as pool:
+        futures = {pool.submit(convert, source, **options): source for source in sources}
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    source, count, size, output_size = future.result()
+                except Exception as e:
+                    logger.error(f"Failed to convert {futures[future]}   e = {e}")
+                    failed += 1
+                    continue
+                done += 1
+                sweeps += count
+                size_in += size
+                size_out += output_size
+                if args.verbose:
+                    logger.info(f"{source} -> {count} sweeps   {done:,d} / {len(sources):,d}")
+        except KeyboardInterrupt:
+            logger.info("KeyboardInterrupt ...")
+            pool.shutdown(wait=True, cancel_futures=True)
+    elapsed = max(time.time() - tic, 1.0e-6)
+
+    logger.info(
+        f"Converted {done:,d} sources ({sweeps:,d} sweeps) in {elapsed:.2f} s"
+        f"   {done / elapsed:.2f} files/s"
+        f"   {size_in / elapsed * 1.0e-6:.2f} MB/s in"
+        f"   {size_out / elapsed * 1.0e-6:.2f} MB/s out"
+    )
+    if failed:
+        logger.error(f"Failed to convert {failed:,d} sources")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import collections.abc
+
+from typing import Callable, Dict, List
+
+
+class LazyProducts(collections.abc.MutableMapping):
+    """
+    Products that are read and converted on first access
+
+    Each symbol has a loader, which is called once when the symbol is indexed. Products
+    that are assigned directly are kept as they are.
+    """
+
+    def __init__(self, loaders: Dict[str, Callable] = {}):
+        self._loaders = dict(loaders)
+        self._values = {}
+
+    def __getitem__(self, key):
+        if key in self._values:
+            return self._values[key]
+        if self._loaders is None:
+            raise ValueError(f"Unable to load {key}, the source is closed")
+        value = self._loaders[key]()
+        self._values[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        self._values[key] = value
+
+    def __delitem__(self, key):
+        found = self._values.pop(key, None) is not None
+        if self._loaders is not None and self._loaders.pop(key, None) is not None:
+            found = True
+        if not found:
+            raise KeyError(key)
+
+    def __iter__(self):
+        keys = list(self._loaders or {}) + [key for key in self._values if key not in (self._loaders or {})]
+        return iter(keys)
+
+    def __len__(self):
+        return len(set(self._loaders or {}) | set(self._values))
+
+    def __repr__(self):
+        return f"LazyProducts({list(self)}, loaded={list(self._values)})"
+
+    def is_loaded(self, key) -> bool:
+        return key in self._values
+
+    def set_loader(self, key, loader: Callable):
+        """
+        Sets the function that loads a product on first access
+        """
+        self._values.pop(key, None)
+        self._loaders[key] = loader
+
+    def merge(self, other):
+        """
+        Adds the products of another mapping without loading them
+        """
+        if isinstance(other, LazyProducts):
+            self._loaders.update(other._loaders or {})
+            self._values.update(other._values)
+        else:
+            self._values.update(other)
+
+    def release(self):
+        """
+        Drops the loaders, products that are not loaded yet can no longer be loaded
+        """
+        self._loaders = None
+
+
+class SweepHandle(collections.abc.Mapping):
+    """
+    A sweep with the same keys as the dictionary from read(), where products are loaded on
+    first access. The source, i.e., NetCDF datasets or a decompressed buffer, stays open until
+    close() is called.
+
+    with radar.open(file) as sweep:
+        print(sweep["time"], sweep["sweepElevation"])
+        z = sweep["products"]["Z"]
+    """
+
+    def __init__(self, sweep: dict, resources: List = []):
+        self._sweep = sweep
+        self._resources = list(resources)
+
+    def __getitem__(self, key):
+        return self._sweep[key]
+
+    def __iter__(self):
+        return iter(self._sweep)
+
+    def __len__(self):
+        return len(self._sweep)
+
+    def __repr__(self):
+        state = "closed" if self.closed else "open"
+        return f"SweepHandle({list(self._sweep)}, {state})"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def closed(self) -> bool:
+        return self._resources is None
+
+    def load(self) -> dict:
+        """
+        Loads all products and returns a sweep dictionary, which remains valid after close()
+        """
+        sweep = dict(self._sweep)
+        sweep["products"] = {key: value for key, value in self._sweep["products"].items()}
+        return sweep
+
+    def close(self):
+        if self._resources is None:
+            return
+        products = self._sweep["products"]
+        if isinstance(products, LazyProducts):
+            products.release()
+        for resource in self._resources:
+            if hasattr(resource, "close"):
+                resource.close()
+        self._resources = None
@@ -1,10 +1,13 @@
 import sys
 import zlib
 import threading
+import numpy as np
 
-from typing import Optional
+from typing import Any, Hashable, NamedTuple, Optional
 from collections import OrderedDict
 
+from .sweep import Sweep
+
 lock = threading.Lock()
 
 
@@ -58,3 +61,134 @@ class LRUCache:
         s = "s" if count > 1 else ""
         total = get_size(self.cache)
         return f"{count} item{s}   {total:,d} B"
+
+
+def _base_nbytes(array):
+    base = array.base
+    if base is None:
+        return 0
+    try:
+        return memoryview(base).nbytes
+    except TypeError:
+        return 0
+
+
+def _freeze(obj):
+    # Arrays become read-only, containers are rebuilt so that the caller can add or replace entries
+    if isinstance(obj, Sweep):
+        obj.block.flags.writeable = False
+        return obj.view()
+    if isinstance(obj, dict):
+        return {key: _freeze(value) for key, value in obj.items()}
+    if isinstance(obj, list):
+        return [_freeze(value) for value in obj]
+    if isinstance(obj, tuple):
+        return tuple(_freeze(value) for value in obj)
+    if isinstance(obj, np.ndarray):
+        if _base_nbytes(np.ma.getdata(obj)) > obj.nbytes:
+            # A view of a larger buffer, e.g., the decompressed records, would keep all of it
+            obj = obj.copy()
+        if np.ma.isMaskedArray(obj):
+            mask = np.ma.getmask(obj)
+            if mask is not np.ma.nomask:
+                mask.flags.writeable = False
+        obj.flags.writeable = False
+    return obj
+
+
+def _view(obj):
+    # A new set of containers around the same read-only arrays
+    if isinstance(obj, Sweep):
+        return obj.view()
+    if isinstance(obj, dict):
+        return {key: _view(value) for key, value in obj.items()}
+    if isinstance(obj, list):
+        return [_view(value) for value in obj]
+    if isinstance(obj, tuple):
+        return tuple(_view(value) for value in obj)
+    return obj
+
+
+def _nbytes(obj):
+    if isinstance(obj, Sweep):
+        return obj.nbytes
+    if isinstance(obj, dict):
+        return sum(_nbytes(value) for value in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(_nbytes(value) for value in obj)
+    if isinstance(obj, np.ndarray):
+        mask = np.ma.getmask(obj)
+        return obj.nbytes + (0 if mask is np.ma.nomask else mask.nbytes)
+    return 0
+
+
+class SweepCacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    count: int
+    nbytes: int
+    max_bytes: int
+
+
+class SweepCache:
+    """
+    A LRU cache of sweeps bounded by the total size of their arrays
+
+    The arrays of a sweep are made read-only when it is stored. Every get() returns new
+    dictionaries, or a new Sweep, around those arrays, so the caller may add or replace keys
+    but cannot change the values in place. Use np.array(value) for a copy that can be modified.
+    """
+
+    def __init__(self, max_bytes: int = 512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.cache = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self.lock:
+            if key not in self.cache:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return _view(self.cache[key][0])
+
+    def put(self, key: Hashable, value: Any) -> Any:
+        """
+        Stores a value and returns a view of it, values larger than max_bytes are not stored
+        """
+        value = _freeze(value)
+        nbytes = _nbytes(value)
+        with self.lock:
+            if key in self.cache:
+                self.nbytes -= self.cache.pop(key)[1]
+            if nbytes <= self.max_bytes:
+                self.cache[key] = (value, nbytes)
+                self.nbytes += nbytes
+            self._evict()
+        return _view(value)
+
+    def resize(self, max_bytes: int):
+        with self.lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def info(self) -> SweepCacheInfo:
+        with self.lock:
+            return SweepCacheInfo(self.hits, self.misses, len(self.cache), self.nbytes, self.max_bytes)
+
+    def _evict(self):
+        # Remove the least recently used items until the total size fits
+        while self.nbytes > self.max_bytes and self.cache:
+            _, (_, nbytes) = self.cache.popitem(last=False)
+            self.nbytes -= nbytes
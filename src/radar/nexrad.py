@@ -33,6 +33,8 @@ import re
 import bz2
 import glob
 import json
+import base64
+import hashlib
 import struct
 import logging
 import datetime
@@ -40,6 +42,7 @@ import urllib.request
 import numpy as np
 
 from typing import List, Tuple, Optional
+from concurrent.futures import ThreadPoolExecutor
 
 from .cosmetics import colorize
 
@@ -68,9 +71,64 @@ MESSAGE_5_OFFSET = EMPTY_BYTE_COUNT + META_DATA_SIZE - 2 * METADATA_RECORD_SIZE
 # Metadata Record is a variable number of compressed records containing 120 radial messages (type 31)
 RADIALS_PER_RECORD = 120
 
+# Generic data blocks (Table XVII-B) and the symbols they are read as
+GENERIC_BLOCK_NAMES = ["REF", "VEL", "SW", "ZDR", "PHI", "RHO", "CFP"]
+MOMENT_SYMBOLS = {"REF": "Z", "VEL": "V", "SW": "W", "ZDR": "D", "PHI": "P", "RHO": "R"}
+
+# Radial status (Table XVII-A) that starts or terminates an elevation
+RADIAL_STATUS_START_OF_ELEVATION = 0
+RADIAL_STATUS_END_OF_ELEVATION = 2
+RADIAL_STATUS_START_OF_VOLUME = 3
+RADIAL_STATUS_END_OF_VOLUME = 4
+RADIAL_STATUS_START_OF_LAST_ELEVATION = 5
+
+# Version of the persistent index format, bump to invalidate existing indices
+INDEX_VERSION = 1
+
 # The wavelength of the NEXRAD radar signal in meters
 NEXRAD_WAVELENGTH = 0.10
 
+# Big-endian structured dtypes to read the headers of all radials at once
+# Pages 3-87, Table XVII-A Data Header Block (Message Type 31)
+TYPE31_HEADER_DTYPE = np.dtype(
+    [
+        ("icao", "S4"),
+        ("timestamp_ms", ">u4"),
+        ("timestamp", ">u2"),
+        ("azimuth_number", ">u2"),
+        ("azimuth_angle", ">f4"),
+        ("compress_flag", "u1"),
+        ("spare_0", "u1"),
+        ("radial_length", ">u2"),
+        ("azimuth_resolution", "u1"),
+        ("radial_status", "u1"),
+        ("elevation_number", "i1"),
+        ("cut_sector", "u1"),
+        ("elevation_angle", ">f4"),
+        ("radial_blanking", "u1"),
+        ("azimuth_mode", "i1"),
+        ("block_count", ">u2"),
+        ("block_pointers", ">u4", (9,)),
+    ]
+)
+# Page 3-90, Table XVII-B Data Block for REF, VEL, SW, ZDR, PHI, RHO, and CFP
+GENERIC_BLOCK_DTYPE = np.dtype(
+    [
+        ("type", "S1"),
+        ("name", "S3"),
+        ("reserved", ">u4"),
+        ("ngates", ">u2"),
+        ("r0", ">i2"),
+        ("dr", ">i2"),
+        ("thr", ">i2"),
+        ("snr_thr", ">i2"),
+        ("flags", "u1"),
+        ("word_size", "u1"),
+        ("scale", ">f4"),
+        ("offset", ">f4"),
+    ]
+)
+
 # Find the blob directory to retrieve NEXRAD locations
 FILE_DIR = os.path.dirname(__file__)
 BASE_DIR = os.path.dirname(FILE_DIR)
@@ -393,20 +451,21 @@ class Message:
                     self.name = self.name.decode("ascii")
                     self.v_a *= 0.01  # Convert to m/s
 
-    def __init__(self, blob: bytearray, offset: int = 0, skip_type1: bool = False):
+    def __init__(self, blob: bytearray, offset: int = 0, skip_type1: bool = False, moments: Optional[set] = None):
         """
         Initializes a NEXRAD message from a byte buffer.
 
         :param blob: A bytearray containing the message binary data.
         :param offset: Offset in the bytearray where the message starts.
         :param bypass1: If True, skips decoding of MSG1 (message header is still always decoded).
+        :param moments: Names of the generic blocks to decode in MSG31, e.g., {"REF", "VEL"}; None for all.
         """
         self.offset = offset
         self.next_offset = offset + METADATA_RECORD_SIZE
         if blob is not None:
             self.info = self.Header(blob, self.offset)
             if self.info.type == 31:
-                self._decode31(blob, offset + self.Header._size_)
+                self._decode31(blob, offset + self.Header._size_, moments=moments)
                 self.next_offset = offset + self.info.data_size * 2 - 4 + self.Header._size_
             elif self.info.type == 5:
                 self._decode5(blob, offset + self.Header._size_)
@@ -455,21 +514,25 @@ class Message:
             self.data.append(self.Type5.Data(blob, offset))
             offset += self.Type5.Data._size_
 
-    def _decode31(self, blob: bytearray, offset: int):
+    def _decode31(self, blob: bytearray, offset: int, moments: Optional[set] = None):
         """
         Decodes as type 31 (Digital Radar Generic Format Blocks)
+
+        Generic blocks not in moments are skipped after reading their 4-byte header
         """
         self.head = self.Type31.Header(blob, offset)
         self.data = {}
         for pointer in self.head.block_pointers:
             block = self.Type31.Data.Unknown(blob, offset + pointer)
+            if moments is not None and block.name in GENERIC_BLOCK_NAMES and block.name not in moments:
+                continue
             if block.name == "VOL":
                 block = self.Type31.Data.Volume(blob, offset + pointer)
             elif block.name == "ELV":
                 block = self.Type31.Data.Elevation(blob, offset + pointer)
             elif block.name == "RAD":
                 block = self.Type31.Data.Radial(blob, offset + pointer)
-            elif block.name in ["REF", "VEL", "SW", "ZDR", "PHI", "RHO", "CFP"]:
+            elif block.name in GENERIC_BLOCK_NAMES:
                 block = self.Type31.Data.Generic(blob, offset + pointer)
                 origin = offset + pointer + self.Type31.Data.Generic._size_
                 if block.word_size == 16:
@@ -491,17 +554,133 @@ class Message:
         return 0.0
 
 
-def _records_from_file(file: str, skip_metadata: bool = True):
+def _gather(buf: np.ndarray, origins: np.ndarray, dtype: np.dtype) -> np.ndarray:
     """
-    Reads a NEXRAD Level II file and extracts messages
+    Reads one structured record of dtype at every origin of a byte buffer in a single indexing operation
+    """
+    index = origins[:, np.newaxis] + np.arange(dtype.itemsize)
+    return buf[index].view(dtype).reshape(-1)
 
-    :param file: Path to the NEXRAD Level II file.
-    :return: (VCP, a list of msg31 records) if skip_metadata is True; or
-             (metadata, VCP, a list of msg31 records) otherwise.
+
+class Radials:
+    """
+    Type 31 messages decoded column-wise
+
+    The headers and the data block pointers of all radials are read at once through the
+    structured dtypes above, so there is no Message object per radial.
+    """
+
+    def __init__(self, blob: bytearray, offsets: np.ndarray | List[int]):
+        """
+        :param blob: The decompressed buffer that contains the messages.
+        :param offsets: Offsets of the type 31 messages in the buffer (start of the message header).
+        """
+        self.blob = blob
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        buf = np.frombuffer(blob, dtype=np.uint8)
+        origins = self.offsets + Message.Header._size_
+        head = _gather(buf, origins, TYPE31_HEADER_DTYPE)
+        self.azimuths = head["azimuth_angle"].astype(np.float32)
+        self.elevations = head["elevation_angle"].astype(np.float32)
+        self.days = head["timestamp"].astype(np.int32)
+        self.msecs = head["timestamp_ms"].astype(np.int32)
+        self.elevation_numbers = head["elevation_number"].astype(np.int32)
+        self.radial_status = head["radial_status"].astype(np.int32)
+        self.azimuth_numbers = head["azimuth_number"].astype(np.int32)
+        # Absolute offsets of the data blocks, -1 for unused pointers
+        pointers = head["block_pointers"].astype(np.int64)
+        used = (np.arange(pointers.shape[1]) < head["block_count"][:, np.newaxis]) & (pointers > 0)
+        self.block_offsets = np.where(used, origins[:, np.newaxis] + pointers, -1)
+        names = buf[np.maximum(self.block_offsets, 0)[..., np.newaxis] + np.arange(1, 4)]
+        self.block_names = np.where(used, names.view("S3")[..., 0], b"")
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, key):
+        return Radials(self.blob, self.offsets[key])
+
+    def message(self, index: int = 0, moments: Optional[set] = None) -> Message:
+        """
+        Returns a decoded Message of a single radial, with only the generic blocks in moments if given
+        """
+        return Message(self.blob, int(self.offsets[index]), moments=moments)
+
+    def locate(self, name: str) -> np.ndarray:
+        """
+        Returns the absolute offsets of the data block name of every radial, -1 if absent
+        """
+        hits = self.block_names == name.encode()
+        column = np.argmax(hits, axis=1)
+        origins = self.block_offsets[np.arange(len(self)), column]
+        return np.where(hits.any(axis=1), origins, -1)
+
+    def moment(self, name: str, gates: slice = slice(None)) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+        """
+        Reads a generic data block (REF, VEL, SW, ZDR, PHI, RHO, or CFP) of every radial
+
+        When the radials are evenly spaced in the buffer, which is the usual case within a sweep,
+        the codes are a read-only strided view into the buffer, i.e., no copy at all.
+
+        :param name: Name of the data block.
+        :param gates: Gates to read, only these are copied when the codes cannot be a view.
+        :return: (block headers, codes of shape (nrays, ngates)) or (None, None) if no radial has the block.
+        """
+        origins = self.locate(name)
+        present = origins >= 0
+        if not np.any(present):
+            return None, None
+        buf = np.frombuffer(self.blob, dtype=np.uint8)
+        head = _gather(buf, origins[present], GENERIC_BLOCK_DTYPE)
+        ngates = int(head["ngates"].min())
+        dtype = np.dtype(">u2" if head["word_size"][0] == 16 else ">u1")
+        starts = origins + GENERIC_BLOCK_DTYPE.itemsize
+        steps = np.unique(np.diff(starts))
+        if np.all(present) and (len(starts) == 1 or (len(steps) == 1 and steps[0] > 0)):
+            stride = int(steps[0]) if len(starts) > 1 else 0
+            codes = np.ndarray(
+                (len(self), ngates), dtype=dtype, buffer=self.blob, offset=int(starts[0]), strides=(stride, dtype.itemsize)
+            )
+            codes.flags.writeable = False
+            return head, codes[:, gates]
+        start, stop, step = gates.indices(ngates)
+        count = max(stop - start, 0)
+        codes = np.zeros((len(self), len(range(start, stop, step))), dtype=dtype)
+        for k in np.flatnonzero(present):
+            offset = int(starts[k]) + start * dtype.itemsize
+            codes[k, :] = np.frombuffer(self.blob, dtype=dtype, count=count, offset=offset)[::step]
+        return head, codes
+
+
+def _map(func, items: List, workers: int = 1) -> List:
+    """
+    Applies func to every item in order, in a thread pool if workers > 1
+
+    File reads and bz2 decompression release the GIL, so the threads run on separate cores
+    """
+    if workers > 1 and len(items) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(func, items))
+    return [func(item) for item in items]
+
+
+def _blob_from_file(file: str, workers: int = 1) -> bytearray:
+    """
+    Reads a NEXRAD Level II file and decompresses all LDM records into one buffer
     """
-    # Check if the file is a valid NEXRAD Level II file
+    if workers > 1:
+        spans = _record_spans(file)
+        if spans:
+            return _blob_from_spans(file, spans, workers=workers)
     with open(file, "rb") as f:
         content = f.read()
+    return _blob_from_content(content)
+
+
+def _blob_from_content(content: bytes) -> bytearray:
+    """
+    Decompresses all LDM records of the content of a NEXRAD Level II file into one buffer
+    """
     decompressor = bz2.BZ2Decompressor()
     offset = LDM_CONTROL_WORD_SIZE + (VOLUME_HEADER_SIZE if content[:6] == b"AR2V00" else 0)
     blob = bytearray(decompressor.decompress(content[offset:]))
@@ -509,6 +688,92 @@ def _records_from_file(file: str, skip_metadata: bool = True):
         unused_data = decompressor.unused_data[LDM_CONTROL_WORD_SIZE:]
         decompressor = bz2.BZ2Decompressor()
         blob += decompressor.decompress(unused_data)
+    return blob
+
+
+def _timestamp_from_volume_header(content: bytes) -> float:
+    """
+    Returns the volume time in the 24-byte volume header record, i.e., days since 1970-01-01 (1-based) and milliseconds
+    """
+    days, msecs = struct.unpack(">II", content[12:20])
+    return (days - 1) * 86400.0 + msecs * 1.0e-3
+
+
+def _record_spans(file: str) -> Optional[List[Tuple[int, int]]]:
+    """
+    Walks the LDM control words of a NEXRAD Level II file without reading the compressed records
+
+    :param file: Path to the NEXRAD Level II file.
+    :return: A list of (offset, size) of the compressed records, or None if the control words are inconsistent.
+    """
+    spans = []
+    size = os.path.getsize(file)
+    with open(file, "rb") as f:
+        offset = VOLUME_HEADER_SIZE if f.read(6) == b"AR2V00" else 0
+        while offset + LDM_CONTROL_WORD_SIZE < size:
+            f.seek(offset)
+            head = f.read(LDM_CONTROL_WORD_SIZE + 3)
+            count = abs(struct.unpack(">i", head[:LDM_CONTROL_WORD_SIZE])[0])
+            offset += LDM_CONTROL_WORD_SIZE
+            if count == 0 or offset + count > size or head[LDM_CONTROL_WORD_SIZE:] != b"BZh":
+                return None
+            spans.append((offset, count))
+            offset += count
+    return spans
+
+
+def _read_spans(file: str, spans: List[Tuple[int, int]]) -> List[bytes]:
+    """
+    Reads the selected LDM records of a NEXRAD Level II file, still compressed
+    """
+    records = []
+    with open(file, "rb") as f:
+        for offset, count in spans:
+            f.seek(offset)
+            records.append(f.read(count))
+    return records
+
+
+def _blob_from_spans(file: str, spans: List[Tuple[int, int]], workers: int = 1) -> bytearray:
+    """
+    Reads and decompresses only the selected LDM records of a NEXRAD Level II file
+    """
+    return bytearray().join(_map(bz2.decompress, _read_spans(file, spans), workers=workers))
+
+
+def _scan_messages(blob: bytearray, skip_metadata: bool = True) -> Tuple[Optional[Message], np.ndarray]:
+    """
+    Walks the message headers of a decompressed buffer without decoding the radials
+
+    :param blob: The decompressed buffer.
+    :param skip_metadata: If True, jumps from message type 15 straight to message type 5.
+    :return: (VCP, offsets of the type 31 messages)
+    """
+    vcp, offsets, offset = None, [], EMPTY_BYTE_COUNT
+    while offset < len(blob):
+        size, kind = struct.unpack_from(">HxB", blob, offset)
+        if kind == 31:
+            offsets.append(offset)
+            offset += size * 2 - 4 + Message.Header._size_
+            continue
+        if kind == 5 and not vcp:
+            vcp = Message(blob, offset)
+        if skip_metadata and kind == 15:
+            offset = MESSAGE_5_OFFSET
+        else:
+            offset += METADATA_RECORD_SIZE
+    return vcp, np.array(offsets, dtype=np.int64)
+
+
+def _records_from_file(file: str, skip_metadata: bool = True):
+    """
+    Reads a NEXRAD Level II file and extracts messages
+
+    :param file: Path to the NEXRAD Level II file.
+    :return: (VCP, a list of msg31 records) if skip_metadata is True; or
+             (metadata, VCP, a list of msg31 records) otherwise.
+    """
+    blob = _blob_from_file(file)
     # Extract messages from the blob
     vcp, meta, msg31, offset = None, [], [], EMPTY_BYTE_COUNT
     while offset < len(blob):
@@ -537,27 +802,187 @@ def _nrays_from_vcp(vcp: Message):
     return nrays
 
 
-def _get_vcp_msg31_timestring_volume(filename: str, **kwargs):
-    sweep_index = kwargs.get("sweep_index", 0)
-    out = _records_from_file(filename)
-    if isinstance(out, tuple) and len(out) == 2:
-        vcp, msg31 = out
-    else:
-        raise ValueError(f"Unexpected output from _records_from_file: {out}")
-    if vcp is None or len(msg31) == 0:
-        raise ValueError(f"Invalid file format: {filename} (vcp = {vcp}), {len(msg31)} msg31)")
+def _record_slices_from_vcp(vcp: Message):
+    """
+    Maps each sweep to its LDM records, record 0 is the metadata and each of the others has 120 radials
+    """
     nrays = _nrays_from_vcp(vcp)
-    counts = [sum(nrays[:i]) for i in range(len(nrays) + 1)]
-    start_end = [slice(x, y) for x, y in zip(counts[:-1], counts[1:])]
+    nrecords = [x // RADIALS_PER_RECORD for x in nrays]
+    counts = [sum(nrecords[:i]) for i in range(len(nrecords) + 1)]
+    return [slice(x + 1, y + 1) for x, y in zip(counts[:-1], counts[1:])]
+
+
+def _is_whole_sweep(radials: Radials, sweep_index: int) -> bool:
+    """
+    Whether the radials are all of the sweep, from the radial that starts it to the one that ends it
+    """
+    starts = (RADIAL_STATUS_START_OF_ELEVATION, RADIAL_STATUS_START_OF_VOLUME, RADIAL_STATUS_START_OF_LAST_ELEVATION)
+    ends = (RADIAL_STATUS_END_OF_ELEVATION, RADIAL_STATUS_END_OF_VOLUME)
+    return (
+        bool(np.all(radials.elevation_numbers == sweep_index + 1))
+        and radials.radial_status[0] in starts
+        and radials.radial_status[-1] in ends
+    )
+
+
+def _index_path(file: str, index: bool | str) -> str:
+    """
+    Returns the index path of a file, a hidden sidecar if index is True or a file under the index folder
+    """
+    basename = os.path.basename(file)
+    if isinstance(index, str):
+        folder = os.path.dirname(os.path.realpath(file))
+        tag = hashlib.sha1(folder.encode()).hexdigest()[:8]
+        return os.path.join(index, f"{basename}.{tag}.idx.json")
+    return os.path.join(os.path.dirname(file), f".{basename}.idx.json")
+
+
+def _load_index(file: str, index: bool | str):
+    """
+    Loads the index of a file, returns None if there is none or it is stale
+
+    :return: (VCP, record spans, record slices of every sweep) or None
+    """
+    path = _index_path(file, index)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as fid:
+            entry = json.load(fid)
+    except (OSError, ValueError) as e:
+        logger.debug(f"Unable to load index {path}: {e}")
+        return None
+    stat = os.stat(file)
+    if entry.get("version") != INDEX_VERSION or entry.get("path") != os.path.realpath(file):
+        return None
+    if entry.get("size") != stat.st_size or entry.get("mtime") != stat.st_mtime_ns:
+        logger.debug(f"Index {path} is stale")
+        return None
+    vcp = Message(bytearray(base64.b64decode(entry["vcp"]["message"])), EMPTY_BYTE_COUNT)
+    spans = [tuple(span) for span in entry["spans"]]
+    slices = [slice(*pair) for pair in entry["sweeps"]]
+    return vcp, spans, slices
+
+
+def _save_index(file: str, index: bool | str, vcp: Message, metadata: bytearray, spans, slices):
+    """
+    Saves the VCP, record spans and sweep-to-record map of a file
+    """
+    path = _index_path(file, index)
+    stat = os.stat(file)
+    origin = vcp.offset - EMPTY_BYTE_COUNT
+    entry = {
+        "version": INDEX_VERSION,
+        "path": os.path.realpath(file),
+        "size": stat.st_size,
+        "mtime": stat.st_mtime_ns,
+        "vcp": {
+            "pattern": vcp.head.pattern_number,
+            "elevations": [scan.elevation_angle for scan in vcp.data],
+            "nrays": _nrays_from_vcp(vcp),
+            "message": base64.b64encode(metadata[origin : origin + METADATA_RECORD_SIZE]).decode(),
+        },
+        "spans": spans,
+        "sweeps": [[x.start, x.stop] for x in slices],
+    }
+    try:
+        if isinstance(index, str):
+            os.makedirs(index, exist_ok=True)
+        with open(f"{path}.tmp", "w") as fid:
+            json.dump(entry, fid)
+        os.replace(f"{path}.tmp", path)
+    except OSError as e:
+        logger.debug(f"Unable to save index {path}: {e}")
+
+
+def _layout_from_file(file: str, index: bool | str | None = None):
+    """
+    Gets the VCP and the record layout of a V06 volume or an -S file, through the index if requested
+
+    :return: (VCP, record spans, record slices of every sweep) or None if the control words are inconsistent
+    """
+    if index:
+        layout = _load_index(file, index)
+        if layout:
+            return layout
+    spans = _record_spans(file)
+    if not spans:
+        return None
+    metadata = _blob_from_spans(file, spans[:1])
+    vcp, _ = _scan_messages(metadata)
+    if vcp is None:
+        raise ValueError(f"Invalid file format: {file} (vcp = {vcp})")
+    slices = _record_slices_from_vcp(vcp)
+    if index:
+        _save_index(file, index, vcp, metadata, spans, slices)
+    return vcp, spans, slices
+
+
+def _get_vcp_sweeps_timestring_volume(filename: str, sweeps: Optional[List[int]] = None, **kwargs):
+    myname = colorize("nexrad._get_vcp_sweeps_timestring_volume", "green")
+    workers = kwargs.get("workers", 1)
     timestring = re_parts_volume.match(os.path.basename(filename))
     if timestring:
         timestring = timestring.groupdict()["time"].replace("_", "-")
-    return vcp, msg31[start_end[sweep_index]], timestring
+    # Decompress only the records of the selected sweeps, all at once
+    layout = _layout_from_file(filename, kwargs.get("index", None))
+    if layout:
+        vcp, spans, slices = layout
+        nrays = _nrays_from_vcp(vcp)
+        indices = range(len(nrays)) if sweeps is None else sweeps
+        if all(0 <= k < len(nrays) for k in indices):
+            selected = [spans[slices[k]] for k in indices]
+            chunks = _map(bz2.decompress, _read_spans(filename, sum(selected, [])), workers=workers)
+            radials, start = {}, 0
+            for k, group in zip(indices, selected):
+                blob = bytearray().join(chunks[start : start + len(group)])
+                start += len(group)
+                _, offsets = _scan_messages(blob)
+                if len(offsets) != nrays[k]:
+                    break
+                # Records of another sweep may have the same count, e.g., when the records are shifted
+                radials[k] = Radials(blob, offsets)
+                if not _is_whole_sweep(radials[k], k):
+                    break
+            else:
+                return vcp, radials, timestring
+    logger.debug(f"{myname} Falling back to decompressing the entire volume")
+    blob = _blob_from_file(filename, workers=workers)
+    vcp, radials = _vcp_sweeps_from_blob(blob, sweeps, filename)
+    return vcp, radials, timestring
+
+
+def _vcp_sweeps_from_blob(blob: bytearray, sweeps: Optional[List[int]] = None, name: str = "buffer"):
+    """
+    Splits the type 31 radials of an entire decompressed volume into sweeps
+
+    :return: (VCP, a dictionary of radials keyed by sweep index)
+    """
+    vcp, offsets = _scan_messages(blob)
+    if vcp is None or len(offsets) == 0:
+        raise ValueError(f"Invalid file format: {name} (vcp = {vcp}), {len(offsets)} msg31)")
+    nrays = _nrays_from_vcp(vcp)
+    counts = [sum(nrays[:i]) for i in range(len(nrays) + 1)]
+    start_end = [slice(x, y) for x, y in zip(counts[:-1], counts[1:])]
+    indices = range(len(start_end)) if sweeps is None else sweeps
+    invalid = [k for k in indices if not 0 <= k < len(start_end)]
+    if invalid:
+        raise ValueError(f"Invalid sweep index: {invalid[0]} (max {len(start_end) - 1})")
+    return vcp, {k: Radials(blob, offsets[start_end[k]]) for k in indices}
+
+
+def _get_vcp_sweeps_timestamp_content(content, sweeps: Optional[List[int]] = None, **kwargs):
+    # A V06 volume in memory, the volume header has the time since there is no filename
+    content = memoryview(content).cast("B")
+    if bytes(content[:6]) != b"AR2V00":
+        raise ValueError("Only NEXRAD volumes with the AR2V00 header can be read from a buffer")
+    vcp, radials = _vcp_sweeps_from_blob(_blob_from_content(content), sweeps)
+    return vcp, radials, _timestamp_from_volume_header(content)
 
 
-def _get_vcp_msg31_timestring_stripped(filename: str, **kwargs):
-    myname = colorize("nexrad._get_vcp_msg31_timestring_stripped", "green")
-    sweep_index = kwargs.get("sweep_index", 0)
+def _get_vcp_sweeps_timestring_stripped(filename: str, sweeps: Optional[List[int]] = None, **kwargs):
+    myname = colorize("nexrad._get_vcp_sweeps_timestring_stripped", "green")
+    workers = kwargs.get("workers", 1)
     folder, basename = os.path.split(filename)
     parts = re_parts_stripped.match(basename)
     if not parts:
@@ -568,61 +993,103 @@ def _get_vcp_msg31_timestring_stripped(filename: str, **kwargs):
         raise ValueError(f"No files found for {filename}")
     files = sorted(files, key=lambda x: int(x.split("-")[-2]))
     # Get VCP info from the first file
-    out = _records_from_file(files[0])
-    if isinstance(out, tuple) and len(out) == 2:
-        vcp, _ = out
+    layout = _layout_from_file(files[0], kwargs.get("index", None))
+    if layout:
+        vcp, _, start_end = layout
     else:
-        raise ValueError(f"Unexpected output from _records_from_file: {out}")
-    if vcp is None:
-        raise ValueError(f"Invalid file format: {files[0]} (vcp = {vcp})")
-    nrays = _nrays_from_vcp(vcp)
-    nfiles = [x // RADIALS_PER_RECORD for x in nrays]
-    counts = [sum(nfiles[:i]) for i in range(len(nfiles) + 1)]
-    start_end = [slice(x + 1, y + 1) for x, y in zip(counts[:-1], counts[1:])]
-    if sweep_index >= len(start_end):
-        raise ValueError(f"Invalid sweep index: {sweep_index} (max {len(start_end) - 1})")
-    # Collect message 31 records of the selected sweep_index
-    msg31 = []
-    for file in files[start_end[sweep_index]]:
+        vcp, _ = _scan_messages(_blob_from_file(files[0]))
+        if vcp is None:
+            raise ValueError(f"Invalid file format: {files[0]} (vcp = {vcp})")
+        start_end = _record_slices_from_vcp(vcp)
+    indices = range(len(start_end)) if sweeps is None else sweeps
+    invalid = [k for k in indices if not 0 <= k < len(start_end)]
+    if invalid:
+        raise ValueError(f"Invalid sweep index: {invalid[0]} (max {len(start_end) - 1})")
+    # Collect message 31 records of the selected sweeps, one buffer per sweep
+    selected = [files[start_end[k]] for k in indices]
+    files = sum(selected, [])
+    for file in files:
         logger.debug(f"{myname} {file}")
-        out = _records_from_file(file)
-        if isinstance(out, tuple) and len(out) == 2:
-            _, m = out
-        else:
-            raise ValueError(f"Unexpected output from _records_from_file: {out}")
-        if not isinstance(m, list):
+    chunks = _map(_blob_from_file, files, workers=workers)
+    for file, chunk in zip(files, chunks):
+        if len(chunk) == 0:
             logger.warning(f"No message 31 records found in {file}")
-            continue
-        msg31.extend(m)
+    radials, start = {}, 0
+    for k, group in zip(indices, selected):
+        blob = bytearray().join(chunks[start : start + len(group)])
+        start += len(group)
+        _, offsets = _scan_messages(blob)
+        radials[k] = Radials(blob, offsets)
     timestring = re_parts_stripped.match(os.path.basename(filename))
     if timestring:
         timestring = timestring.groupdict()["time"]
-    return vcp, msg31, timestring
+    return vcp, radials, timestring
 
 
-def get_vcp_msg31_timestamp(filename: str, **kwargs) -> Tuple[Message, List, float]:
+def get_vcp_sweeps_timestamp(filename: str, sweeps: Optional[List[int]] = None, **kwargs):
     """
-    Extracts VCP and message 31 records from a NEXRAD Level II file.
-    :param filename: Path to the NEXRAD Level II file.
+    Extracts VCP and the type 31 radials of several sweeps from a NEXRAD Level II file, decoding it once.
+    :param filename: Path to the NEXRAD Level II file, or the content of a V06 volume.
+    :param sweeps: Indices of the sweeps to read (default is None for all sweeps in the VCP).
     :param kwargs: Optional parameters:
-        - sweep_index: Index of the sweep to read (default is 0).
+        - workers: Number of threads to decompress the LDM records (default is 1).
+        - index: True for a sidecar index next to the file, or a folder of indices (default is None).
         - verbose: Verbosity level (default is 0).
-    :return: A tuple of (VCP, message 31 records, timestamp).
+    :return: A tuple of (VCP, a dictionary of radials keyed by sweep index, timestamp).
     """
+    if isinstance(filename, (bytes, bytearray, memoryview)):
+        # The content of a V06 volume
+        return _get_vcp_sweeps_timestamp_content(filename, sweeps, **kwargs)
     if filename.endswith("_V06"):
         # V06 single volume format
-        vcp, msg31, timestring = _get_vcp_msg31_timestring_volume(filename, **kwargs)
+        vcp, radials, timestring = _get_vcp_sweeps_timestring_volume(filename, sweeps, **kwargs)
     else:
         # L2-BZIP2 stripped files format
-        vcp, msg31, timestring = _get_vcp_msg31_timestring_stripped(filename, **kwargs)
+        vcp, radials, timestring = _get_vcp_sweeps_timestring_stripped(filename, sweeps, **kwargs)
     if not vcp:
         raise ValueError(f"Invalid VCP info in {filename}")
-    if len(msg31) == 0:
-        raise ValueError(f"No message 31 records found in {filename}")
     if not timestring:
         raise ValueError(f"Invalid filename format: {filename}")
     timestamp = datetime.datetime.strptime(timestring, r"%Y%m%d-%H%M%S")
     timestamp = timestamp.replace(tzinfo=datetime.timezone.utc).timestamp()
+    return vcp, radials, timestamp
+
+
+def get_vcp_radials_timestamp(filename: str, **kwargs) -> Tuple[Message, Radials, float]:
+    """
+    Extracts VCP and the type 31 radials, decoded column-wise, from a NEXRAD Level II file.
+    :param filename: Path to the NEXRAD Level II file.
+    :param kwargs: Optional parameters:
+        - sweep_index: Index of the sweep to read (default is 0).
+        - workers: Number of threads to decompress the LDM records (default is 1).
+        - index: True for a sidecar index next to the file, or a folder of indices (default is None).
+        - verbose: Verbosity level (default is 0).
+    :return: A tuple of (VCP, radials, timestamp).
+    """
+    sweep_index = kwargs.pop("sweep_index", 0)
+    vcp, radials, timestamp = get_vcp_sweeps_timestamp(filename, [sweep_index], **kwargs)
+    radials = radials[sweep_index]
+    if len(radials) == 0:
+        raise ValueError(f"No message 31 records found in {filename}")
+    return vcp, radials, timestamp
+
+
+def get_vcp_msg31_timestamp(filename: str, **kwargs) -> Tuple[Message, List, float]:
+    """
+    Extracts VCP and message 31 records from a NEXRAD Level II file.
+    :param filename: Path to the NEXRAD Level II file.
+    :param kwargs: Optional parameters:
+        - sweep_index: Index of the sweep to read (default is 0).
+        - workers: Number of threads to decompress the LDM records (default is 1).
+        - index: True for a sidecar index next to the file, or a folder of indices (default is None).
+        - symbols: Symbols of the moments to decode, e.g., ["Z", "V"] (default is None for all).
+        - verbose: Verbosity level (default is 0).
+    :return: A tuple of (VCP, message 31 records, timestamp).
+    """
+    symbols = kwargs.pop("symbols", None)
+    moments = None if symbols is None else {name for name, symbol in MOMENT_SYMBOLS.items() if symbol in symbols}
+    vcp, radials, timestamp = get_vcp_radials_timestamp(filename, **kwargs)
+    msg31 = [radials.message(k, moments=moments) for k in range(len(radials))]
     return vcp, msg31, timestamp
 
 
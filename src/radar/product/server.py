@@ -14,6 +14,7 @@ import multiprocessing as mp
 from .share import *
 from ..cosmetics import colorize, pretty_object_name
 from ..lrucache import LRUCache
+from ..sweep import is_native_format
 
 __prog__ = os.environ.get("PROGRAM", "datashop")
 __version__ = os.environ.get("VERSION", radar.__version__)
@@ -22,6 +23,7 @@ logger = logging.getLogger(__name__)
 
 
 # Each reader is a separate process because data reader is not thread safe (limitation of HDF5)
+# Native sweeps are memory mapped without HDF5, so they are read by the concierge directly
 
 
 class Conceirge:
@@ -60,7 +62,13 @@ class Conceirge:
                     name = os.path.basename(request["path"])
                     logger.debug(f"{myname} Sweep: {name}")
                     blob = cache.get(name)
-                    if blob is None:
+                    if blob is None and is_native_format(request["path"]):
+                        data, tarinfo = radar.read(request["path"], want_tarinfo=True)
+                        blob = pickle.dumps({"data": data, "tarinfo": tarinfo})
+                        cache.put(name, blob)
+                        send(sock, blob)
+                        logger.info(f"{myname} {driveTag}: {name} ({len(blob):,d} B)")
+                    elif blob is None:
                         # Queue it up for reader. Collector will put it in outQueue when ready
                         jobQueue.put({"fileno": self._fileno, "path": request["path"]})
                         self.busy = True
@@ -1,16 +1,25 @@
+import io
 import os
 import re
 import logging
 import tarfile
 import datetime
+import functools
+import threading
+import collections
+import contextlib
+import netCDF4
 import numpy as np
 
-from typing import Optional, Tuple
+from typing import Iterator, List, Optional, Tuple
 from netCDF4 import Dataset
 
 from .common import *
 from .cosmetics import colorize
-from .nexrad import get_nexrad_location, get_vcp_msg31_timestamp, is_nexrad_format
+from .handle import LazyProducts, SweepHandle
+from .lrucache import SweepCache, SweepCacheInfo
+from .sweep import NATIVE_MAGIC, Sweep, is_native_format
+from .nexrad import MOMENT_SYMBOLS, get_nexrad_location, get_vcp_radials_timestamp, get_vcp_sweeps_timestamp, is_nexrad_format
 
 utc = datetime.timezone.utc
 sep = colorize("/", "orange")
@@ -21,47 +30,247 @@ np.set_printoptions(precision=2, suppress=True, threshold=10)
 
 EPOCH_DATETIME_UTC = datetime.datetime(1970, 1, 1, tzinfo=utc)
 
+# Sweeps of read(..., cache=True)
+_cache = SweepCache()
+
+# Per-symbol files of the folders, {folder: (mtime, scan time, {(name, time, scan): {symbol: path}})}
+_siblings = collections.OrderedDict()
+_siblings_lock = threading.Lock()
+SIBLING_FOLDERS = 64
+# A folder changed within this many seconds of its listing may change again in the same mtime tick
+SIBLING_RACY_SECONDS = 2.0
+
+# Formats of the sources in memory by their leading bytes, tar archives may also be plain
+BUFFER_MAGICS = [
+    (NATIVE_MAGIC, "native"),
+    (b"\x89HDF\r\n\x1a\n", "nc"),
+    (b"CDF\x01", "nc"),
+    (b"CDF\x02", "nc"),
+    (b"CDF\x05", "nc"),
+    (b"AR2V00", "nexrad"),
+    (b"\xfd7zXZ\x00", "tar"),
+    (b"\x1f\x8b", "tar"),
+    (b"BZh", "tar"),
+]
+
+# Variable names of the products in CF-Radial files, in the order of preference
+CF1_VARIABLE_NAMES = {
+    "Z": ["DBZ", "DBZHC"],
+    "V": ["VEL", "VR"],
+    "W": ["WIDTH"],
+    "D": ["ZDR"],
+    "P": ["PHIDP"],
+    "R": ["RHOHV"],
+}
+# Symbols of the TypeName of WDSS-II files
+WDS_SYMBOLS = {
+    "Intensity": "Z",
+    "Corrected_Intensity": "Z",
+    "Reflectivity": "Z",
+    "Radial_Velocity": "V",
+    "Velocity": "V",
+    "Width": "W",
+    "Differential_Reflectivity": "D",
+    "PhiDP": "P",
+    "RhoHV": "R",
+}
+CF2_VARIABLE_NAMES = {
+    "Z": ["DBZ", "RCP"],
+    "V": ["VEL"],
+    "W": ["WIDTH"],
+    "D": ["ZDR"],
+    "P": ["PHIDP"],
+    "R": ["RHOHV"],
+}
+
 
 """
     Value to index conversion using RadarKit convention
 """
 
 
-def val2ind(v, symbol="Z"):
-    def rho2ind(x):
-        m3 = x > 0.93
-        m2 = np.logical_and(x > 0.7, ~m3)
-        index = x * 52.8751
-        index[m2] = x[m2] * 300.0 - 173.0
-        index[m3] = x[m3] * 1000.0 - 824.0
-        return index
-
-    if symbol == "Z":
-        u8 = v * 2.0 + 64.0
-    elif symbol == "V":
-        u8 = v * 2.0 + 128.0
-    elif symbol == "W":
-        u8 = v * 20.0
-    elif symbol == "D":
-        u8 = v * 10.0 + 100.0
-    elif symbol == "P":
-        u8 = v * 128.0 / 180.0 + 128.0
-    elif symbol == "R":
-        u8 = rho2ind(v)
-    elif symbol == "I":
-        u8 = (v - 0.5) * 42 + 46
-    else:
-        u8 = v
-    # Map to closest integer, 0 is transparent, 1+ is finite.
-    # np.nan will be converted to 0 during np.nan_to_num(...)
-    return np.nan_to_num(np.clip(np.round(u8), 1.0, 255.0), copy=False).astype(np.uint8)
+# Index = max(value * scale + offset) of the lines, i.e., a convex piecewise-linear map, which is a
+# single line for all symbols but R. Values of other symbols are the indices.
+QUANTIZER_LINES = {
+    "Z": ((2.0, 64.0),),
+    "V": ((2.0, 128.0),),
+    "W": ((20.0, 0.0),),
+    "D": ((10.0, 100.0),),
+    "P": ((128.0 / 180.0, 128.0),),
+    "R": ((52.8751, 0.0), (300.0, -173.0), (1000.0, -824.0)),
+    "I": ((42.0, 25.0),),
+}
+
+# Number of elements quantized at a time, small enough for the work buffers to stay in cache
+QUANTIZER_CHUNK = 1 << 16
+
+
+def _as_rows(array):
+    # A 2-D view, rows are the unit of a chunk
+    if array.ndim == 2:
+        return array
+    if array.ndim < 2:
+        return array.reshape(1, -1)
+    return array.reshape(-1, array.shape[-1])
+
+
+def val2ind(v, symbol="Z", out=None):
+    """
+    Converts values to uint8 display indices using the RadarKit convention, 0 is transparent for
+    NaN or masked values, 1 to 255 are finite values. The work is done a chunk of rays at a time
+    in float32 buffers that are reused, so only the output is allocated, or nothing with out.
+
+    :param v: values, a masked array or an array with NaN
+    :param symbol: product symbol, which selects the mapping
+    :param out: uint8 array of the same shape for the indices, default = None for a new array
+    """
+    values = np.ma.getdata(v)
+    mask = np.ma.getmask(v)
+    if out is None:
+        out = np.empty(values.shape, dtype=np.uint8)
+    elif out.shape != values.shape or out.dtype != np.uint8:
+        raise ValueError(f"Expected out of uint8 {values.shape}, got {out.dtype} {out.shape}")
+    if values.size == 0:
+        return out
+    lines = QUANTIZER_LINES.get(symbol)
+    rows, indices = _as_rows(values), _as_rows(out)
+    masks = None if mask is np.ma.nomask else _as_rows(mask)
+    step = max(1, QUANTIZER_CHUNK // rows.shape[1])
+    work = np.empty((min(step, rows.shape[0]), rows.shape[1]), dtype=np.float32)
+    other = np.empty_like(work) if lines and len(lines) > 1 else None
+    for k in range(0, rows.shape[0], step):
+        x = rows[k : k + step]
+        w = work[: len(x)]
+        if lines:
+            (scale, offset), *more = lines
+            np.multiply(x, np.float32(scale), out=w, casting="unsafe")
+            w += np.float32(offset)
+            for scale, offset in more:
+                o = other[: len(x)]
+                np.multiply(x, np.float32(scale), out=o, casting="unsafe")
+                o += np.float32(offset)
+                np.maximum(w, o, out=w)
+        else:
+            np.copyto(w, x, casting="unsafe")
+        # Map to the closest integer, 0 is transparent, 1+ is finite. Clipping keeps NaN, fmax turns it into 0
+        np.rint(w, out=w)
+        np.clip(w, 1.0, 255.0, out=w)
+        np.fmax(w, 0.0, out=w)
+        if masks is not None:
+            w[masks[k : k + step]] = 0.0
+        np.copyto(indices[k : k + step], w, casting="unsafe")
+    return out
+
+
+def quantize(products, symbols=None, codecs={}, out=None):
+    """
+    Converts the products of a sweep to uint8 display indices in one call
+
+    :param products: mapping of symbol to values, e.g., sweep["products"]
+    :param symbols: list of symbols, default = None for all products
+    :param codecs: codecs of raw products, which are converted through lookup tables, e.g., sweep["codecs"]
+    :param out: (nsymbols, nrays, ngates) uint8 array or a mapping of symbol to uint8 arrays, e.g., the
+                u8 cube of a Sweep, default = None for new arrays
+    :return: {symbol: indices}, views of out when it is an array
+    """
+    symbols = list(products) if symbols is None else [s for s in symbols if s in products]
+    output = {}
+    for k, symbol in enumerate(symbols):
+        if out is None:
+            target = None
+        elif isinstance(out, np.ndarray):
+            target = out[k]
+        else:
+            target = out.get(symbol)
+        value = products[symbol]
+        if symbol in codecs:
+            # Raw codes, a single gather through the lookup table
+            output[symbol] = raw2ind(value, codecs[symbol], symbol=symbol, out=target)
+        else:
+            output[symbol] = val2ind(value, symbol=symbol, out=target)
+    return output
+
+
+"""
+    Raw code conversion using lookup tables
+
+    A codec describes the native integer codes of a product, value = code * scale + offset,
+    where codes in fill are not valid, e.g., {"scale": 0.5, "offset": -33.0, "fill": (0, 1)}
+"""
+
+
+@functools.lru_cache(maxsize=64)
+def _lookup_table(dtype, scale, offset, fill, symbol):
+    dtype = np.dtype(dtype)
+    # Entry k is for the code whose bit pattern is k, i.e., signed codes wrap around
+    codes = np.arange(1 << (8 * dtype.itemsize)).astype(f"u{dtype.itemsize}").view(f"{dtype.kind}{dtype.itemsize}")
+    table = (codes * scale + offset).astype(np.float32)
+    table[np.isin(codes, fill)] = np.nan
+    if symbol is not None:
+        table = val2ind(table, symbol=symbol)
+    table.flags.writeable = False
+    return table
+
+
+def _table_args(codes, codec):
+    if codes.dtype.kind not in "iu" or codes.dtype.itemsize > 2:
+        raise ValueError(f"Unsupported raw code type {codes.dtype}")
+    dtype = codes.dtype.newbyteorder("=")
+    fill = tuple(int(x) for x in codec.get("fill", ()))
+    return dtype.str, float(codec["scale"]), float(codec["offset"]), fill
+
+
+def _table_index(codes):
+    # Native byte order, then reinterpret as unsigned, which is a view for native codes
+    codes = np.asarray(codes)
+    codes = codes.astype(codes.dtype.newbyteorder("="), copy=False)
+    return codes.view(f"u{codes.dtype.itemsize}")
+
+
+def raw2val_table(dtype, codec) -> np.ndarray:
+    """
+    Returns the 256- or 65,536-entry table of float32 values of a codec, NaN for the fill codes
+    """
+    return _lookup_table(*_table_args(np.empty(0, dtype=dtype), codec), None)
+
+
+def raw2ind_table(dtype, codec, symbol="Z") -> np.ndarray:
+    """
+    Returns the 256- or 65,536-entry table of val2ind() indices of a codec
+    """
+    return _lookup_table(*_table_args(np.empty(0, dtype=dtype), codec), symbol)
+
+
+def raw2val(codes, codec):
+    """
+    Converts raw codes to float32 values through a lookup table, NaN for the fill codes
+    """
+    codes = np.asarray(codes)
+    return raw2val_table(codes.dtype, codec)[_table_index(codes)]
+
+
+def raw2ind(codes, codec, symbol="Z", out=None):
+    """
+    Converts raw codes to display indices through a lookup table, same as val2ind(raw2val(codes, codec), symbol)
+    """
+    codes = np.asarray(codes)
+    return np.take(raw2ind_table(codes.dtype, codec, symbol), _table_index(codes), out=out)
 
 
 def _starts_with_cf(string):
     return bool(re.match(r"^cf", string, re.IGNORECASE))
 
 
-def _read_ncid(ncid, symbols=["Z", "V", "W", "D", "P", "R"], verbose=0):
+def _read_ncid(
+    ncid,
+    symbols=["Z", "V", "W", "D", "P", "R"],
+    sweep_index=0,
+    raw=False,
+    masked=True,
+    lazy=False,
+    window=None,
+    verbose=0,
+):
     myname = colorize("radar._read_ncid()", "green")
     attrs = ncid.ncattrs()
     if verbose > 2:
@@ -75,17 +284,18 @@ def _read_ncid(ncid, symbols=["Z", "V", "W", "D", "P", "R"], verbose=0):
             raise ValueError(f"{myname} No version found")
         if verbose > 1:
             logger.debug(f"{myname} {version} {sep} {conventions} {sep} {subConventions}")
+        options = dict(symbols=symbols, sweep_index=sweep_index, raw=raw, masked=masked, lazy=lazy, window=window)
         m = re_cf_version.match(version)
         if m:
             m = m.groupdict()
             versionNumber = m["version"]
             if versionNumber >= "2.0":
-                return _read_cf2_from_ncid(ncid, symbols=symbols)
-            return _read_cf1_from_ncid(ncid, symbols=symbols)
+                return _read_cf2_from_ncid(ncid, **options)
+            return _read_cf1_from_ncid(ncid, **options)
         elif version >= "2":
-            return _read_cf2_from_ncid(ncid, symbols=symbols)
+            return _read_cf2_from_ncid(ncid, **options)
         elif version[0] == "1":
-            return _read_cf1_from_ncid(ncid, symbols=symbols)
+            return _read_cf1_from_ncid(ncid, **options)
         show = f"{myname} {version} {sep} {conventions} {sep} {subConventions}"
         raise ValueError(f"{myname} Unsupported format {show}")
     # WDSS-II format contains "TypeName" and "DataType"
@@ -93,17 +303,208 @@ def _read_ncid(ncid, symbols=["Z", "V", "W", "D", "P", "R"], verbose=0):
         if verbose > 1:
             createdBy = ncid.getncattr("CreatedBy")
             logger.debug(f"{myname} WDSS-II {sep} {createdBy}")
-        return _read_wds_from_ncid(ncid, verbose=verbose)
+        if sweep_index:
+            raise ValueError(f"{myname} WDSS-II has only one sweep, sweep_index = {sweep_index}")
+        return _read_wds_from_ncid(ncid, lazy=lazy, window=window, verbose=verbose)
     else:
         raise ValueError(f"{myname} Unidentified NetCDF format")
 
 
-def _get_variable_as_masked_float32(variables, name):
-    variable = variables[name][:]
-    return np.ma.array(variable.data, mask=variable.mask, dtype=np.float32, fill_value=np.nan)
+def _get_window(ranges, azimuths, window=None, rays=None):
+    """
+    Translates the window options into a selection of rays and gates
+
+    :param window: {"max_range": meters, "gate_slice": slice or (start, stop[, step]),
+                    "azimuth_range": (start, end) in degrees, clockwise and may cross 0}
+    :param rays: slice of the rays of a sweep in a volume, default = None for all rays
+    :return: None for everything, or (runs, gates) where runs is a list of contiguous ray slices
+    """
+    window = window or {}
+    if rays is None and all(window.get(key) is None for key in ["max_range", "gate_slice", "azimuth_range"]):
+        return None
+    if rays is None:
+        rays = slice(0, len(azimuths))
+    gates = window.get("gate_slice")
+    if gates is None:
+        gates = slice(None)
+    elif not isinstance(gates, slice):
+        gates = slice(*gates)
+    gates = slice(*gates.indices(len(ranges)))
+    if window.get("max_range") is not None:
+        count = int(np.searchsorted(ranges, window["max_range"], side="right"))
+        gates = slice(gates.start, min(gates.stop, count), gates.step)
+    runs = [rays]
+    if window.get("azimuth_range") is not None:
+        start, end = window["azimuth_range"]
+        width = (end - start) % 360.0
+        if width == 0.0 and end != start:
+            width = 360.0
+        inside = np.mod(azimuths[rays] - start, 360.0) <= width
+        edges = rays.start + np.flatnonzero(np.diff(np.concatenate(([0], inside.astype(np.int8), [0]))))
+        runs = [slice(int(a), int(b)) for a, b in zip(edges[::2], edges[1::2])] or [slice(0, 0)]
+    return runs, gates
+
 
+def _take(array, selection, axis=0):
+    # Rays of a selection from an array of rays, or gates from an array of gates if axis = 1
+    if selection is None:
+        return array
+    runs, gates = selection
+    if axis == 1:
+        return array[gates]
+    if len(runs) == 1:
+        return array[runs[0]]
+    return np.concatenate([array[run] for run in runs])
+
+
+def _read_variable(variable, selection=None):
+    # Only the hyperslabs of the selection are read from the file
+    if selection is None:
+        return variable[:]
+    runs, gates = selection
+    parts = [variable[run, gates] for run in runs]
+    if len(parts) == 1:
+        return parts[0]
+    if any(np.ma.isMaskedArray(part) for part in parts):
+        return np.ma.concatenate(parts)
+    return np.concatenate(parts)
+
+
+def _read_codes(variable, selection=None):
+    variable.set_auto_maskandscale(False)
+    try:
+        return np.asarray(_read_variable(variable, selection))
+    finally:
+        variable.set_auto_maskandscale(True)
+
+
+def _read_packed(variable, selection=None):
+    # Packed codes through the lookup table of the codec, which is much faster than the masked arithmetic
+    # of netCDF4, None if the variable is not packed or has attributes that only netCDF4 applies
+    codec = _get_codec(variable)
+    if codec is None or any(a in variable.ncattrs() for a in ("valid_min", "valid_max", "valid_range", "_Unsigned")):
+        return None
+    return raw2val(_read_codes(variable, selection), codec)
+
+
+def _get_variable_as_masked_float32(variables, name, selection=None):
+    values = _read_packed(variables[name], selection)
+    if values is not None:
+        return np.ma.array(values, mask=np.isnan(values), fill_value=np.nan)
+    variable = _read_variable(variables[name], selection)
+    return np.ma.array(np.ma.getdata(variable), mask=np.ma.getmask(variable), dtype=np.float32, fill_value=np.nan)
+
+
+def _get_variable_as_float32(variables, name, selection=None):
+    values = _read_packed(variables[name], selection)
+    if values is not None:
+        return values
+    variable = _read_variable(variables[name], selection)
+    # The unpacked values are a new array, so NaN can be filled in place when they are already float32
+    values = np.ma.getdata(variable).astype(np.float32, copy=False)
+    mask = np.ma.getmask(variable)
+    if mask is not np.ma.nomask:
+        values[mask] = np.nan
+    return values
+
+
+def _get_codec(variable):
+    # Only packed variables, i.e., integers of one or two bytes, have a codec
+    dtype = np.dtype(variable.dtype)
+    if dtype.kind not in "iu" or dtype.itemsize > 2:
+        return None
+    attrs = variable.ncattrs()
+    fill = [variable.getncattr(a) for a in ["_FillValue", "missing_value"] if a in attrs]
+    # Without a declared fill, netCDF4 masks the default fill of the type, except for bytes
+    if not fill and dtype.itemsize > 1:
+        fill = [netCDF4.default_fillvals[dtype.str[1:]]]
+    return {
+        "scale": float(variable.getncattr("scale_factor")) if "scale_factor" in attrs else 1.0,
+        "offset": float(variable.getncattr("add_offset")) if "add_offset" in attrs else 0.0,
+        "fill": tuple(int(x) for x in np.ravel(fill)),
+    }
 
-def _read_cf1_from_ncid(ncid, symbols=["Z", "V", "W", "D", "P", "R"]):
+
+def _get_variable_as_raw(variables, name, selection=None):
+    variable = variables[name]
+    if _get_codec(variable) is None:
+        # Not packed, the values are the codes
+        return _get_variable_as_masked_float32(variables, name, selection)
+    return _read_codes(variable, selection)
+
+
+def _get_product(variables, name, raw=False, masked=True, selection=None):
+    if raw:
+        return _get_variable_as_raw(variables, name, selection)
+    elif masked:
+        return _get_variable_as_masked_float32(variables, name, selection)
+    return _get_variable_as_float32(variables, name, selection)
+
+
+def _get_products(
+    variables,
+    names,
+    symbols=["Z", "V", "W", "D", "P", "R"],
+    raw=False,
+    masked=True,
+    lazy=False,
+    selection=None,
+):
+    products, codecs = (LazyProducts() if lazy else {}), {}
+    for symbol, candidates in names.items():
+        if symbol not in symbols:
+            continue
+        name = next((name for name in candidates if name in variables), None)
+        if name is None:
+            continue
+        if raw and (codec := _get_codec(variables[name])):
+            codecs[symbol] = codec
+        load = functools.partial(_get_product, variables, name, raw=raw, masked=masked, selection=selection)
+        if lazy:
+            products.set_loader(symbol, load)
+        else:
+            products[symbol] = load()
+    return products, codecs
+
+
+def _get_string(variable, index=0):
+    # Character arrays are (string_length,) for a single sweep or (sweep, string_length) for a volume
+    chars = variable[:]
+    if np.ndim(chars) > 1:
+        chars = chars[index]
+    return b"".join(chars).decode("utf-8", errors="ignore").rstrip(" \x00")
+
+
+def _get_cf_sweep_count(ncid):
+    # CF-Radial 2 has a group for each sweep, CF-Radial 1 has the sweep dimension
+    groups = _get_cf2_sweep_groups(ncid)
+    if groups:
+        return len(groups)
+    if "sweep" in ncid.dimensions:
+        return ncid.dimensions["sweep"].size
+    return 1
+
+
+def _get_cf2_sweep_groups(ncid):
+    # The order of sweep_group_name when it is there, otherwise the order of the names
+    if "sweep_group_name" in ncid.variables:
+        names = ncid.variables["sweep_group_name"][:]
+        if np.asarray(names).dtype.kind == "S":
+            names = netCDF4.chartostring(names)
+        names = [str(name).strip() for name in np.ravel(names)]
+        return [name for name in names if name in ncid.groups]
+    return sorted(name for name in ncid.groups if name.startswith("sweep_"))
+
+
+def _check_sweep_index(sweep_index, count):
+    if not -count <= sweep_index < count:
+        raise ValueError(f"Sweep index {sweep_index} out of range (count = {count})")
+    return sweep_index % count
+
+
+def _read_cf1_from_ncid(
+    ncid, symbols=["Z", "V", "W", "D", "P", "R"], sweep_index=0, raw=False, masked=True, lazy=False, window=None
+):
     longitude = float(ncid.variables["longitude"][0])
     latitude = float(ncid.variables["latitude"][0])
     attrs = ncid.ncattrs()
@@ -122,39 +523,31 @@ def _read_cf1_from_ncid(ncid, symbols=["Z", "V", "W", "D", "P", "R"]):
     sweepElevation = 0.0
     sweepAzimuth = 0.0
     variables = ncid.variables
+    sweep_index = _check_sweep_index(sweep_index, _get_cf_sweep_count(ncid))
+    # Rays of the sweep in a volume, the end index is inclusive
+    rays = None
+    if "sweep_start_ray_index" in variables and "sweep_end_ray_index" in variables:
+        start = int(variables["sweep_start_ray_index"][sweep_index])
+        end = int(variables["sweep_end_ray_index"][sweep_index]) + 1
+        rays = slice(start, end)
+        if "time" in variables and start > 0:
+            timestamp += float(variables["time"][start] - variables["time"][0])
+    first = rays.start if rays else 0
     elevations = np.array(variables["elevation"][:], dtype=np.float32)
     azimuths = np.array(variables["azimuth"][:], dtype=np.float32)
-    mode = b"".join(variables["sweep_mode"][:]).decode("utf-8", errors="ignore").rstrip(" \x00")
+    mode = _get_string(variables["sweep_mode"], sweep_index)
+    fixedAngle = float(np.ravel(variables["fixed_angle"][:])[sweep_index])
     if mode == "azimuth_surveillance":
-        sweepElevation = float(variables["fixed_angle"][:])
+        sweepElevation = fixedAngle
     elif mode == "rhi":
-        sweepAzimuth = float(variables["fixed_angle"][:])
-    products = {}
-    if "Z" in symbols:
-        if "DBZ" in variables:
-            products["Z"] = _get_variable_as_masked_float32(variables, "DBZ")
-        elif "DBZHC" in variables:
-            products["Z"] = _get_variable_as_masked_float32(variables, "DBZHC")
-    if "V" in symbols:
-        if "VEL" in variables:
-            products["V"] = _get_variable_as_masked_float32(variables, "VEL")
-        elif "VR" in variables:
-            products["V"] = _get_variable_as_masked_float32(variables, "VR")
-    if "W" in symbols and "WIDTH" in variables:
-        products["W"] = _get_variable_as_masked_float32(variables, "WIDTH")
-    if "D" in symbols and "ZDR" in variables:
-        products["D"] = _get_variable_as_masked_float32(variables, "ZDR")
-    if "P" in symbols and "PHIDP" in variables:
-        products["P"] = _get_variable_as_masked_float32(variables, "PHIDP")
-    if "R" in symbols and "RHOHV" in variables:
-        products["R"] = _get_variable_as_masked_float32(variables, "RHOHV")
+        sweepAzimuth = fixedAngle
     prf = "-"
     waveform = "u"
     gatewidth = 100.0
     if "prt" in variables:
-        prf = round(1.0 / float(variables["prt"][:][0]), 1)
+        prf = round(1.0 / float(variables["prt"][first]), 1)
     elif "prf" in variables:
-        prf = round(float(variables["prf"][:][0]), 1)
+        prf = round(float(variables["prf"][first]), 1)
     if "radarkit_parameters" in ncid.groups:
         group = ncid.groups["radarkit_parameters"]
         attrs = group.ncattrs()
@@ -163,11 +556,16 @@ def _read_cf1_from_ncid(ncid, symbols=["Z", "V", "W", "D", "P", "R"]):
         if "prt" in attrs:
             prf = round(float(group.getncattr("prf")), 1)
     ranges = np.array(variables["range"][:], dtype=np.float32)
-    if "meters_between_gates" in variables["range"]:
+    if "meters_between_gates" in variables["range"].ncattrs():
         gatewidth = float(variables["range"].getncattr("meters_between_gates"))
     else:
         gatewidth = float(ranges[1] - ranges[0])
-    return {
+    selection = _get_window(ranges, azimuths, window, rays)
+    elevations, azimuths, ranges = _take(elevations, selection), _take(azimuths, selection), _take(ranges, selection, 1)
+    products, codecs = _get_products(
+        variables, CF1_VARIABLE_NAMES, symbols=symbols, raw=raw, masked=masked, lazy=lazy, selection=selection
+    )
+    sweep = {
         "kind": Kind.CF1,
         "txrx": TxRx.MONOSTATIC,
         "time": timestamp,
@@ -184,10 +582,15 @@ def _read_cf1_from_ncid(ncid, symbols=["Z", "V", "W", "D", "P", "R"]):
         "ranges": ranges,
         "products": products,
     }
+    if raw:
+        sweep["codecs"] = codecs
+    return sweep
 
 
 # TODO: Need to make this more generic
-def _read_cf2_from_ncid(ncid, symbols=["Z", "V", "W", "D", "P", "R"]):
+def _read_cf2_from_ncid(
+    ncid, symbols=["Z", "V", "W", "D", "P", "R"], sweep_index=0, raw=False, masked=True, lazy=False, window=None
+):
     site = ncid.getncattr("instrument_name")
     location = get_nexrad_location(site)
     if location:
@@ -203,7 +606,10 @@ def _read_cf2_from_ncid(ncid, symbols=["Z", "V", "W", "D", "P", "R"]):
         timestamp = datetime.datetime.fromisoformat(timeString).replace(tzinfo=utc).timestamp()
     except Exception as e:
         raise ValueError(f"Unexpected timeString = {timeString} {e}")
-    variables = ncid.groups["sweep_0001"].variables
+    groups = _get_cf2_sweep_groups(ncid)
+    if not groups:
+        raise ValueError("No sweep groups")
+    variables = ncid.groups[groups[_check_sweep_index(sweep_index, len(groups))]].variables
     sweepMode = variables["sweep_mode"][:]
     fixedAngle = float(variables["fixed_angle"][:])
     sweepElevation, sweepAzimuth = 0.0, 0.0
@@ -214,23 +620,12 @@ def _read_cf2_from_ncid(ncid, symbols=["Z", "V", "W", "D", "P", "R"]):
     elevations = np.array(variables["elevation"][:], dtype=np.float32)
     azimuths = np.array(variables["azimuth"][:], dtype=np.float32)
     ranges = np.array(variables["range"][:], dtype=np.float32)
-    products = {}
-    if "Z" in symbols:
-        if "DBZ" in variables:
-            products["Z"] = _get_variable_as_masked_float32(variables, "DBZ")
-        elif "RCP" in variables:
-            products["Z"] = _get_variable_as_masked_float32(variables, "RCP")
-    if "V" in symbols and "VEL" in variables:
-        products["V"] = _get_variable_as_masked_float32(variables, "VEL")
-    if "W" in symbols and "WIDTH" in variables:
-        products["W"] = _get_variable_as_masked_float32(variables, "WIDTH")
-    if "D" in symbols and "ZDR" in variables:
-        products["D"] = _get_variable_as_masked_float32(variables, "ZDR")
-    if "P" in symbols and "PHIDP" in variables:
-        products["P"] = _get_variable_as_masked_float32(variables, "PHIDP")
-    if "R" in symbols and "RHOHV" in variables:
-        products["R"] = _get_variable_as_masked_float32(variables, "RHOHV")
-    return {
+    selection = _get_window(ranges, azimuths, window)
+    elevations, azimuths, ranges = _take(elevations, selection), _take(azimuths, selection), _take(ranges, selection, 1)
+    products, codecs = _get_products(
+        variables, CF2_VARIABLE_NAMES, symbols=symbols, raw=raw, masked=masked, lazy=lazy, selection=selection
+    )
+    sweep = {
         "kind": Kind.CF2,
         "txrx": TxRx.BISTATIC,
         "time": timestamp,
@@ -250,9 +645,29 @@ def _read_cf2_from_ncid(ncid, symbols=["Z", "V", "W", "D", "P", "R"]):
         "ranges": ranges,
         "products": products,
     }
+    if raw:
+        sweep["codecs"] = codecs
+    return sweep
 
 
-def _read_wds_from_ncid(ncid, verbose=0):
+def _get_wds_values(variables, name, selection=None, verbose=0):
+    if name == "PhiDP":
+        # Radians or degrees is decided on the whole variable, the window is taken afterwards
+        values = np.array(variables[name][:], dtype=np.float32)
+        if values.size:
+            max_value = np.nanmax(values)
+            if max_value < 3.142:
+                if verbose > 0:
+                    print(f"Converting {name} to degrees   max(PhiDP) = {max_value:.3f}")
+                values = values * 180.0 / np.pi
+        values = np.array(_read_variable(values, selection), dtype=np.float32)
+    else:
+        values = np.array(_read_variable(variables[name], selection), dtype=np.float32)
+    values[values < -900] = np.nan
+    return values
+
+
+def _read_wds_from_ncid(ncid, lazy=False, window=None, verbose=0):
     name = ncid.getncattr("TypeName")
     attrs = ncid.ncattrs()
     variables = ncid.variables
@@ -266,30 +681,13 @@ def _read_wds_from_ncid(ncid, verbose=0):
         logger.warning(f"Missing GateSize or GateWidth in {name}")
         r0, nr, dr = 0.0, ncid.dimensions["Gate"].size, 1.0
     ranges = r0 + np.arange(nr, dtype=np.float32) * dr
-    values = np.array(variables[name][:], dtype=np.float32)
-    if name == "PhiDP":
-        max_value = np.nanmax(values)
-        if max_value < 3.142:
-            if verbose > 0:
-                print(f"Converting {name} to degrees   max(PhiDP) = {max_value:.3f}")
-            values = values * 180.0 / np.pi
-    values[values < -900] = np.nan
+    selection = _get_window(ranges, azimuths, window)
+    elevations, azimuths, ranges = _take(elevations, selection), _take(azimuths, selection), _take(ranges, selection, 1)
     scantime = EPOCH_DATETIME_UTC + datetime.timedelta(seconds=int(ncid.getncattr("Time")))
     timestamp = scantime.timestamp()
-    if name == "Intensity" or name == "Corrected_Intensity" or name == "Reflectivity":
-        symbol = "Z"
-    elif name == "Radial_Velocity" or name == "Velocity":
-        symbol = "V"
-    elif name == "Width":
-        symbol = "W"
-    elif name == "Differential_Reflectivity":
-        symbol = "D"
-    elif name == "PhiDP":
-        symbol = "P"
-    elif name == "RhoHV":
-        symbol = "R"
-    else:
-        symbol = "U"
+    symbol = WDS_SYMBOLS.get(name, "U")
+    load = functools.partial(_get_wds_values, variables, name, selection=selection, verbose=verbose)
+    products = LazyProducts({symbol: load}) if lazy else {symbol: load()}
     return {
         "kind": Kind.WDS,
         "txrx": TxRx.MONOSTATIC,
@@ -306,60 +704,178 @@ def _read_wds_from_ncid(ncid, verbose=0):
         "elevations": elevations,
         "azimuths": azimuths,
         "ranges": ranges,
-        "products": {symbol: values},
+        "products": products,
     }
 
 
-def _quartet_to_tarinfo(quartet):
-    info = tarfile.TarInfo(quartet[0])
-    info.size = quartet[1]
-    info.offset = quartet[2]
-    info.offset_data = quartet[3]
-    return info
+@contextlib.contextmanager
+def _dataset(resources, *args, **kwargs):
+    # Without resources, the dataset is closed on exit. Otherwise, it is kept open in resources
+    ncid = Dataset(*args, **kwargs)
+    if resources is None:
+        with ncid:
+            yield ncid
+    else:
+        resources.append(ncid)
+        yield ncid
+
 
+def _is_buffer(source):
+    return isinstance(source, (bytes, bytearray, memoryview))
 
-def _read_tar(source, symbols=["Z", "V", "W", "D", "P", "R"], tarinfo=None, want_tarinfo=False, verbose=0):
+
+def _name_of(source):
+    # A source in memory has no name, only its size is shown
+    return f"<{memoryview(source).nbytes:,d} B in memory>" if _is_buffer(source) else source
+
+
+def _get_format(source):
+    """
+    Format of a source, from the extension of a path or the leading bytes of a buffer
+
+    :return: "tar", "nc", "native", "nexrad" or None
+    """
+    if _is_buffer(source):
+        head = bytes(memoryview(source).cast("B")[:512])
+        for magic, kind in BUFFER_MAGICS:
+            if head.startswith(magic):
+                return kind
+        return "tar" if head[257:262] == b"ustar" else None
+    ext = os.path.splitext(source)[1]
+    if ext in [".txz", ".xz", ".tgz", ".tar"]:
+        return "tar"
+    if ext == ".nc":
+        return "nc"
+    if is_native_format(source):
+        return "native"
+    if is_nexrad_format(source):
+        return "nexrad"
+    return None
+
+
+def _open_tar(source, mode="r|*"):
+    if _is_buffer(source):
+        return tarfile.open(fileobj=io.BytesIO(source), mode=mode)
+    return tarfile.open(source, mode=mode)
+
+
+def _open_nc(source):
+    if _is_buffer(source):
+        return Dataset("memory", mode="r", memory=source)
+    return Dataset(source, mode="r")
+
+
+def _merge_sweeps(sweep, single):
+    if sweep is None:
+        return single
+    if isinstance(sweep["products"], LazyProducts):
+        sweep["products"].merge(single["products"])
+    else:
+        sweep["products"] = {**sweep["products"], **single["products"]}
+    if "codecs" in single:
+        sweep["codecs"] = {**sweep.get("codecs", {}), **single["codecs"]}
+    return sweep
+
+
+def _read_tar_members(source, symbols=["Z", "V", "W", "D", "P", "R"], tarinfo=None, verbose=0):
+    """
+    Reads the wanted members of a tarball in one forward pass of the stream
+
+    Extracting members one by one from a compressed tarball decompresses the stream from
+    the start every time. Here, the stream is decompressed once and the pass ends after the
+    last wanted member, which is known from the offsets in tarinfo. Without tarinfo, it is
+    derived in the same pass, as read_tarinfo() would.
+
+    :return: (tarinfo, {key: content}) where key is "*" or a symbol, as in tarinfo
+    """
+    myname = colorize("radar._read_tar_members()", "green")
+    if tarinfo:
+        keys = ["*"] if "*" in tarinfo else [s for s in symbols if s in tarinfo]
+        wanted = {tarinfo[key][0]: key for key in keys}
+        last = max(tarinfo[key][2] for key in keys) if keys else -1
+        quartets = None
+    else:
+        wanted, last, quartets = None, None, []
+    contents = {}
+    try:
+        with _open_tar(source) as aid:
+            for m in aid:
+                if not m.isfile() or os.path.basename(m.name).startswith("."):
+                    continue
+                if quartets is None:
+                    if m.name in wanted:
+                        contents[wanted[m.name]] = aid.extractfile(m).read()
+                    if m.offset >= last:
+                        break
+                    continue
+                parts = re_4parts.search(os.path.basename(m.name))
+                symbol = parts.groupdict()["symbol"] if parts else None
+                # The first member is also kept in case it is the only one
+                content = aid.extractfile(m).read() if not quartets or symbol in symbols else None
+                quartets.append(([m.name, m.size, m.offset, m.offset_data], symbol, content))
+    except tarfile.ReadError:
+        logger.error(f"{myname} The archive {_name_of(source)} is not a valid tar file")
+        return {}, {}
+    except Exception as e:
+        logger.error(f"{myname} {e}")
+        return {}, {}
+    if quartets is None:
+        return tarinfo, contents
+    if verbose > 1:
+        logger.debug(f"{myname} {[quartet[0] for quartet, _, _ in quartets]}")
+    # Same layout as read_tarinfo()
+    tarinfo = {}
+    if len(quartets) == 1:
+        quartet, _, content = quartets[0]
+        tarinfo["*"] = quartet
+        contents["*"] = content
+        return tarinfo, contents
+    for quartet, symbol, content in quartets:
+        if symbol is None:
+            logger.warning(f"{myname} Unable to parse symbol from {quartet[0]}")
+            continue
+        tarinfo[symbol] = quartet
+        if symbol in symbols:
+            contents[symbol] = content
+    return tarinfo, contents
+
+
+def _read_tar(
+    source,
+    symbols=["Z", "V", "W", "D", "P", "R"],
+    tarinfo=None,
+    want_tarinfo=False,
+    raw=False,
+    masked=True,
+    resources=None,
+    window=None,
+    verbose=0,
+):
     myname = colorize("radar._read_tar()", "green")
-    if tarinfo is None:
-        tarinfo = read_tarinfo(source, verbose=verbose)
-    show = colorize(source, "yellow")
+    show = colorize(_name_of(source), "yellow")
+    lazy = resources is not None
+    tarinfo, contents = _read_tar_members(source, symbols=symbols, tarinfo=tarinfo, verbose=verbose)
     if not tarinfo:
         logger.error(f"{myname} Unable to retrieve tarinfo in {show}")
         return (None, tarinfo) if want_tarinfo else None
     elif verbose > 1:
         logger.debug(f"{myname} {show}")
     sweep = None
-    with tarfile.open(source) as aid:
-        if "*" in tarinfo:
-            info = _quartet_to_tarinfo(tarinfo["*"])
-            fid = aid.extractfile(info)
-            if fid is None:
-                logger.error(f"{myname} Unable to extract {info.name} in {show}")
-                return (None, tarinfo) if want_tarinfo else None
-            content = fid.read()
-            fid.close()
-            with Dataset("memory", memory=content) as ncid:
-                sweep = _read_ncid(ncid, symbols=symbols, verbose=verbose)
-        else:
-            available_symbols = [s for s in symbols if s in tarinfo]
-            for symbol in available_symbols:
-                info = _quartet_to_tarinfo(tarinfo[symbol])
-                fid = aid.extractfile(info)
-                if fid is None:
-                    logger.error(f"{myname} Unable to extract {info.name} in {show}")
-                    return (None, tarinfo) if want_tarinfo else None
-                content = fid.read()
-                fid.close()
-                with Dataset("memory", mode="r", memory=content) as ncid:
-                    single = _read_ncid(ncid, symbols=symbols, verbose=verbose)
-                if sweep is None:
-                    sweep = single
-                else:
-                    sweep["products"] = {**sweep["products"], **single["products"]}
+    keys = ["*"] if "*" in tarinfo else [s for s in symbols if s in tarinfo]
+    for key in keys:
+        if key not in contents:
+            logger.error(f"{myname} Unable to extract {tarinfo[key][0]} in {show}")
+            return (None, tarinfo) if want_tarinfo else None
+        with _dataset(resources, "memory", mode="r", memory=contents.pop(key)) as ncid:
+            single = _read_ncid(
+                ncid, symbols=symbols, raw=raw, masked=masked, lazy=lazy, window=window, verbose=verbose
+            )
+        sweep = _merge_sweeps(sweep, single)
     if sweep is None:
-        logger.error(f"{myname} No sweep found in {source}")
+        logger.error(f"{myname} No sweep found in {show}")
         return (None, tarinfo) if want_tarinfo else None
-    if sweep["sweepElevation"] == 0.0 and sweep["sweepAzimuth"] == 0.0:
+    # Without a name, a buffer has only the scan angle in the files
+    if sweep["sweepElevation"] == 0.0 and sweep["sweepAzimuth"] == 0.0 and not _is_buffer(source):
         basename = os.path.basename(source)
         parts = re_3parts.search(basename)
         if parts is None:
@@ -373,92 +889,232 @@ def _read_tar(source, symbols=["Z", "V", "W", "D", "P", "R"], tarinfo=None, want
     return (sweep, tarinfo) if want_tarinfo else sweep
 
 
-def _read_nc(source, symbols=["Z", "V", "W", "D", "P", "R"], verbose=0):
+def _list_siblings(folder):
+    """
+    Groups the per-symbol NetCDF files of a folder by (name, time, scan) of re_4parts
+
+    The folder is listed once with os.scandir() and again only when its modification time
+    changes. Symbols that are WDSS-II type names, e.g., PX-20240529-150246-E4.0-Reflectivity.nc,
+    are mapped to their symbols.
+
+    :return: {(name, time, scan): {symbol: path}}
+    """
+    folder = folder or "."
+    try:
+        mtime = os.stat(folder).st_mtime_ns
+    except OSError:
+        return {}
+    with _siblings_lock:
+        entry = _siblings.get(folder)
+        if entry and entry[0] == mtime and entry[1] - mtime > SIBLING_RACY_SECONDS * 1e9:
+            _siblings.move_to_end(folder)
+            return entry[2]
+    scanned = datetime.datetime.now().timestamp() * 1e9
+    groups = {}
+    with os.scandir(folder) as entries:
+        for item in entries:
+            if not item.name.endswith(".nc"):
+                continue
+            parts = re_4parts.search(item.name)
+            if parts is None:
+                continue
+            # The symbol group stops at characters like "_" so take the rest of the name
+            symbol = item.name[parts.start("symbol") : -3]
+            symbol = WDS_SYMBOLS.get(symbol, symbol)
+            key = (parts["name"], parts["time"], parts["scan"])
+            groups.setdefault(key, {})[symbol] = os.path.join(folder, item.name)
+    with _siblings_lock:
+        _siblings[folder] = (mtime, scanned, groups)
+        _siblings.move_to_end(folder)
+        while len(_siblings) > SIBLING_FOLDERS:
+            _siblings.popitem(last=False)
+    return groups
+
+
+def _read_nc(
+    source,
+    symbols=["Z", "V", "W", "D", "P", "R"],
+    sweep_index=0,
+    raw=False,
+    masked=True,
+    resources=None,
+    window=None,
+    verbose=0,
+):
     myname = colorize("radar._read_nc()", "green")
+    lazy = resources is not None
+    options = dict(symbols=symbols, sweep_index=sweep_index, raw=raw, masked=masked, lazy=lazy, window=window)
+    if _is_buffer(source):
+        with _dataset(resources, "memory", mode="r", memory=source) as ncid:
+            return _read_ncid(ncid, **options, verbose=verbose)
     basename = os.path.basename(source)
     parts = re_4parts.search(basename)
     if parts is None:
         parts = re_3parts.search(basename)
         if parts is None:
-            with Dataset(source, mode="r") as ncid:
-                return _read_ncid(ncid, symbols=symbols, verbose=verbose)
+            with _dataset(resources, source, mode="r") as ncid:
+                return _read_ncid(ncid, **options, verbose=verbose)
     parts = parts.groupdict()
     if verbose > 1:
         logger.debug(f"{myname} parts = {parts}")
     if "symbol" not in parts:
-        with Dataset(source, mode="r") as ncid:
-            return _read_ncid(ncid, symbols=symbols, verbose=verbose)
-    folder = os.path.dirname(source)
-    known = True
-    files = []
-    for symbol in symbols:
-        basename = "-".join([parts["name"], parts["time"], parts["scan"], symbol]) + ".nc"
-        path = os.path.join(folder, basename)
-        if not os.path.exists(path):
-            known = False
-            break
-        files.append(path)
-    if not known:
+        with _dataset(resources, source, mode="r") as ncid:
+            return _read_ncid(ncid, **options, verbose=verbose)
+    siblings = _list_siblings(os.path.dirname(source)).get((parts["name"], parts["time"], parts["scan"]), {})
+    files = [siblings[symbol] for symbol in symbols if symbol in siblings]
+    if len(files) < len(symbols):
         if verbose > 1:
             logger.debug(f"{myname} {source}")
-        with Dataset(source, mode="r") as ncid:
-            return _read_ncid(ncid, symbols=symbols, verbose=verbose)
+        with _dataset(resources, source, mode="r") as ncid:
+            return _read_ncid(ncid, **options, verbose=verbose)
     sweep = None
     for file in files:
         if verbose > 1:
             show = colorize(os.path.basename(file), "yellow")
             logger.debug(f"{myname} {show}")
-        with Dataset(file, mode="r") as ncid:
-            single = _read_ncid(ncid, symbols=symbols, verbose=verbose)
+        with _dataset(resources, file, mode="r") as ncid:
+            single = _read_ncid(ncid, **options, verbose=verbose)
         if single is None:
             logger.error(f"{myname} Unexpected {file}")
             return None
-        if sweep is None:
-            sweep = single
-        else:
-            sweep["products"] = {**sweep["products"], **single["products"]}
+        sweep = _merge_sweeps(sweep, single)
     return sweep
 
 
-def _read_nexrad(source, sweep_index=0, symbols=["Z", "V", "W", "D", "P", "R"], verbose=0):
+def _read_nexrad(
+    source,
+    sweep_index=0,
+    symbols=["Z", "V", "W", "D", "P", "R"],
+    workers=1,
+    index=None,
+    raw=False,
+    masked=True,
+    resources=None,
+    window=None,
+    verbose=0,
+):
+    myname = colorize("radar._read_nexrad()", "green")
     if verbose > 1:
-        myname = colorize("radar._read_nexrad()", "green")
-        logger.debug(f"{myname} {colorize(source, 'yellow')}")
+        logger.debug(f"{myname} {colorize(_name_of(source), 'yellow')}")
 
-    vcp, msg31, timestamp = get_vcp_msg31_timestamp(source, sweep_index=sweep_index, verbose=verbose)
+    vcp, radials, timestamp = get_vcp_radials_timestamp(
+        source, sweep_index=sweep_index, workers=workers, index=index, verbose=verbose
+    )
     if vcp is None or len(vcp.data) <= sweep_index:
-        logger.error(f"{myname} Unable to read VCP from {source}")
+        logger.error(f"{myname} Unable to read VCP from {_name_of(source)}")
         return None
+    lazy = resources is not None
+    if lazy:
+        resources.append(radials)
+    return sweep_from_radials(
+        vcp, radials, timestamp, sweep_index, symbols=symbols, raw=raw, masked=masked, lazy=lazy, window=window
+    )
+
+
+def _read_nexrad_volume(
+    source,
+    sweeps=None,
+    symbols=["Z", "V", "W", "D", "P", "R"],
+    workers=1,
+    index=None,
+    raw=False,
+    masked=True,
+    window=None,
+    verbose=0,
+):
+    myname = colorize("radar._read_nexrad_volume()", "green")
+    if verbose > 1:
+        logger.debug(f"{myname} {colorize(_name_of(source), 'yellow')}")
+
+    vcp, radials, timestamp = get_vcp_sweeps_timestamp(source, sweeps, workers=workers, index=index, verbose=verbose)
+    # (sweep_index, sweep) pairs, sweeps without radials are skipped
+    output = []
+    for sweep_index, rays in radials.items():
+        if len(rays) == 0:
+            logger.warning(f"{myname} No message 31 records for sweep {sweep_index} in {_name_of(source)}")
+            continue
+        sweep = sweep_from_radials(
+            vcp, rays, timestamp, sweep_index, symbols=symbols, raw=raw, masked=masked, window=window
+        )
+        output.append((sweep_index, sweep))
+    return output
+
+
+def _moment_from_radials(radials, name, gates, offset, scale, raw=False, masked=True):
+    _, codes = radials.moment(name, gates=gates)
+    if codes is None:
+        # No radial in the selection
+        codes = np.zeros((len(radials), len(range(gates.start, gates.stop, gates.step))), dtype=np.uint8)
+    if raw:
+        return codes.astype(codes.dtype.newbyteorder("="))
+    # One pass from the codes into the output, scaled in place, then one pass for the mask
+    values = np.empty(codes.shape, dtype=np.float32)
+    np.subtract(codes, offset, out=values)
+    values /= scale
+    if masked:
+        return np.ma.array(values, mask=codes <= 1, fill_value=np.nan)
+    values[codes <= 1] = np.nan
+    return values
+
+
+def sweep_from_radials(
+    vcp,
+    radials,
+    timestamp,
+    sweep_index,
+    symbols=["Z", "V", "W", "D", "P", "R"],
+    raw=False,
+    masked=True,
+    lazy=False,
+    window=None,
+):
+    """
+    Assembles a sweep in the layout of read() from the type 31 radials of a NEXRAD sweep
+
+    Parameters:
+    vcp: Message - The VCP (message type 5) of the volume
+    radials: Radials - The type 31 radials of the sweep
+    timestamp: float - Time of the volume in seconds since the epoch
+    sweep_index: int - Index of the sweep in the VCP
 
-    nrays = len(msg31)
-    data = msg31[0].data
+    Optional keyword arguments symbols, raw, masked and window are the same as read(),
+    lazy keeps a loader of each product instead of the product.
+    """
+    # Only the first radial is fully decoded, for the constants of the sweep
+    first = radials.message(0)
+    data = first.data
     products = {"REF", "VEL", "SW", "ZDR", "PHI", "RHO"} & set(data.keys())
     max_gates = min([data[p].ngates for p in products])
     r0 = data["REF"].r0
     dr = data["REF"].dr
     rr = np.arange(r0, r0 + max_gates * dr, dr, dtype=np.float32)
-    ee = np.zeros(nrays, dtype=np.float32)
-    aa = np.zeros(nrays, dtype=np.float32)
-    days = np.zeros(nrays, dtype=np.int32)
-    secs = np.zeros(nrays, dtype=np.int32)
-    for k, msg in enumerate(msg31):
-        data_header = msg.head
-        ee[k] = data_header.elevation_angle
-        aa[k] = data_header.azimuth_angle
-        days[k] = data_header.timestamp
-        secs[k] = data_header.timestamp_ms
-    # Assemble the products
-    arrays = {}
-    for symbol in products:
-        ngates = data[symbol].ngates
-        values = np.zeros((nrays, ngates), dtype="H" if data[symbol].word_size == 16 else "B")
+    # Rays and gates of the window, gates are truncated while the blocks are copied
+    gates = slice(0, max_gates, 1)
+    selection = _get_window(rr, radials.azimuths, window)
+    if selection is not None:
+        runs, gates = selection
+        if runs != [slice(0, len(radials))]:
+            radials = radials[np.concatenate([np.arange(run.start, run.stop) for run in runs])]
+        rr = rr[gates]
+    ee = radials.elevations
+    aa = radials.azimuths
+    # Assemble only the requested products, or keep their loaders if lazy
+    arrays, codecs = {}, {}
+    for symbol in [p for p in products if MOMENT_SYMBOLS[p] in symbols]:
         offset = np.float32(data[symbol].offset)
         scale = np.float32(data[symbol].scale)
-        for k, msg in enumerate(msg31):
-            values[k, :] = msg.data[symbol].values
-        mask = values <= 1
-        values = (values - offset) / scale
-        arrays[symbol] = np.ma.array(values[:, :max_gates], mask=mask[:, :max_gates], fill_value=np.nan)
+        if raw:
+            # Native integer codes, value = (code - offset) / scale, 0 = below threshold, 1 = range folded
+            codecs[MOMENT_SYMBOLS[symbol]] = {
+                "scale": 1.0 / float(scale),
+                "offset": -float(offset) / float(scale),
+                "fill": (0, 1),
+            }
+        args = (radials, symbol, gates, offset, scale)
+        if lazy:
+            arrays[symbol] = functools.partial(_moment_from_radials, *args, raw=raw, masked=masked)
+        else:
+            arrays[symbol] = _moment_from_radials(*args, raw=raw, masked=masked)
     # Replace keys: REF -> Z, VEL -> V, SW -> W, ZDR -> D, PHI -> P, RHO -> R
     products = {}
     if "REF" in arrays and "Z" in symbols:
@@ -473,7 +1129,9 @@ def _read_nexrad(source, sweep_index=0, symbols=["Z", "V", "W", "D", "P", "R"],
         products["P"] = arrays["PHI"]
     if "RHO" in arrays and "R" in symbols:
         products["R"] = arrays["RHO"]
-    return {
+    if lazy:
+        products = LazyProducts(products)
+    sweep = {
         "kind": Kind.M31,
         "txrx": TxRx.MONOSTATIC,
         "time": timestamp,
@@ -482,7 +1140,7 @@ def _read_nexrad(source, sweep_index=0, symbols=["Z", "V", "W", "D", "P", "R"],
         "sweepMode": "ppi",
         "sweepElevation": vcp.data[sweep_index].elevation_angle,
         "sweepAzimuth": 0.0,
-        "prf": float(msg31[0].prf),
+        "prf": float(first.prf),
         "waveform": "u",
         "gatewidth": float(data["REF"].dr),
         "elevations": ee,
@@ -490,12 +1148,15 @@ def _read_nexrad(source, sweep_index=0, symbols=["Z", "V", "W", "D", "P", "R"],
         "ranges": rr,
         "products": products,
     }
+    if raw:
+        sweep["codecs"] = {key: codecs[key] for key in products}
+    return sweep
 
 
 def read_tarinfo(source, verbose=0):
     tarinfo = {}
     try:
-        with tarfile.open(source) as aid:
+        with _open_tar(source, mode="r:*") as aid:
             members = aid.getmembers()
             members = [m for m in members if m.isfile() and not os.path.basename(m.name).startswith(".")]
             if verbose > 1:
@@ -514,22 +1175,22 @@ def read_tarinfo(source, verbose=0):
                     parts = parts.groupdict()
                     tarinfo[parts["symbol"]] = [m.name, m.size, m.offset, m.offset_data]
     except tarfile.ReadError:
-        logger.error(f"Error: The archive {source} is not a valid tar file")
+        logger.error(f"Error: The archive {_name_of(source)} is not a valid tar file")
     except tarfile.ExtractError:
-        logger.error(f"Error: An error occurred while extracting the archive {source}")
+        logger.error(f"Error: An error occurred while extracting the archive {_name_of(source)}")
     except Exception as e:
         logger.error(f"Error: {e}")
     return tarinfo
 
 
-def read(source: str, **kwargs) -> Optional[dict] | Tuple[Optional[dict], Optional[dict]]:
+def read(source: str | bytes, **kwargs) -> Optional[dict] | Tuple[Optional[dict], Optional[dict]]:
     """
     read(source, **kwargs):
 
     Read radar data from a file or a tarball.
 
     Parameters:
-    source: str - Path to a file or a tarball.
+    source: str or bytes - Path to a file or a tarball, or its content in memory.
 
     Optional keyword arguments:
     verbose: int - Verbosity level, default = 0
@@ -538,60 +1199,388 @@ def read(source: str, **kwargs) -> Optional[dict] | Tuple[Optional[dict], Option
     tarinfo: dict - Tarball information, default = None
     want_tarinfo: bool - Return tarinfo, default = False
     u8: bool - Convert values to uint8, default = False
+    sweep_index: int - Sweep index of a NEXRAD or CF-Radial volume, default = 0
+    workers: int - Number of threads to decompress NEXRAD records, default = 1
+    index: bool or str - NEXRAD index, True for a sidecar or a folder for a shared index, default = None
+    cache: bool - Keep the sweep in memory for the next read of the same file and options, default = False
+    compact: bool - Return a Sweep with all products in one contiguous float32 cube, default = False
+    raw: bool - Keep the native integer codes with their scale and offset in "codecs", default = False
+    masked: bool - Products as masked arrays, False for float32 arrays with NaN at invalid gates, default = True
+    max_range: float - Only the gates up to this range in meters, default = None
+    gate_slice: slice or tuple - Only these gates, e.g., slice(0, 400) or (0, 400), default = None
+    azimuth_range: tuple - Only the rays from start to end azimuth in degrees, e.g., (350, 10), default = None
+
+    With raw = True, packed products are the integer codes as stored, value = code * scale + offset,
+    and sweep["codecs"][symbol] = {"scale": scale, "offset": offset, "fill": codes that are not valid}.
+    Use raw2val() or raw2ind() to convert them through a lookup table. Unpacked products stay float32.
+
+    Content in memory, i.e., bytes, bytearray or memoryview, is recognized by its leading bytes. NEXRAD
+    content has to be a V06 volume, which has the time in its header, and it is never cached. Products
+    of native content are read-only views of it.
+
+    With cache = True, the arrays of the sweep are read-only, use np.array(value) for a copy to modify.
+    The file is read again when its size or modification time changes, or when files are added
+    to its folder. See cache_info(), cache_clear() and set_cache_size().
     """
     verbose = kwargs.get("verbose", 0)
-    symbols = kwargs.get("symbols", ["Z", "V", "W", "D", "P", "R"])
-    finite = kwargs.get("finite", False)
-    tarinfo = kwargs.get("tarinfo", None)
     want_tarinfo = kwargs.get("want_tarinfo", False)
     #
     myname = colorize("radar.read()", "green")
     if verbose:
         logger.setLevel(logging.DEBUG if verbose > 1 else logging.INFO)
-        show = colorize(source, "yellow")
+        show = colorize(_name_of(source), "yellow")
         logger.info(f"{myname} {show}")
-    if not os.path.exists(source):
+    key = _cache_key(source, kwargs) if kwargs.get("cache", False) else None
+    output = None if key is None else _cache.get(key)
+    if output is None:
+        data, tarinfo = _read(source, myname, **kwargs)
+        post_process(data, u8=kwargs.get("u8", False), finite=kwargs.get("finite", False))
+        if kwargs.get("compact", False) and not isinstance(data, Sweep):
+            data = Sweep.from_dict(data)
+        if key is not None:
+            data, tarinfo = _cache.put(key, (data, tarinfo))
+    else:
+        if verbose > 1:
+            logger.debug(f"{myname} Cached {_name_of(source)}")
+        data, tarinfo = output
+    if want_tarinfo:
+        return data, tarinfo
+    return data
+
+
+def _cache_key(source, kwargs):
+    # The sources of NEXRAD volumes and multi-file sweeps are in the same folder, so its time is part of the key
+    if _is_buffer(source):
+        return None
+    try:
+        path = os.path.realpath(source)
+        stat = os.stat(path)
+        folder = os.stat(os.path.dirname(path))
+    except OSError:
+        return None
+    gate_slice = kwargs.get("gate_slice")
+    if isinstance(gate_slice, slice):
+        gate_slice = (gate_slice.start, gate_slice.stop, gate_slice.step)
+    azimuth_range = kwargs.get("azimuth_range")
+    return (
+        path,
+        stat.st_size,
+        stat.st_mtime_ns,
+        folder.st_mtime_ns,
+        tuple(kwargs.get("symbols", ["Z", "V", "W", "D", "P", "R"])),
+        kwargs.get("sweep_index", 0),
+        kwargs.get("u8", False),
+        kwargs.get("finite", False),
+        kwargs.get("raw", False),
+        kwargs.get("masked", True),
+        kwargs.get("want_tarinfo", False),
+        kwargs.get("compact", False),
+        kwargs.get("max_range"),
+        None if gate_slice is None else tuple(gate_slice),
+        None if azimuth_range is None else tuple(azimuth_range),
+    )
+
+
+def cache_info() -> SweepCacheInfo:
+    """
+    Returns (hits, misses, count, nbytes, max_bytes) of the sweeps of read(..., cache=True)
+    """
+    return _cache.info()
+
+
+def cache_clear():
+    """
+    Removes the sweeps of read(..., cache=True) and resets the statistics
+    """
+    _cache.clear()
+
+
+def set_cache_size(max_bytes: int):
+    """
+    Sets the total size of the arrays kept by read(..., cache=True), default = 512 MiB
+    """
+    _cache.resize(max_bytes)
+
+
+def open_sweep(source: str | bytes, **kwargs) -> SweepHandle:
+    """
+    open_sweep(source, **kwargs), also available as radar.open(source, **kwargs):
+
+    Open radar data from a file or a tarball without loading the products.
+
+    Parameters:
+    source: str or bytes - Path to a file or a tarball, or its content in memory.
+
+    Optional keyword arguments:
+    verbose: int - Verbosity level, default = 0
+    symbols: list of str, default = ["Z", "V", "W", "D", "P", "R"]
+    tarinfo: dict - Tarball information, default = None
+    sweep_index: int - Sweep index of a NEXRAD or CF-Radial volume, default = 0
+    workers: int - Number of threads to decompress NEXRAD records, default = 1
+    index: bool or str - NEXRAD index, True for a sidecar or a folder for a shared index, default = None
+    raw: bool - Keep the native integer codes, see read(), default = False
+    masked: bool - Products as masked arrays, False for float32 arrays with NaN, default = True
+    max_range, gate_slice, azimuth_range: Window of rays and gates, see read(), default = None
+
+    Returns a handle with the same keys as the sweep from read(). A product is read and
+    converted when it is indexed for the first time. The NetCDF datasets or the decompressed
+    NEXRAD records are kept until the handle is closed.
+
+    with radar.open(file) as sweep:
+        print(sweep["time"], sweep["sweepElevation"])
+        z = sweep["products"]["Z"]
+    """
+    verbose = kwargs.get("verbose", 0)
+    #
+    myname = colorize("radar.open()", "green")
+    if verbose:
+        logger.setLevel(logging.DEBUG if verbose > 1 else logging.INFO)
+        logger.info(f"{myname} {colorize(_name_of(source), 'yellow')}")
+    resources = []
+    try:
+        data, _ = _read(source, myname, resources=resources, **kwargs)
+    except Exception:
+        for resource in resources:
+            if hasattr(resource, "close"):
+                resource.close()
+        raise
+    return SweepHandle(data, resources)
+
+
+def _read(source, myname, resources=None, **kwargs) -> Tuple[dict, dict]:
+    verbose = kwargs.get("verbose", 0)
+    symbols = kwargs.get("symbols", ["Z", "V", "W", "D", "P", "R"])
+    raw = kwargs.get("raw", False)
+    masked = kwargs.get("masked", True)
+    tarinfo = kwargs.get("tarinfo", None)
+    want_tarinfo = kwargs.get("want_tarinfo", False)
+    window = {key: kwargs.get(key) for key in ["max_range", "gate_slice", "azimuth_range"]}
+    if not _is_buffer(source) and not os.path.exists(source):
         raise FileNotFoundError(f"{myname} {source} not found")
-    ext = os.path.splitext(source)[1]
-    if ext in [".txz", ".xz", ".tgz", ".tar"]:
+    kind = _get_format(source)
+    if kind == "tar":
         output = _read_tar(
             source,
             verbose=verbose,
             symbols=symbols,
             tarinfo=tarinfo,
             want_tarinfo=want_tarinfo,
+            raw=raw,
+            masked=masked,
+            resources=resources,
+            window=window,
         )
         if want_tarinfo and isinstance(output, tuple):
             data, tarinfo = output
         else:
             data = output
-    elif ext == ".nc":
-        data = _read_nc(source, symbols=symbols, verbose=verbose)
+    elif kind == "nc":
+        data = _read_nc(
+            source,
+            symbols=symbols,
+            sweep_index=kwargs.get("sweep_index", 0),
+            raw=raw,
+            masked=masked,
+            resources=resources,
+            window=window,
+            verbose=verbose,
+        )
         tarinfo = {}
-    elif is_nexrad_format(source):
+    elif kind == "native":
+        data = _read_native(
+            source,
+            symbols=symbols,
+            masked=masked,
+            compact=kwargs.get("compact", False),
+            window=window,
+        )
+        tarinfo = {}
+    elif kind == "nexrad":
         sweep_index = kwargs.get("sweep_index", 0)
-        data = _read_nexrad(source, sweep_index=sweep_index, symbols=symbols, verbose=verbose)
+        workers = kwargs.get("workers", 1)
+        index = kwargs.get("index", None)
+        data = _read_nexrad(
+            source,
+            sweep_index=sweep_index,
+            symbols=symbols,
+            workers=workers,
+            index=index,
+            raw=raw,
+            masked=masked,
+            resources=resources,
+            window=window,
+            verbose=verbose,
+        )
         tarinfo = {}
+    elif _is_buffer(source):
+        raise ValueError(f"{myname} Unsupported format of {_name_of(source)}")
     else:
-        raise ValueError(f"{myname} Unsupported file format (ext = {ext})")
+        raise ValueError(f"{myname} Unsupported file format (ext = {os.path.splitext(source)[1]})")
     if data is None:
-        raise ValueError(f"{myname} No data found in {source}")
-    if not isinstance(data, dict) or "products" not in data:
-        raise ValueError(f"{myname} Invalid data format in {source}")
-    if kwargs.get("u8", False):
-        data["u8"] = {}
-        for key, value in data["products"].items():
-            if np.ma.isMaskedArray(value):
-                value = value.filled(np.nan)
-            data["u8"][key] = val2ind(value, symbol=key)
-    if finite:
-        for key, value in data["products"].items():
-            data["products"][key] = np.nan_to_num(value)
-    if want_tarinfo:
-        return data, tarinfo
+        raise ValueError(f"{myname} No data found in {_name_of(source)}")
+    if not isinstance(data, (dict, Sweep)) or "products" not in data:
+        raise ValueError(f"{myname} Invalid data format in {_name_of(source)}")
+    return data, tarinfo
+
+
+def _read_native(source, symbols=["Z", "V", "W", "D", "P", "R"], masked=True, compact=False, window=None):
+    # The block is memory mapped or in the buffer, the arrays are views of it unless a window selects
+    # several runs of rays. Views of a buffer are read-only so that the content of the caller is never
+    # modified, e.g., by finite = True, as a file is not with the copy-on-write map of from_file()
+    if _is_buffer(source):
+        sweep = Sweep.from_bytes(memoryview(source).toreadonly())
+    else:
+        sweep = Sweep.from_file(source)
+    selection = _get_window(sweep.ranges, sweep.azimuths, window)
+    wanted = [symbol for symbol in sweep.symbols if symbol in symbols]
+    if compact and selection is None and wanted == list(sweep.symbols):
+        return sweep
+    data = {key: value for key, value in sweep.items() if key not in ("products", "u8")}
+    data["elevations"] = _take(sweep.elevations, selection)
+    data["azimuths"] = _take(sweep.azimuths, selection)
+    data["ranges"] = _take(sweep.ranges, selection, 1)
+    products = {}
+    for symbol in wanted:
+        values = _read_variable(sweep.cube[sweep.index[symbol]], selection)
+        products[symbol] = np.ma.array(values, mask=np.isnan(values), fill_value=np.nan) if masked else values
+    data["products"] = products
     return data
 
 
+def _is_cf(ncid):
+    attrs = ncid.ncattrs()
+    return "Conventions" in attrs and _starts_with_cf(ncid.getncattr("Conventions"))
+
+
+def _read_cf_volume(
+    ncid,
+    sweeps=None,
+    symbols=["Z", "V", "W", "D", "P", "R"],
+    raw=False,
+    masked=True,
+    window=None,
+    verbose=0,
+):
+    # The dataset is opened once by the caller and closed here, each sweep reads only its rays of the variables
+    with ncid:
+        if sweeps is None:
+            sweeps = range(_get_cf_sweep_count(ncid))
+        for sweep_index in sweeps:
+            yield sweep_index, _read_ncid(
+                ncid, symbols=symbols, sweep_index=sweep_index, raw=raw, masked=masked, window=window, verbose=verbose
+            )
+
+
+def iter_volume(source: str | bytes, sweeps: Optional[List[int]] = None, **kwargs) -> Iterator[dict | Tuple[int, dict]]:
+    """
+    iter_volume(source, sweeps=None, **kwargs):
+
+    Iterate over the sweeps of a radar volume, opening or decoding the source only once.
+
+    Parameters:
+    source: str or bytes - Path to a CF-Radial file, a NEXRAD Level II file, a volume or any of the stripped files,
+            or the content of a CF-Radial file or a V06 volume in memory.
+    sweeps: list of int - Sweep indices, default = None for all sweeps
+
+    Optional keyword arguments are the same as read_volume(), and
+    want_index: bool - Yield (sweep_index, sweep) tuples, default = False
+
+    Yields sweeps in the same layout as read(). Sources other than CF-Radial and NEXRAD
+    are read as a single sweep, which has the index 0. Sweeps of a NEXRAD volume without
+    radials are skipped, use want_index = True for the index of each sweep.
+    """
+    verbose = kwargs.get("verbose", 0)
+    want_index = kwargs.get("want_index", False)
+    symbols = kwargs.get("symbols", ["Z", "V", "W", "D", "P", "R"])
+    options = dict(
+        symbols=symbols,
+        raw=kwargs.get("raw", False),
+        masked=kwargs.get("masked", True),
+        window={key: kwargs.get(key) for key in ["max_range", "gate_slice", "azimuth_range"]},
+        verbose=verbose,
+    )
+    #
+    myname = colorize("radar.iter_volume()", "green")
+    if not _is_buffer(source) and not os.path.exists(source):
+        raise FileNotFoundError(f"{myname} {source} not found")
+    if verbose:
+        logger.setLevel(logging.DEBUG if verbose > 1 else logging.INFO)
+        logger.info(f"{myname} {colorize(_name_of(source), 'yellow')}")
+    kind = _get_format(source)
+    if kind == "nc":
+        ncid = _open_nc(source)
+        if not _is_cf(ncid):
+            # Per-symbol files go through read(), which merges their siblings
+            ncid.close()
+            data = read(source, **kwargs)
+            yield (0, data) if want_index else data
+            return
+        output = _read_cf_volume(ncid, sweeps=sweeps, **options)
+    elif kind != "nexrad":
+        data = read(source, **kwargs)
+        yield (0, data) if want_index else data
+        return
+    else:
+        output = _read_nexrad_volume(
+            source, sweeps=sweeps, workers=kwargs.get("workers", 1), index=kwargs.get("index", None), **options
+        )
+    for sweep_index, data in output:
+        post_process(data, u8=kwargs.get("u8", False), finite=kwargs.get("finite", False))
+        yield (sweep_index, data) if want_index else data
+
+
+def read_volume(source: str | bytes, sweeps: Optional[List[int]] = None, **kwargs) -> List[dict]:
+    """
+    read_volume(source, sweeps=None, **kwargs):
+
+    Read several sweeps of a radar volume, opening or decoding the source only once.
+
+    Parameters:
+    source: str or bytes - Path to a CF-Radial file, a NEXRAD Level II file, a volume or any of the stripped files,
+            or the content of a CF-Radial file or a V06 volume in memory.
+    sweeps: list of int - Sweep indices, default = None for all sweeps
+
+    Optional keyword arguments:
+    verbose: int - Verbosity level, default = 0
+    symbols: list of str, default = ["Z", "V", "W", "D", "P", "R"]
+    finite: bool - Convert NaN to 0, default = False
+    u8: bool - Convert values to uint8, default = False
+    workers: int - Number of threads to decompress NEXRAD records, default = 1
+    index: bool or str - NEXRAD index, True for a sidecar or a folder for a shared index, default = None
+    raw: bool - Keep the native integer codes, see read(), default = False
+    masked: bool - Products as masked arrays, False for float32 arrays with NaN, default = True
+    max_range, gate_slice, azimuth_range: Window of rays and gates, see read(), default = None
+
+    Returns a list of sweeps in the same layout as read(). Sources other than CF-Radial
+    and NEXRAD are read as a single sweep. Use iter_volume() to get one sweep at a time.
+    """
+    return list(iter_volume(source, sweeps=sweeps, **kwargs))
+
+
+def post_process(data, u8=False, finite=False):
+    """
+    Applies the u8 and finite options of read() to a sweep in place
+    """
+    codecs = data.get("codecs", {})
+    if u8:
+        data["u8"] = quantize(data["products"], codecs=codecs)
+    if finite:
+        products, copies = data["products"], {}
+        for key, value in products.items():
+            if key in codecs:
+                continue
+            if value.flags.writeable:
+                # The products are new arrays of the reader, NaN are replaced in place
+                products[key] = np.nan_to_num(value, copy=False)
+            else:
+                copies[key] = np.nan_to_num(value)
+        # Read-only views, e.g., of native content in memory, are replaced, at once for the block of a Sweep
+        if isinstance(data, Sweep) and copies:
+            data["products"] = {**products, **copies}
+        else:
+            products.update(copies)
+
+
 def set_logger(new_logger):
     global logger
     logger = new_logger
@@ -0,0 +1,390 @@
+import json
+import pickle
+import struct
+import collections.abc
+import numpy as np
+
+from typing import Optional, Tuple
+
+# Arrays are placed on this alignment in the block
+ALIGNMENT = 64
+
+# Native files are the magic, the length of the JSON header, the header padded to the alignment, then the block
+NATIVE_MAGIC = b"RADARSWP"
+NATIVE_PREFIX = struct.Struct("<8sQ")
+NATIVE_VERSION = 1
+
+# Metadata of a sweep, in the order of the dictionary from read()
+METADATA = (
+    "kind",
+    "txrx",
+    "time",
+    "latitude",
+    "longitude",
+    "sweepMode",
+    "sweepElevation",
+    "sweepAzimuth",
+    "prf",
+    "waveform",
+    "gatewidth",
+)
+
+
+def _layout(nsymbols, nrays, ngates, u8=False):
+    # (name, dtype, shape, offset) of the arrays in the block and the size of the block
+    arrays = [
+        ("elevations", "<f4", (nrays,)),
+        ("azimuths", "<f4", (nrays,)),
+        ("ranges", "<f4", (ngates,)),
+        ("cube", "<f4", (nsymbols, nrays, ngates)),
+    ]
+    if u8:
+        arrays.append(("u8cube", "|u1", (nsymbols, nrays, ngates)))
+    layout, size = [], 0
+    for name, dtype, shape in arrays:
+        layout.append((name, dtype, shape, size))
+        nbytes = int(np.prod(shape, dtype=np.int64)) * np.dtype(dtype).itemsize
+        size += (nbytes + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+    return layout, size
+
+
+def aligned_empty(size):
+    """
+    An uninitialized uint8 array whose first byte is on the alignment
+    """
+    raw = np.empty(size + ALIGNMENT, dtype=np.uint8)
+    start = -raw.ctypes.data % ALIGNMENT
+    return raw[start : start + size]
+
+
+def _json_default(value):
+    # Metadata from the readers may be numpy scalars or small arrays
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def is_native_format(file: str) -> bool:
+    """
+    Whether a file is a sweep written by Sweep.to_file() or radar.write(..., format="native")
+    """
+    try:
+        with open(file, "rb") as f:
+            return f.read(len(NATIVE_MAGIC)) == NATIVE_MAGIC
+    except OSError:
+        return False
+
+
+def _plane(value, codec=None):
+    # Values as float32 with NaN at invalid gates, codes of raw products are converted with their codec
+    if codec is not None:
+        codes = np.asarray(value)
+        plane = codes.astype(np.float32) * np.float32(codec["scale"]) + np.float32(codec["offset"])
+        plane[np.isin(codes, codec["fill"])] = np.nan
+        return plane
+    if np.ma.isMaskedArray(value):
+        return value.astype(np.float32).filled(np.nan)
+    return np.asarray(value, dtype=np.float32)
+
+
+class CubeProducts(collections.abc.MutableMapping):
+    """
+    Products of a Sweep, each symbol is a view of its plane in the cube
+    """
+
+    __slots__ = ("_sweep", "_name")
+
+    def __init__(self, sweep, name="cube"):
+        self._sweep = sweep
+        self._name = name
+
+    def __getitem__(self, key):
+        return getattr(self._sweep, self._name)[self._sweep.index[key]]
+
+    def __setitem__(self, key, value):
+        sweep = self._sweep
+        plane = sweep.index.get(key)
+        if plane is not None and np.shape(value) == sweep.cube.shape[1:]:
+            getattr(sweep, self._name)[plane] = value if self._name == "u8cube" else _plane(value)
+            return
+        if self._name == "u8cube":
+            raise KeyError(f"{key} is not a product of the sweep")
+        products = dict(self.items())
+        products[key] = value
+        sweep.set_products(products)
+
+    def __delitem__(self, key):
+        if key not in self._sweep.index:
+            raise KeyError(key)
+        if self._name == "u8cube":
+            raise KeyError(f"Unable to remove {key} from u8 only, remove it from products")
+        self._sweep.set_products({k: v for k, v in self.items() if k != key})
+
+    def __iter__(self):
+        return iter(self._sweep.symbols)
+
+    def __len__(self):
+        return len(self._sweep.symbols)
+
+    def __repr__(self):
+        return f"CubeProducts({list(self._sweep.symbols)})"
+
+
+class Sweep(collections.abc.MutableMapping):
+    """
+    A sweep with all products in one contiguous (nsymbols, nrays, ngates) float32 cube
+
+    The coordinates, the cube and the optional uint8 cube of "u8" share one aligned block,
+    so a sweep is moved as one buffer and rebuilt from it without a copy. It has the same
+    keys as the dictionary from read(), sweep["products"]["Z"] is a view of a plane in the
+    cube with NaN at invalid gates.
+
+    sweep = Sweep.from_dict(radar.read(file))
+    header, buffer = sweep.to_buffer()
+    same = Sweep.from_buffer(header, buffer)
+    """
+
+    __slots__ = METADATA + ("symbols", "index", "elevations", "azimuths", "ranges", "cube", "u8cube", "extra", "block")
+
+    def __init__(self, symbols=(), nrays=0, ngates=0, u8=False, block=None, **metadata):
+        for key in METADATA:
+            setattr(self, key, metadata.pop(key, None))
+        self.extra = metadata
+        self._allocate(tuple(symbols), nrays, ngates, u8, block)
+
+    def _allocate(self, symbols, nrays, ngates, u8=False, block=None):
+        layout, size = _layout(len(symbols), nrays, ngates, u8)
+        if block is None:
+            block = aligned_empty(size)
+            block[:] = 0
+        elif block.nbytes < size:
+            raise ValueError(f"Block of {block.nbytes} B is smaller than {size} B")
+        self.block = block
+        self.symbols = symbols
+        self.index = {symbol: k for k, symbol in enumerate(symbols)}
+        self.u8cube = None
+        for name, dtype, shape, offset in layout:
+            count = int(np.prod(shape, dtype=np.int64))
+            view = block[offset : offset + count * np.dtype(dtype).itemsize].view(dtype).reshape(shape)
+            setattr(self, name, view)
+
+    @classmethod
+    def from_dict(cls, sweep: dict) -> "Sweep":
+        """
+        Converts a sweep from read(), products of raw reads are converted with their codecs
+        """
+        if isinstance(sweep, Sweep):
+            return sweep.copy()
+        metadata = {key: value for key, value in sweep.items() if key not in ("elevations", "azimuths", "ranges")}
+        products = metadata.pop("products")
+        codecs = metadata.pop("codecs", {})
+        u8 = metadata.pop("u8", None)
+        output = cls(**metadata)
+        output._fill(sweep["elevations"], sweep["azimuths"], sweep["ranges"], products, codecs, u8)
+        return output
+
+    def _fill(self, elevations, azimuths, ranges, products, codecs={}, u8=None):
+        nrays, ngates = len(azimuths), len(ranges)
+        for symbol, value in products.items():
+            if np.shape(value) != (nrays, ngates):
+                raise ValueError(f"Product {symbol} of shape {np.shape(value)} is not ({nrays}, {ngates})")
+        self._allocate(tuple(products), nrays, ngates, u8=u8 is not None)
+        self.elevations[:] = elevations
+        self.azimuths[:] = azimuths
+        self.ranges[:] = ranges
+        for k, (symbol, value) in enumerate(products.items()):
+            self.cube[k] = _plane(value, codecs.get(symbol))
+            if u8 is not None and symbol in u8:
+                self.u8cube[k] = u8[symbol]
+
+    def set_products(self, products: dict, u8: Optional[dict] = None):
+        """
+        Replaces the products, which rebuilds the block. Without u8, the u8 planes of the products are kept
+        """
+        if u8 is None and self.u8cube is not None:
+            u8 = {symbol: self.u8cube[k] for symbol, k in self.index.items() if symbol in products}
+        # The arguments are views of the current block, which stays until the copy is done
+        self._fill(self.elevations, self.azimuths, self.ranges, products, u8=u8)
+
+    def to_dict(self) -> dict:
+        """
+        A dictionary as from read(), the arrays are views of the block
+        """
+        output = dict(self.items())
+        output["products"] = dict(output["products"])
+        if "u8" in output:
+            output["u8"] = dict(output["u8"])
+        return output
+
+    def to_buffer(self) -> Tuple[dict, memoryview]:
+        """
+        The header of the metadata and the layout, and the block as a memoryview
+        """
+        header = {key: getattr(self, key) for key in METADATA}
+        header["extra"] = dict(self.extra)
+        header["symbols"] = list(self.symbols)
+        header["shape"] = self.cube.shape[1:]
+        header["u8"] = self.u8cube is not None
+        return header, memoryview(self.block)
+
+    @classmethod
+    def from_buffer(cls, header: dict, buffer) -> "Sweep":
+        """
+        A sweep of the header and the block from to_buffer(), the arrays are views of the buffer
+        """
+        metadata = {key: header[key] for key in METADATA}
+        block = np.frombuffer(buffer, dtype=np.uint8)
+        nrays, ngates = header["shape"]
+        return cls(header["symbols"], nrays, ngates, u8=header["u8"], block=block, **metadata, **header["extra"])
+
+    def _native_header(self) -> Tuple[bytes, memoryview]:
+        # The prefix and the header, padded with spaces, which JSON ignores, so the block starts on the alignment
+        header, buffer = self.to_buffer()
+        header["version"] = NATIVE_VERSION
+        header["size"] = self.block.nbytes
+        text = json.dumps(header, default=_json_default).encode()
+        length = -(-(NATIVE_PREFIX.size + len(text)) // ALIGNMENT) * ALIGNMENT - NATIVE_PREFIX.size
+        return NATIVE_PREFIX.pack(NATIVE_MAGIC, length) + text.ljust(length), buffer
+
+    @staticmethod
+    def _parse_native_header(head: bytes, source="buffer") -> Tuple[dict, int]:
+        # The header and the offset of the block
+        if len(head) < NATIVE_PREFIX.size or bytes(head[: len(NATIVE_MAGIC)]) != NATIVE_MAGIC:
+            raise ValueError(f"{source} is not a native sweep")
+        _, length = NATIVE_PREFIX.unpack(head[: NATIVE_PREFIX.size])
+        header = json.loads(bytes(head[NATIVE_PREFIX.size : NATIVE_PREFIX.size + length]))
+        if header.get("version") != NATIVE_VERSION:
+            raise ValueError(f"Unsupported native sweep version {header.get('version')}")
+        return header, NATIVE_PREFIX.size + length
+
+    def to_file(self, filename: str):
+        """
+        Writes the header as JSON and the block as it is, so that from_file() maps the block without a copy
+        """
+        head, buffer = self._native_header()
+        with open(filename, "wb") as f:
+            f.write(head)
+            f.write(buffer)
+
+    @classmethod
+    def from_file(cls, filename: str, mode: str = "c") -> "Sweep":
+        """
+        A sweep of a file from to_file(), the block is memory mapped. With mode = "c", the default, the
+        arrays can be modified without changing the file, "r" for read-only arrays
+        """
+        with open(filename, "rb") as f:
+            head = f.read(NATIVE_PREFIX.size)
+            if not head.startswith(NATIVE_MAGIC):
+                raise ValueError(f"{filename} is not a native sweep")
+            head += f.read(NATIVE_PREFIX.unpack(head)[1])
+            header, offset = cls._parse_native_header(head, filename)
+            f.seek(0, 2)
+            available = f.tell() - offset
+        size = header["size"]
+        if available < size:
+            raise ValueError(f"{filename} is truncated, {available} B of {size} B")
+        if size == 0:
+            return cls.from_buffer(header, bytearray())
+        return cls.from_buffer(header, np.memmap(filename, dtype=np.uint8, mode=mode, offset=offset, shape=(size,)))
+
+    def to_bytes(self) -> bytes:
+        """
+        The content of the file from to_file()
+        """
+        head, buffer = self._native_header()
+        return head + buffer
+
+    @classmethod
+    def from_bytes(cls, content) -> "Sweep":
+        """
+        A sweep of the content from to_bytes(), the arrays are views of the content
+        """
+        content = memoryview(content).cast("B")
+        header, offset = cls._parse_native_header(content)
+        size = header["size"]
+        if len(content) - offset < size:
+            raise ValueError(f"Truncated native sweep, {len(content) - offset} B of {size} B")
+        return cls.from_buffer(header, content[offset : offset + size])
+
+    def copy(self) -> "Sweep":
+        """
+        A sweep with a copy of the block
+        """
+        header, buffer = self.to_buffer()
+        return Sweep.from_buffer(header, bytearray(buffer))
+
+    def view(self) -> "Sweep":
+        """
+        A sweep with its own metadata around the same block
+        """
+        return Sweep.from_buffer(*self.to_buffer())
+
+    @property
+    def nbytes(self) -> int:
+        return self.block.nbytes
+
+    def __buffer__(self, flags):
+        return memoryview(self.block)
+
+    def __reduce_ex__(self, protocol):
+        # The block is one buffer, out-of-band with protocol 5
+        header, buffer = self.to_buffer()
+        if protocol >= 5:
+            return Sweep.from_buffer, (header, pickle.PickleBuffer(self.block))
+        return Sweep.from_buffer, (header, bytes(buffer))
+
+    def __getitem__(self, key):
+        if key == "products":
+            return CubeProducts(self)
+        if key == "u8":
+            if self.u8cube is None:
+                raise KeyError(key)
+            return CubeProducts(self, "u8cube")
+        if key in METADATA or key in ("elevations", "azimuths", "ranges"):
+            value = getattr(self, key)
+            if value is None:
+                raise KeyError(key)
+            return value
+        return self.extra[key]
+
+    def __setitem__(self, key, value):
+        if key == "products":
+            self.set_products(dict(value))
+        elif key == "u8":
+            self.set_products(dict(self["products"]), u8=dict(value))
+        elif key in ("elevations", "azimuths", "ranges"):
+            if np.shape(value) != getattr(self, key).shape:
+                raise ValueError(f"Shape {np.shape(value)} of {key} is not {getattr(self, key).shape}")
+            getattr(self, key)[:] = value
+        elif key in METADATA:
+            setattr(self, key, value)
+        else:
+            self.extra[key] = value
+
+    def __delitem__(self, key):
+        if key == "u8" and self.u8cube is not None:
+            self._fill(self.elevations, self.azimuths, self.ranges, dict(self["products"]))
+        elif key in METADATA and getattr(self, key) is not None:
+            setattr(self, key, None)
+        elif key in self.extra:
+            del self.extra[key]
+        else:
+            raise KeyError(key)
+
+    def __iter__(self):
+        for key in METADATA:
+            if getattr(self, key) is not None:
+                yield key
+        yield from self.extra
+        yield from ("elevations", "azimuths", "ranges", "products")
+        if self.u8cube is not None:
+            yield "u8"
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        nrays, ngates = self.cube.shape[1:]
+        return f"Sweep({list(self.symbols)}, {nrays} x {ngates}, {self.block.nbytes:,d} B)"
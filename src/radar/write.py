@@ -1,48 +1,393 @@
 import os
+import struct
 import logging
 import datetime
 import numpy as np
 
-from netCDF4 import Dataset
+from typing import List
+from netCDF4 import Dataset, default_fillvals
 
 from .common import *
 from .cosmetics import colorize
+from .read import raw2val
+from .sweep import Sweep
 
 utc = datetime.timezone.utc
 sep = colorize("/", "orange")
 logger = logging.getLogger("radar-data")
 dot_colors = ["black", "gray", "blue", "green", "orange"]
 
+# Variable names of the products, in the order they are written
+VARIABLE_NAMES = {"Z": "DBZ", "V": "VEL", "W": "WIDTH", "D": "ZDR", "P": "PHIDP", "R": "RHOHV"}
 
-def write(filename: str, sweep: dict):
+# (scale, offset) of the packed types for each symbol, value = code * scale + offset, u1 code 0 is the fill
+PACKING_SCALES = {
+    "u1": {
+        "Z": (0.5, -32.5),
+        "V": (0.5, -64.5),
+        "W": (0.1, -0.1),
+        "D": (0.1, -12.9),
+        "P": (1.5, -1.5),
+        "R": (0.005, -0.005),
+    },
+    "i2": {
+        "Z": (0.01, 0.0),
+        "V": (0.01, 0.0),
+        "W": (0.01, 0.0),
+        "D": (0.01, 0.0),
+        # Codes of 0.01 degree reach only 327.67 degrees, PhiDP up to 507.67 degrees fits with the offset
+        "P": (0.01, 180.0),
+        "R": (0.001, 0.0),
+    },
+}
+
+# Fill code of each type and the range of valid codes
+PACKING_FILLS = {"u1": 0, "i2": -32768, "f4": default_fillvals["f4"]}
+PACKING_LIMITS = {"u1": (1, 255), "i2": (-32767, 32767)}
+
+# Encoding options of write(), write_bytes(), write_volume() and SweepWriter
+ENCODING_OPTIONS = ("packing", "scales", "complevel", "shuffle", "chunks")
+
+
+def write(filename: str, sweep: dict, format: str = "cf", **encoding):
     """
-    Write a radar sweep to a netCDF file.
+    write(filename, sweep, format="cf", **encoding):
+
+    Write a radar sweep to a netCDF file, or to a native file that read() maps without a copy.
+
+    Parameters:
+    filename: str - Path of the output, must end with .nc for format = "cf"
+    sweep: dict - A sweep from read() or a Sweep
+    format: str - "cf" for CF-Radial, "native" for the header and the block of a Sweep, default = "cf"
+
+    Optional keyword arguments for format = "cf":
+    packing: str or dict - "u1", "i2" or "f4", or {symbol: type}, default = "i2"
+    scales: dict - {symbol: (scale, offset)} to override PACKING_SCALES, default = None
+    complevel: int - zlib compression level 0-9, 0 for no compression, default = 0
+    shuffle: bool - Byte shuffle before compression, default = True
+    chunks: str, int or tuple - "sweep" for one chunk, an int for that many rays per chunk,
+            or (rays, gates), default = None for the netCDF library defaults
+
+    Rays are read fastest with chunks of a few rays, e.g., chunks=8, whole sweeps with
+    chunks="sweep". Packed values outside the range of the codes are clipped. Other keyword
+    arguments raise a TypeError.
     """
-    if not filename.endswith(".nc"):
+    _check_encoding(encoding)
+    if format not in ("cf", "native"):
+        raise ValueError(f"Unsupported format {format}, expected cf or native")
+    if format == "cf" and not filename.endswith(".nc"):
         raise ValueError("Filename must end with .nc")
 
     logger.info(f"Writing {filename}...")
 
     # Create the directory if it does not exist
+    if os.path.dirname(filename):
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+    if format == "native":
+        # Products are float32 with NaN at invalid gates, raw codes are converted with their codecs
+        (sweep if isinstance(sweep, Sweep) else Sweep.from_dict(sweep)).to_file(filename)
+    else:
+        with Dataset(filename, "w", format="NETCDF4") as ncid:
+            _write_cf1(ncid, sweep, **encoding)
+
+    logger.info(f"Finished writing {filename}.")
+
+
+def write_volume(filename: str, sweeps: List[dict], **encoding):
+    """
+    write_volume(filename, sweeps, **encoding):
+
+    Write the sweeps of a radar volume to one CF-Radial file.
+
+    Parameters:
+    filename: str - Path of the output, must end with .nc
+    sweeps: list of dict - Sweeps from read_volume() or read(), in the order of the volume
+
+    Other keyword arguments are the encoding options of write()
+
+    The rays of all sweeps are concatenated along the time dimension, sweep_start_ray_index
+    and sweep_end_ray_index mark the rays of each sweep. The sweeps must have the same first
+    gate and gate spacing, sweeps with fewer gates are padded with invalid gates. A sweep is
+    read back with read(filename, sweep_index=k), or all of them with read_volume(filename).
+
+    radar.write_volume("KTLX-20250217-204640.nc", radar.read_volume(file))
+    """
+    _check_encoding(encoding)
+    sweeps = list(sweeps)
+    if not sweeps:
+        raise ValueError("No sweeps to write")
+    if not filename.endswith(".nc"):
+        raise ValueError("Filename must end with .nc")
+
+    logger.info(f"Writing {filename} with {len(sweeps)} sweeps...")
+
     if os.path.dirname(filename):
         os.makedirs(os.path.dirname(filename), exist_ok=True)
 
     with Dataset(filename, "w", format="NETCDF4") as ncid:
-        _write_cf1(ncid, sweep)
+        _write_cf1_volume(ncid, sweeps, **encoding)
 
     logger.info(f"Finished writing {filename}.")
 
 
-def _write_cf1(ncid, sweep, string_length=32, period=20.0):
-    ray_count, gate_count = sweep["elevations"].shape[0], sweep["ranges"].shape[0]
-    start_datetime = datetime.datetime.fromtimestamp(sweep["time"]).replace(tzinfo=utc)
-    start_timestring = start_datetime.strftime(f"%Y-%m-%dT%H:%M:%SZ")
-    end_datetime = datetime.datetime.fromtimestamp(sweep.get("end_time", sweep["time"] + period)).replace(tzinfo=utc)
-    end_timestring = end_datetime.strftime(f"%Y-%m-%dT%H:%M:%SZ")
+def write_bytes(sweep: dict, format: str = "cf", **encoding) -> memoryview:
+    """
+    write_bytes(sweep, format="cf", **encoding):
+
+    Write a radar sweep to memory, the content of the file from write() without a file.
+
+    Parameters:
+    sweep: dict - A sweep from read() or a Sweep
+    format: str - "cf" for CF-Radial, "native" for the header and the block of a Sweep, default = "cf"
+
+    Other keyword arguments are the encoding options of write()
+
+    Returns a memoryview of the content, which radar.read() also takes, use bytes() for a copy.
+
+    content = radar.write_bytes(sweep, packing="u1", complevel=4)
+    same = radar.read(content)
+    """
+    _check_encoding(encoding)
+    if format not in ("cf", "native"):
+        raise ValueError(f"Unsupported format {format}, expected cf or native")
+    if format == "native":
+        return memoryview((sweep if isinstance(sweep, Sweep) else Sweep.from_dict(sweep)).to_bytes())
+    # The size is only the initial size of the in-memory file, which grows as needed
+    ncid = Dataset("sweep.nc", "w", format="NETCDF4", memory=1 << 20)
+    try:
+        _write_cf1(ncid, sweep, **encoding)
+    except Exception:
+        ncid.close()
+        raise
+    image = ncid.close()
+    return image[: min(_get_hdf5_end(image), len(image))]
+
+
+def _check_encoding(encoding):
+    # A misspelled option, e.g., complvl=9, would otherwise be ignored
+    unknown = [key for key in encoding if key not in ENCODING_OPTIONS]
+    if unknown:
+        raise TypeError(f"Unexpected encoding options {', '.join(unknown)}, expected {', '.join(ENCODING_OPTIONS)}")
+
+
+def _get_hdf5_end(image):
+    # The end-of-file address in the superblock, the in-memory image grows in larger increments
+    version = image[8]
+    if version in (0, 1) and image[13] == 8:
+        return struct.unpack_from("<Q", image, 40 if version == 0 else 44)[0]
+    if version in (2, 3) and image[9] == 8:
+        return struct.unpack_from("<Q", image, 28)[0]
+    return len(image)
+
+
+def _get_packing(symbol, packing="i2", scales=None):
+    # (type, scale, offset) of a symbol, scale and offset are None for f4
+    kind = packing.get(symbol, "i2") if isinstance(packing, dict) else packing
+    if kind not in PACKING_FILLS:
+        raise ValueError(f"Unsupported packing {kind} for {symbol}, expected one of {list(PACKING_FILLS)}")
+    if kind == "f4":
+        return kind, None, None
+    scale, offset = (scales or {}).get(symbol) or PACKING_SCALES[kind].get(symbol, PACKING_SCALES[kind]["Z"])
+    return kind, scale, offset
+
+
+def _get_chunks(chunks, ray_count, gate_count):
+    # The ray count is None for an unlimited time dimension, which has no whole-sweep chunks
+    if chunks is None or ray_count == 0 or gate_count == 0 or (chunks == "sweep" and ray_count is None):
+        return None
+    if chunks == "sweep":
+        return ray_count, gate_count
+    if isinstance(chunks, int):
+        return min(chunks, ray_count or chunks), gate_count
+    return min(chunks[0], ray_count or chunks[0]), min(chunks[1], gate_count)
+
+
+def _get_values_and_mask(data, codec=None):
+    values = raw2val(data, codec) if codec else np.ma.getdata(data)
+    mask = ~np.isfinite(values)
+    if np.ma.getmask(data) is not np.ma.nomask:
+        mask |= np.ma.getmask(data)
+    return values, mask
+
+
+def _is_radians(values, mask):
+    # P should always in degrees 0-360, values all within (0, pi) are taken as radians
+    pmax = np.max(values, where=~mask, initial=-np.inf)
+    return bool(pmax > 0.0 and pmax < 3.142)
+
+
+def _encode(data, symbol="Z", codec=None, kind="i2", scale=None, offset=None, radians=None):
+    """
+    Codes of a product, the mask of invalid gates is built once from NaN and the mask of data
+
+    :param radians: Whether P is in radians, None to decide from the values
+    :return: codes of kind with the fill code at invalid gates, or float32 values for f4
+    """
+    values, mask = _get_values_and_mask(data, codec)
+    if symbol == "P" and (_is_radians(values, mask) if radians is None else radians):
+        values = values * np.float32(180.0 / np.pi)
+    if kind == "f4":
+        work = np.array(values, dtype=np.float32)
+        work[mask] = PACKING_FILLS[kind]
+        return work
+    work = np.subtract(values, np.float32(offset), dtype=np.float32)
+    work /= np.float32(scale)
+    np.rint(work, out=work)
+    np.clip(work, *PACKING_LIMITS[kind], out=work)
+    work[mask] = PACKING_FILLS[kind]
+    return work.astype(kind)
+
+
+def _define_product(ncid, symbol, dimensions, kind, scale, offset, complevel=0, shuffle=True, chunksizes=None):
+    standard_names = {
+        "Z": "equivalent_reflectivity_factor",
+        "V": "radial_velocity_of_scatterers_away_from_instrument",
+        "W": "doppler_spectrum_width",
+        "D": "log_differential_reflectivity_hv",
+        "P": "differential_phase_hv",
+        "R": "cross_correlation_ratio_hv",
+    }
+    long_names = {
+        "Z": "reflectivity",
+        "V": "radial_velocity",
+        "W": "spectrum_width",
+        "D": "differential_reflectivity",
+        "P": "differential_phase",
+        "R": "cross_correlation_ratio",
+    }
+    units = {"Z": "dBZ", "V": "m/s", "W": "m/s", "D": "dB", "P": "degrees", "R": "unitless"}
+    options = {"fill_value": PACKING_FILLS[kind]}
+    if complevel:
+        options.update(zlib=True, complevel=complevel, shuffle=shuffle)
+    if chunksizes:
+        options["chunksizes"] = chunksizes
+    elif not complevel and not any(ncid.dimensions[d].isunlimited() for d in dimensions):
+        options["contiguous"] = True
+    var = ncid.createVariable(VARIABLE_NAMES[symbol], kind, dimensions, **options)
+    var.standard_name = standard_names[symbol]
+    var.long_name = long_names[symbol]
+    var.units = units[symbol]
+    if scale is not None:
+        var.scale_factor = np.single(scale)
+        var.add_offset = np.single(offset)
+    var.coordinates = "time range"
+    # Codes are written as they are, the scale and mask are already applied in _encode()
+    var.set_auto_maskandscale(False)
+    return var
+
+
+def _define_products(ncid, symbols, dimensions=("time", "range"), **encoding):
+    ray_count, gate_count = ncid.dimensions[dimensions[0]].size, ncid.dimensions[dimensions[1]].size
+    if ncid.dimensions[dimensions[0]].isunlimited():
+        ray_count = None
+    chunksizes = _get_chunks(encoding.get("chunks"), ray_count, gate_count)
+    for symbol in VARIABLE_NAMES:
+        if symbol not in symbols:
+            continue
+        kind, scale, offset = _get_packing(symbol, encoding.get("packing", "i2"), encoding.get("scales"))
+        _define_product(
+            ncid,
+            symbol,
+            dimensions,
+            kind,
+            scale,
+            offset,
+            complevel=encoding.get("complevel", 0),
+            shuffle=encoding.get("shuffle", True),
+            chunksizes=chunksizes,
+        )
+
+
+def _write_products(ncid, products, codecs={}, rays=slice(None), radians=None, **encoding):
+    for symbol in VARIABLE_NAMES:
+        if symbol not in products or VARIABLE_NAMES[symbol] not in ncid.variables:
+            continue
+        kind, scale, offset = _get_packing(symbol, encoding.get("packing", "i2"), encoding.get("scales"))
+        codes = _encode(products[symbol], symbol, codecs.get(symbol), kind, scale, offset, radians=radians)
+        ncid.variables[VARIABLE_NAMES[symbol]][rays] = codes
+
+
+def _timestring(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp).replace(tzinfo=utc).strftime(f"%Y-%m-%dT%H:%M:%SZ")
+
+
+def _write_cf1(ncid, sweep, string_length=32, period=20.0, **encoding):
+    _write_cf1_volume(ncid, [sweep], string_length=string_length, period=period, **encoding)
+
+
+def _write_cf1_volume(ncid, sweeps, string_length=32, period=20.0, **encoding):
+    # The longest ranges cover all sweeps, sweeps with fewer gates are padded with fill codes
+    ranges = max((sweep["ranges"] for sweep in sweeps), key=len)
+    for sweep in sweeps:
+        if not np.allclose(sweep["ranges"], ranges[: len(sweep["ranges"])]):
+            raise ValueError("Sweeps must have the same first gate and gate spacing")
+    counts = np.array([sweep["elevations"].shape[0] for sweep in sweeps])
+    starts = np.cumsum(counts) - counts
+    ray_count, gate_count = int(counts.sum()), len(ranges)
+    symbols = list(dict.fromkeys(symbol for sweep in sweeps for symbol in sweep.get("products")))
+    template = dict(sweeps[0], ranges=ranges)
+    if encoding.get("chunks") == "sweep":
+        # A chunk of as many rays as the longest sweep
+        encoding = dict(encoding, chunks=int(counts.max()))
+    _define_cf1(ncid, template, symbols, ray_count, string_length=string_length, sweeps=sweeps, **encoding)
+    # Ray times are relative to the time of the first sweep
+    end_time = sweeps[0]["time"]
+    for sweep, start, count in zip(sweeps, starts, counts):
+        times = sweep.get("times", np.linspace(0, period - period / count, count)) + (sweep["time"] - template["time"])
+        _write_rays(ncid, sweep, start, sweep["azimuths"], sweep["elevations"], times)
+        end_time = max(end_time, sweep.get("end_time", sweep["time"] + period))
+    # Each product is encoded into one array and written in one slab
+    for symbol in VARIABLE_NAMES:
+        if symbol not in symbols:
+            continue
+        kind, scale, offset = _get_packing(symbol, encoding.get("packing", "i2"), encoding.get("scales"))
+        codes = np.full((ray_count, gate_count), PACKING_FILLS[kind], dtype=kind)
+        for sweep, start, count in zip(sweeps, starts, counts):
+            if symbol not in sweep.get("products"):
+                continue
+            codec = sweep.get("codecs", {}).get(symbol)
+            rays = slice(start, start + count)
+            codes[rays, : len(sweep["ranges"])] = _encode(sweep["products"][symbol], symbol, codec, kind, scale, offset)
+        ncid.variables[VARIABLE_NAMES[symbol]][:] = codes
+    _set_end(ncid, end_time, starts + counts, string_length)
+    if len(sweeps) > 1 and np.any(np.diff(ncid.variables["time"][:]) < 0):
+        ncid.ray_times_increase = "false"
+
+
+def _write_rays(ncid, sweep, start, azimuths, elevations, times):
+    rays = slice(start, start + len(azimuths))
+    ncid.variables["time"][rays] = times
+    ncid.variables["azimuth"][rays] = azimuths
+    ncid.variables["elevation"][rays] = elevations
+    ncid.variables["pulse_width"][rays] = np.full(len(azimuths), sweep.get("pulsewidth", 0.0001))
+    ncid.variables["prt"][rays] = np.full(len(azimuths), sweep.get("prt", 1.0 / sweep.get("prf", 0.001)))
+
+
+def _set_end(ncid, end_time, ray_count, string_length=32):
+    # ray_count is the number of rays up to the end of each sweep
+    end_timestring = _timestring(end_time)
+    ncid.variables["time_coverage_end"][:] = end_timestring.ljust(string_length)
+    ncid.variables["sweep_end_ray_index"][:] = np.asarray(ray_count) - 1
+    ncid.time_coverage_end = end_timestring
+    ncid.end_datetime = end_timestring
+
+
+def _define_cf1(ncid, sweep, symbols, ray_count=None, string_length=32, sweeps=None, **encoding):
+    """
+    Defines a CF-Radial sweep and writes everything but the rays, time_coverage_end and sweep_end_ray_index
+
+    :param sweep: The sweep, or the template of a volume for the start time, the location and the ranges
+    :param ray_count: Number of rays, None for an unlimited time dimension
+    :param sweeps: Sweeps of a volume, default = None for the sweep alone
+    """
+    sweeps = sweeps or [sweep]
+    gate_count = sweep["ranges"].shape[0]
+    start_timestring = _timestring(sweep["time"])
     # Dimensions
     ncid.createDimension("time", ray_count)
     ncid.createDimension("range", gate_count)
-    ncid.createDimension("sweep", 1)
+    ncid.createDimension("sweep", len(sweeps))
     ncid.createDimension("string_length", string_length)
     ncid.createDimension("r_calib", 1)
     # Variables
@@ -56,7 +401,6 @@ def _write_cf1(ncid, sweep, string_length=32, period=20.0):
     time_coverage_end = ncid.createVariable("time_coverage_end", "c", ("string_length",))
     time_coverage_end.standard_name = "data_volume_end_time_utc"
     time_coverage_end.comments = "ray times are relative to start time in secs"
-    time_coverage_end[:] = end_timestring.ljust(string_length)
     latitude = ncid.createVariable("latitude", "f8")
     latitude.standard_name = "latitude"
     latitude.units = "degrees_north"
@@ -69,29 +413,29 @@ def _write_cf1(ncid, sweep, string_length=32, period=20.0):
     altitude.units = "meters"
     altitude.standard_name = "altitude"
     altitude[:] = sweep.get("altitude", 0.0)
+    rhi = [item.get("sweepMode") == "rhi" for item in sweeps]
     sweep_number = ncid.createVariable("sweep_number", "i4", ("sweep",))
     sweep_number.long_name = "sweep_index_number_0_based"
-    sweep_number[:] = 0
+    sweep_number[:] = np.arange(len(sweeps))
     sweep_mode = ncid.createVariable("sweep_mode", "c", ("sweep", "string_length"))
     sweep_mode.long_name = "scan_mode_for_sweep"
-    sweep_mode[:] = "azimuth_surveillance".ljust(string_length)
+    modes = ["rhi" if is_rhi else "azimuth_surveillance" for is_rhi in rhi]
+    sweep_mode[:] = np.array([list(mode.ljust(string_length)) for mode in modes], dtype="S1")
     fixed_angle = ncid.createVariable("fixed_angle", "f4", ("sweep",))
     fixed_angle.long_name = "ray_target_fixed_angle"
     fixed_angle.units = "degrees"
-    fixed_angle[:] = sweep["sweepElevation"]
+    fixed_angle[:] = [item["sweepAzimuth"] if is_rhi else item["sweepElevation"] for item, is_rhi in zip(sweeps, rhi)]
     sweep_start_ray_index = ncid.createVariable("sweep_start_ray_index", "i4", ("sweep",))
     sweep_start_ray_index.long_name = "index_of_first_ray_in_sweep"
-    sweep_start_ray_index[:] = 0
+    sweep_start_ray_index[:] = np.cumsum([0] + [len(item["azimuths"]) for item in sweeps[:-1]])
     sweep_end_ray_index = ncid.createVariable("sweep_end_ray_index", "i4", ("sweep",))
     sweep_end_ray_index.long_name = "index_of_last_ray_in_sweep"
-    sweep_end_ray_index[:] = ray_count - 1
 
     time = ncid.createVariable("time", "f8", ("time",))
     time.standard_name = "time"
     time.long_name = "time_in_seconds_since_volume_start"
     time.units = f"seconds since {start_timestring}"
     time.calendar = "gregorian"
-    time[:] = sweep.get("times", np.linspace(0, period - period / ray_count, ray_count))
     rr = ncid.createVariable("range", "f4", ("range",))
     rr.standard_name = "projection_range_coordinate"
     rr.long_name = "range_to_measurement_volume"
@@ -106,77 +450,21 @@ def _write_cf1(ncid, sweep, string_length=32, period=20.0):
     aa.long_name = "azimuth_angle_from_true_north"
     aa.units = "degrees"
     aa.axis = "radial_azimuth_coordinate"
-    aa[:] = sweep["azimuths"]
     ee = ncid.createVariable("elevation", "f4", ("time",))
     ee.standard_name = "ray_elevation_angle"
     ee.long_name = "elevation_angle_from_horizontal_plane"
     ee.units = "degrees"
     ee.axis = "radial_elevation_coordinate"
-    ee[:] = sweep["elevations"]
     pulse_width = ncid.createVariable("pulse_width", "f4", ("time",))
     pulse_width.long_name = "transmitter_pulse_width"
     pulse_width.units = "seconds"
     pulse_width.meta_group = "instrument_parameters"
-    pulse_width[:] = sweep.get("pulsewidth", 0.0001)
     prt = ncid.createVariable("prt", "f4", ("time",))
     prt.long_name = "pulse repetition time"
     prt.units = "seconds"
     prt.meta_group = "instrument_parameters"
-    prt[:] = sweep.get("prt", 1.0 / sweep.get("prf", 0.001))
-
-    products = sweep.get("products")
 
-    def _define_and_set_data(symbol, name):
-        data = products.get(symbol)
-        if data is None:
-            return
-        if not np.ma.is_masked(data):
-            data = np.ma.masked_array(data, mask=np.isnan(data))
-        standard_names = {
-            "Z": "equivalent_reflectivity_factor",
-            "V": "radial_velocity_of_scatterers_away_from_instrument",
-            "W": "doppler_spectrum_width",
-            "D": "log_differential_reflectivity_hv",
-            "P": "differential_phase_hv",
-            "R": "cross_correlation_ratio_hv",
-        }
-        long_names = {
-            "Z": "reflectivity",
-            "V": "radial_velocity",
-            "W": "spectrum_width",
-            "D": "differential_reflectivity",
-            "P": "differential_phase",
-            "R": "cross_correlation_ratio",
-        }
-        units = {"Z": "dBZ", "V": "m/s", "W": "m/s", "D": "dB", "P": "degrees", "R": "unitless"}
-        scale_factors = {
-            "Z": np.single(0.01),
-            "V": np.single(0.01),
-            "W": np.single(0.01),
-            "D": np.single(0.01),
-            "P": np.single(0.01),
-            "R": np.single(0.001),
-        }
-        var = ncid.createVariable(name, "i2", ("time", "range"), fill_value=-32768)
-        var.standard_name = standard_names[symbol]
-        var.long_name = long_names[symbol]
-        var.units = units[symbol]
-        var.scale_factor = scale_factors[symbol]
-        var.add_offset = np.single(0.0)
-        var.coordinates = "time range"
-        # P should always in degrees 0-360
-        if symbol == "P":
-            pmax = np.max(sweep["products"]["P"])
-            if pmax > 0.0 and pmax < 3.142:
-                data = data * 180.0 / np.pi
-        var[:] = data
-
-    _define_and_set_data("Z", "DBZ")
-    _define_and_set_data("V", "VEL")
-    _define_and_set_data("W", "WIDTH")
-    _define_and_set_data("D", "ZDR")
-    _define_and_set_data("P", "PHIDP")
-    _define_and_set_data("R", "RHOHV")
+    _define_products(ncid, symbols, **encoding)
 
     r_calib_dbz_correction = ncid.createVariable("r_calib_dbz_correction", "f4", ("r_calib",))
     r_calib_dbz_correction.long_name = "calibrated_radar_dbz_correction"
@@ -203,9 +491,143 @@ def _write_cf1(ncid, sweep, string_length=32, period=20.0):
     ncid.comment = f"Radar Data"
     ncid.instrument_name = ""
     ncid.time_coverage_start = start_timestring
-    ncid.time_coverage_end = end_timestring
+    ncid.time_coverage_end = start_timestring
     ncid.start_datetime = start_timestring
-    ncid.end_datetime = end_timestring
+    ncid.end_datetime = start_timestring
     ncid.created = datetime.datetime.now(utc).strftime(f"%Y-%m-%dT%H:%M:%SZ")
     ncid.platform_is_mobile = "false"
     ncid.ray_times_increase = "true"
+
+
+class SweepWriter:
+    """
+    Writes a CF-Radial sweep as the rays arrive, the time dimension is unlimited
+
+    Rays are kept until there are flush of them, then written as one chunk of the products.
+    After every write, sweep_end_ray_index and time_coverage_end cover the rays so far and
+    the file is synced, so a partial sweep can be read while it grows. close() writes the
+    remaining rays. HDF5 locks a file that is open for writing, so readers in other processes
+    need HDF5_USE_FILE_LOCKING=FALSE in their environment.
+
+    with radar.SweepWriter("output.nc", sweep, symbols=["Z", "V"], packing="u1") as writer:
+        for azimuths, elevations, products in batches:
+            writer.append(azimuths, elevations, products)
+    """
+
+    def __init__(self, filename: str, sweep: dict, symbols=None, flush: int = 64, string_length=32, **encoding):
+        """
+        :param filename: Path of the output, must end with .nc
+        :param sweep: Metadata of the sweep as from read(), i.e., time, latitude, longitude, sweepElevation,
+                      ranges, prf, etc. Rays and products are not needed
+        :param symbols: Products to write, default = None for the products of sweep
+        :param flush: Number of rays of each write, also the chunk size along rays unless chunks is given
+        :param encoding: Encoding options of write()
+        """
+        _check_encoding(encoding)
+        if not filename.endswith(".nc"):
+            raise ValueError("Filename must end with .nc")
+        if symbols is None:
+            symbols = list(sweep.get("products", {}))
+        if os.path.dirname(filename):
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+        encoding.setdefault("chunks", flush)
+        self.filename = filename
+        self.sweep = sweep
+        self.symbols = [symbol for symbol in symbols if symbol in VARIABLE_NAMES]
+        self.flush = flush
+        self.string_length = string_length
+        self.encoding = encoding
+        self.count = 0
+        self.end_time = sweep["time"]
+        self._gate_count = sweep["ranges"].shape[0]
+        self._pending = []
+        self._pending_count = 0
+        self._radians = None
+        self.ncid = Dataset(filename, "w", format="NETCDF4")
+        try:
+            _define_cf1(self.ncid, sweep, self.symbols, None, string_length=string_length, **encoding)
+            _set_end(self.ncid, self.end_time, 0, string_length)
+        except Exception:
+            self.ncid.close()
+            raise
+        logger.info(f"Writing {filename}...")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def closed(self) -> bool:
+        return self.ncid is None
+
+    def append(self, azimuths, elevations, products: dict, times=None):
+        """
+        Adds a ray or a batch of rays
+
+        :param azimuths: Azimuth of each ray in degrees
+        :param elevations: Elevation of each ray in degrees, or one for all
+        :param products: {symbol: values of shape (rays, gates)}, or (gates,) for one ray, missing
+                         symbols are written as invalid gates
+        :param times: Seconds since the sweep time of each ray, default = None for now
+        """
+        if self.closed:
+            raise ValueError(f"{self.filename} is closed")
+        azimuths = np.atleast_1d(np.asarray(azimuths, dtype=np.float32))
+        count = len(azimuths)
+        elevations = np.broadcast_to(np.asarray(elevations, dtype=np.float32), (count,))
+        if times is None:
+            times = datetime.datetime.now(utc).timestamp() - self.sweep["time"]
+        times = np.broadcast_to(np.asarray(times, dtype=np.float64), (count,))
+        batch = {}
+        for symbol in self.symbols:
+            value = products.get(symbol)
+            if value is None:
+                batch[symbol] = np.full((count, self._gate_count), np.nan, dtype=np.float32)
+                continue
+            value = np.asanyarray(value).reshape(count, -1)
+            if value.shape[1] != self._gate_count:
+                raise ValueError(f"Product {symbol} has {value.shape[1]} gates, expected {self._gate_count}")
+            batch[symbol] = value
+        self._pending.append((azimuths, elevations, times, batch))
+        self._pending_count += count
+        if self._pending_count >= self.flush:
+            self._write(self._pending_count // self.flush * self.flush)
+
+    def _write(self, count):
+        azimuths = np.concatenate([item[0] for item in self._pending])
+        elevations = np.concatenate([item[1] for item in self._pending])
+        times = np.concatenate([item[2] for item in self._pending])
+        products = {s: np.ma.concatenate([item[3][s] for item in self._pending]) for s in self.symbols}
+        codecs = self.sweep.get("codecs", {})
+        # Phase is converted from radians or not for the whole sweep, decided on the first valid gates
+        if self._radians is None and "P" in products:
+            values, mask = _get_values_and_mask(products["P"][:count], codecs.get("P"))
+            if not mask.all():
+                self._radians = _is_radians(values, mask)
+        rays = slice(self.count, self.count + count)
+        _write_rays(self.ncid, self.sweep, self.count, azimuths[:count], elevations[:count], times[:count])
+        written = {symbol: value[:count] for symbol, value in products.items()}
+        _write_products(self.ncid, written, codecs, rays=rays, radians=self._radians, **self.encoding)
+        self.count += count
+        self.end_time = max(self.end_time, self.sweep["time"] + float(times[:count].max()))
+        _set_end(self.ncid, self.end_time, self.count, self.string_length)
+        self.ncid.sync()
+        rest = {symbol: value[count:] for symbol, value in products.items()}
+        self._pending = [(azimuths[count:], elevations[count:], times[count:], rest)] if count < len(azimuths) else []
+        self._pending_count = len(azimuths) - count
+
+    def close(self):
+        """
+        Writes the remaining rays and closes the file
+        """
+        if self.closed:
+            return
+        try:
+            if self._pending_count:
+                self._write(self._pending_count)
+        finally:
+            self.ncid.close()
+            self.ncid = None
+        logger.info(f"Finished writing {self.filename}.")
@@ -0,0 +1,60 @@
+import os
+import sys
+import shutil
+import numpy as np
+
+from test_read import TEST_FILE_FOLDER, download_data_if_not_exists
+
+import src.radar as radar
+
+from src.radar import convert
+
+TEST_VOLUME = os.path.join(TEST_FILE_FOLDER, "KTLX20250217_204640_V06")
+
+
+def _main(monkeypatch, *args):
+    # The exit status of radar-convert, 0 when main() returns
+    monkeypatch.setattr(sys, "argv", ["radar-convert", "-j", "1", *args])
+    try:
+        convert.main()
+    except SystemExit as e:
+        return e.code
+    return 0
+
+
+def test_convert(tmp_path, monkeypatch):
+    """
+    Test converting a volume, the outputs are named by sweep index and skipped when up to date
+    """
+    download_data_if_not_exists()
+
+    source = os.path.join(tmp_path, os.path.basename(TEST_VOLUME))
+    shutil.copy(TEST_VOLUME, source)
+    folder = os.path.join(tmp_path, "cfradial")
+    assert _main(monkeypatch, "-s", "ZV", "-o", folder, source) == 0
+    sweeps = list(radar.iter_volume(source, symbols=["Z", "V"], want_index=True))
+    outputs = sorted(os.listdir(folder))
+    assert outputs == [f"KTLX20250217_204640_V06-{index:02d}.nc" for index, _ in sweeps]
+    for (index, sweep), output in zip(sweeps, outputs):
+        data = radar.read(os.path.join(folder, output))
+        assert data["sweepElevation"] == sweep["sweepElevation"]
+        assert data["products"].keys() == sweep["products"].keys()
+        for symbol, value in sweep["products"].items():
+            assert np.ma.max(np.ma.abs(data["products"][symbol] - value)) <= 0.005 + 1.0e-4
+
+    # Up to date, nothing is written unless forced
+    assert convert.is_up_to_date(source, folder)
+    mtimes = [os.path.getmtime(os.path.join(folder, output)) for output in outputs]
+    assert _main(monkeypatch, "-o", folder, source) == 0
+    assert [os.path.getmtime(os.path.join(folder, output)) for output in outputs] == mtimes
+    assert _main(monkeypatch, "-f", "-s", "ZV", "-o", folder, source) == 0
+    assert sorted(os.listdir(folder)) == outputs
+    assert os.path.getmtime(os.path.join(folder, outputs[0])) >= mtimes[0]
+
+    # A source that fails leaves no outputs and sets the exit status
+    bad = os.path.join(tmp_path, "PX-20240529-150246-E4.0.tar.xz")
+    with open(bad, "wb") as f:
+        f.write(b"not a tar archive")
+    assert _main(monkeypatch, "-o", folder, bad) == 1
+    assert sorted(os.listdir(folder)) == outputs
+    print(f"Test convert {TEST_VOLUME} {len(outputs)} sweeps {radar.cosmetics.check}")
@@ -0,0 +1,372 @@
+import os
+import numpy as np
+
+from test_read import TEST_FILE_FOLDER, download_data_if_not_exists
+
+import src.radar as radar
+
+from src.radar import nexrad
+
+TEST_VOLUME = os.path.join(TEST_FILE_FOLDER, "KTLX20250217_204640_V06")
+
+
+def test_radials():
+    """
+    Test the column-wise type 31 decoder against the per-message decoder
+    """
+    download_data_if_not_exists()
+
+    vcp, radials, timestamp = nexrad.get_vcp_radials_timestamp(TEST_VOLUME, sweep_index=1)
+    _, msg31, _ = nexrad.get_vcp_msg31_timestamp(TEST_VOLUME, sweep_index=1)
+    assert len(radials) == len(msg31)
+    assert np.allclose(radials.azimuths, [m.head.azimuth_angle for m in msg31])
+    assert np.allclose(radials.elevations, [m.head.elevation_angle for m in msg31])
+    assert np.array_equal(radials.msecs, [m.head.timestamp_ms for m in msg31])
+    _, codes = radials.moment("REF")
+    for k in [0, len(msg31) // 2, len(msg31) - 1]:
+        values = msg31[k].data["REF"].values
+        assert np.array_equal(codes[k, : len(values)], values)
+    print(f"Test radials {TEST_VOLUME} {radar.cosmetics.check}")
+
+
+def test_index(tmp_path):
+    """
+    Test reading through a persistent index
+    """
+    download_data_if_not_exists()
+
+    folder = str(tmp_path)
+    sweep = radar.read(TEST_VOLUME, sweep_index=1)
+    for _ in range(2):
+        indexed = radar.read(TEST_VOLUME, sweep_index=1, index=folder)
+        assert np.allclose(sweep["azimuths"], indexed["azimuths"])
+        assert np.ma.allequal(sweep["products"]["Z"], indexed["products"]["Z"])
+    assert len(os.listdir(folder)) == 1
+    print(f"Test index {TEST_VOLUME} {radar.cosmetics.check}")
+
+
+def test_read_volume():
+    """
+    Test reading all sweeps at once against reading them one at a time
+    """
+    download_data_if_not_exists()
+
+    sweeps = radar.read_volume(TEST_VOLUME, sweeps=[0, 1])
+    for k, sweep in enumerate(sweeps):
+        single = radar.read(TEST_VOLUME, sweep_index=k)
+        assert sweep["sweepElevation"] == single["sweepElevation"]
+        assert np.allclose(sweep["azimuths"], single["azimuths"])
+        assert sweep["products"].keys() == single["products"].keys()
+        for symbol, value in sweep["products"].items():
+            assert np.ma.allequal(value, single["products"][symbol])
+    print(f"Test read_volume {TEST_VOLUME} {radar.cosmetics.check}")
+
+
+def test_raw():
+    """
+    Test the native codes and their lookup tables against the float values
+    """
+    download_data_if_not_exists()
+
+    sweep = radar.read(TEST_VOLUME, sweep_index=1, u8=True)
+    codes = radar.read(TEST_VOLUME, sweep_index=1, raw=True, u8=True)
+    assert sweep["products"].keys() == codes["products"].keys()
+    for symbol, value in sweep["products"].items():
+        raw = codes["products"][symbol]
+        assert raw.dtype.kind == "u"
+        values = radar.raw2val(raw, codes["codecs"][symbol])
+        assert np.array_equal(np.isnan(values), np.ma.getmaskarray(value))
+        assert np.allclose(values[~np.isnan(values)], value.compressed(), atol=1.0e-4)
+        assert np.abs(codes["u8"][symbol].astype(int) - sweep["u8"][symbol]).max() <= 1
+    print(f"Test raw {TEST_VOLUME} {radar.cosmetics.check}")
+
+
+def _assert_same_radials(radials, expected):
+    assert len(radials) == len(expected)
+    assert np.array_equal(radials.azimuths, expected.azimuths)
+    assert np.array_equal(radials.elevations, expected.elevations)
+    assert np.array_equal(radials.msecs, expected.msecs)
+    for name in nexrad.MOMENT_SYMBOLS:
+        _, codes = radials.moment(name)
+        _, expected_codes = expected.moment(name)
+        assert (codes is None) == (expected_codes is None), name
+        if codes is not None:
+            assert np.array_equal(codes, expected_codes), name
+
+
+def test_sweep_records(monkeypatch):
+    """
+    Test decompressing only the records of each sweep against decompressing the entire volume
+    """
+    download_data_if_not_exists()
+
+    vcp, radials = nexrad._vcp_sweeps_from_blob(nexrad._blob_from_file(TEST_VOLUME))
+
+    def fail(*args, **kwargs):
+        raise AssertionError("The entire volume should not be decompressed")
+
+    monkeypatch.setattr(nexrad, "_blob_from_file", fail)
+    for k in range(len(vcp.data)):
+        _, selected, _ = nexrad.get_vcp_sweeps_timestamp(TEST_VOLUME, [k])
+        assert list(selected) == [k]
+        _assert_same_radials(selected[k], radials[k])
+    print(f"Test sweep records {TEST_VOLUME} {radar.cosmetics.check}")
+
+
+def test_sweep_records_fallback(monkeypatch):
+    """
+    Test falling back to decompressing the entire volume when the radial counts do not match the VCP
+    """
+    download_data_if_not_exists()
+
+    vcp, radials = nexrad._vcp_sweeps_from_blob(nexrad._blob_from_file(TEST_VOLUME))
+
+    # One record short, so the first sweep comes up 120 radials short
+    read_spans = nexrad._read_spans
+
+    def short(file, spans):
+        return read_spans(file, spans[:-1] if len(spans) > 1 else spans)
+
+    monkeypatch.setattr(nexrad, "_read_spans", short)
+    blob_from_file = nexrad._blob_from_file
+    calls = []
+
+    def counted(*args, **kwargs):
+        calls.append(args)
+        return blob_from_file(*args, **kwargs)
+
+    monkeypatch.setattr(nexrad, "_blob_from_file", counted)
+    _, selected, _ = nexrad.get_vcp_sweeps_timestamp(TEST_VOLUME)
+    assert len(calls) == 1
+    assert list(selected) == list(range(len(vcp.data)))
+    for k, expected in radials.items():
+        _assert_same_radials(selected[k], expected)
+    print(f"Test sweep records fallback {TEST_VOLUME} {radar.cosmetics.check}")
+
+
+def test_sweep_records_shifted(monkeypatch):
+    """
+    Test falling back when the records of a sweep are another sweep with the same radial count, and negative indices
+    """
+    download_data_if_not_exists()
+
+    vcp, radials = nexrad._vcp_sweeps_from_blob(nexrad._blob_from_file(TEST_VOLUME))
+    nrays = nexrad._nrays_from_vcp(vcp)
+    records = [n // nexrad.RADIALS_PER_RECORD for n in nrays]
+
+    # The records of sweep 1 are shifted by a whole sweep, the start of sweep 2 has as many radials
+    record_slices_from_vcp = nexrad._record_slices_from_vcp
+
+    def shifted(vcp):
+        slices = record_slices_from_vcp(vcp)
+        slices[1] = slice(slices[1].start + records[1], slices[1].stop + records[1])
+        return slices
+
+    monkeypatch.setattr(nexrad, "_record_slices_from_vcp", shifted)
+    assert nrays[2] >= nrays[1]
+    _, selected, _ = nexrad.get_vcp_sweeps_timestamp(TEST_VOLUME, [1])
+    _assert_same_radials(selected[1], radials[1])
+    assert np.all(selected[1].elevation_numbers == 2)
+    for sweeps in [[-1], [0, -2]]:
+        try:
+            nexrad.get_vcp_sweeps_timestamp(TEST_VOLUME, sweeps)
+        except ValueError:
+            continue
+        raise AssertionError(f"sweeps = {sweeps} did not raise a ValueError")
+    print(f"Test sweep records shifted {TEST_VOLUME} {radar.cosmetics.check}")
+
+
+def test_workers():
+    """
+    Test decompressing with several threads against one
+    """
+    download_data_if_not_exists()
+
+    assert nexrad._blob_from_file(TEST_VOLUME, workers=4) == nexrad._blob_from_file(TEST_VOLUME)
+    for sweep_index in range(2):
+        single = radar.read(TEST_VOLUME, sweep_index=sweep_index)
+        threaded = radar.read(TEST_VOLUME, sweep_index=sweep_index, workers=4)
+        assert np.array_equal(threaded["azimuths"], single["azimuths"])
+        assert threaded["products"].keys() == single["products"].keys()
+        for symbol, value in threaded["products"].items():
+            assert np.array_equal(np.ma.getmaskarray(value), np.ma.getmaskarray(single["products"][symbol]))
+            assert np.ma.allequal(value, single["products"][symbol])
+    for threaded, single in zip(radar.read_volume(TEST_VOLUME, workers=4), radar.read_volume(TEST_VOLUME)):
+        for symbol, value in threaded["products"].items():
+            assert np.ma.allequal(value, single["products"][symbol])
+    print(f"Test workers {TEST_VOLUME} {radar.cosmetics.check}")
+
+
+def test_moments():
+    """
+    Test decoding only the requested moments against decoding all of them
+    """
+    download_data_if_not_exists()
+
+    _, msg31, _ = nexrad.get_vcp_msg31_timestamp(TEST_VOLUME, sweep_index=1)
+    _, only, _ = nexrad.get_vcp_msg31_timestamp(TEST_VOLUME, sweep_index=1, symbols=["Z"])
+    assert len(only) == len(msg31)
+    others = set(nexrad.MOMENT_SYMBOLS) - {"REF"}
+    assert others & set(msg31[0].data)
+    for message, full in zip(only, msg31):
+        assert "REF" in message.data
+        assert not others & set(message.data)
+        # The other blocks are decoded as before
+        assert {"VOL", "ELV", "RAD"} <= set(message.data)
+        assert np.array_equal(message.data["REF"].values, full.data["REF"].values)
+        assert message.data["REF"].scale == full.data["REF"].scale
+        assert message.data["REF"].offset == full.data["REF"].offset
+    sweep = radar.read(TEST_VOLUME, sweep_index=1, symbols=["Z"])
+    single = radar.read(TEST_VOLUME, sweep_index=1)
+    assert list(sweep["products"]) == ["Z"]
+    assert len(single["products"]) > 1
+    assert np.array_equal(np.ma.getmaskarray(sweep["products"]["Z"]), np.ma.getmaskarray(single["products"]["Z"]))
+    assert np.ma.allequal(sweep["products"]["Z"], single["products"]["Z"])
+    print(f"Test moments {TEST_VOLUME} {radar.cosmetics.check}")
+
+
+def test_views():
+    """
+    Test that the codes are read-only views of the decompressed buffer and the products are not views
+    """
+    download_data_if_not_exists()
+
+    vcp, radials, timestamp = nexrad.get_vcp_radials_timestamp(TEST_VOLUME, sweep_index=1)
+    _, msg31, _ = nexrad.get_vcp_msg31_timestamp(TEST_VOLUME, sweep_index=1)
+    blob = np.frombuffer(radials.blob, dtype=np.uint8)
+    _, codes = radials.moment("REF")
+    assert np.shares_memory(codes, blob)
+    assert not codes.flags.writeable
+    for raw in [False, True]:
+        sweep = radar.sweep_from_radials(vcp, radials, timestamp, 1, raw=raw)
+        for symbol, value in sweep["products"].items():
+            assert not np.shares_memory(np.ma.getdata(value), blob), symbol
+            assert np.ma.getdata(value).flags.writeable
+    # Values against the per-message decoder
+    sweep = radar.sweep_from_radials(vcp, radials, timestamp, 1)
+    gates = len(sweep["ranges"])
+    for k in [0, len(msg31) // 2, len(msg31) - 1]:
+        block = msg31[k].data["REF"]
+        codes = block.values[:gates]
+        values = np.ma.array((codes - np.float32(block.offset)) / np.float32(block.scale), mask=codes <= 1)
+        assert np.array_equal(np.ma.getmaskarray(sweep["products"]["Z"][k]), np.ma.getmaskarray(values))
+        assert np.ma.allclose(sweep["products"]["Z"][k], values)
+    print(f"Test views {TEST_VOLUME} {radar.cosmetics.check}")
+
+
+def _strip(folder):
+    """
+    Splits the test volume into the -S / -I / -E chunks of a stripped volume, one LDM record each
+    """
+    with open(TEST_VOLUME, "rb") as fid:
+        content = fid.read()
+    spans = nexrad._record_spans(TEST_VOLUME)
+    files = []
+    for k, (offset, count) in enumerate(spans):
+        flag = "S" if k == 0 else ("E" if k == len(spans) - 1 else "I")
+        chunk = content[offset - nexrad.LDM_CONTROL_WORD_SIZE : offset + count]
+        if flag == "S":
+            chunk = content[: nexrad.VOLUME_HEADER_SIZE] + chunk
+        file = os.path.join(folder, f"KTLX-20250217-204640-001-{k + 1}-{flag}")
+        with open(file, "wb") as fid:
+            fid.write(chunk)
+        files.append(file)
+    return files
+
+
+def _assemble(files, **kwargs):
+    assembler = radar.ChunkAssembler(**kwargs)
+    return sum([assembler.add(file) for file in files], [])
+
+
+def _assert_same_sweeps(sweeps, expected):
+    assert len(sweeps) == len(expected)
+    for sweep, single in zip(sweeps, expected):
+        assert sweep["sweepElevation"] == single["sweepElevation"]
+        assert np.array_equal(sweep["azimuths"], single["azimuths"])
+        assert np.array_equal(sweep["elevations"], single["elevations"])
+        assert sweep["products"].keys() == single["products"].keys()
+        for symbol, value in sweep["products"].items():
+            assert np.array_equal(np.ma.getmaskarray(value), np.ma.getmaskarray(single["products"][symbol]))
+            assert np.ma.allequal(value, single["products"][symbol])
+
+
+def test_assembler(tmp_path):
+    """
+    Test assembling the chunks of a stripped volume against reading the volume
+    """
+    download_data_if_not_exists()
+
+    files = _strip(str(tmp_path))
+    count = len(nexrad.get_vcp_sweeps_timestamp(TEST_VOLUME)[0].data)
+    expected = [radar.read(TEST_VOLUME, sweep_index=k) for k in range(count)]
+    sweeps = _assemble(files)
+    _assert_same_sweeps(sweeps, expected)
+    assert [sweep["time"] for sweep in sweeps] == [single["time"] for single in expected]
+    # The content of the chunks instead of the paths, the time is from the volume header
+    contents = []
+    for file in files:
+        with open(file, "rb") as fid:
+            contents.append(fid.read())
+    sweeps = _assemble(contents)
+    _assert_same_sweeps(sweeps, expected)
+    assert all(sweep["time"] == nexrad._timestamp_from_volume_header(contents[0]) for sweep in sweeps)
+    print(f"Test assembler {TEST_VOLUME} {radar.cosmetics.check}")
+
+
+def test_assembler_partial(tmp_path):
+    """
+    Test assembling a partial volume, the first sweep and the first record of the second sweep
+    """
+    download_data_if_not_exists()
+
+    files = _strip(str(tmp_path))
+    first = radar.read(TEST_VOLUME, sweep_index=0)
+    second = radar.read(TEST_VOLUME, sweep_index=1)
+    records = len(first["azimuths"]) // nexrad.RADIALS_PER_RECORD
+    files = files[: records + 2]
+    _assert_same_sweeps(_assemble(files), [first])
+    sweeps = _assemble(files, partial=True)
+    assert [sweep.get("partial", False) for sweep in sweeps] == [True] * (records - 1) + [False, True]
+    for sweep in sweeps[: records - 1]:
+        count = len(sweep["azimuths"])
+        assert np.array_equal(sweep["azimuths"], first["azimuths"][:count])
+    _assert_same_sweeps(sweeps[-2:-1], [first])
+    count = len(sweeps[-1]["azimuths"])
+    assert count == nexrad.RADIALS_PER_RECORD
+    assert np.array_equal(sweeps[-1]["azimuths"], second["azimuths"][:count])
+    assert np.ma.allequal(sweeps[-1]["products"]["Z"], second["products"]["Z"][:count])
+    print(f"Test assembler partial {TEST_VOLUME} {radar.cosmetics.check}")
+
+
+def test_assembler_order(tmp_path):
+    """
+    Test assembling chunks that arrive out of order or more than once
+    """
+    download_data_if_not_exists()
+
+    files = _strip(str(tmp_path))
+    count = len(nexrad.get_vcp_sweeps_timestamp(TEST_VOLUME)[0].data)
+    expected = [radar.read(TEST_VOLUME, sweep_index=k) for k in range(count)]
+    # The -S chunk after some radials, then two chunks of the first sweep swapped
+    late = files[1:3] + files[:1] + files[3:]
+    late[3], late[4] = late[4], late[3]
+    _assert_same_sweeps(_assemble(late), expected)
+    # A chunk of the first sweep again, in the middle of the sweep and after the volume
+    twice = files[:5] + files[4:] + files[4:5]
+    _assert_same_sweeps(_assemble(twice), expected)
+    # The -S chunk again in raw bytes does not start a new volume
+    assembler, sweeps = radar.ChunkAssembler(), []
+    for file in files[:3] + files[:1] + files[3:]:
+        with open(file, "rb") as fid:
+            sweeps += assembler.add(fid.read())
+    _assert_same_sweeps(sweeps, expected)
+    print(f"Test assembler order {TEST_VOLUME} {radar.cosmetics.check}")
+
+
+# Example usage
+if __name__ == "__main__":
+
+    test_radials()
+    test_read_volume()
+    test_raw()
@@ -1,5 +1,10 @@
 import os
+import pickle
+import tarfile
+import tempfile
 import blib
+import netCDF4
+import numpy as np
 import urllib.request
 
 TEST_FILE_FOLDER = "data"
@@ -58,7 +63,500 @@ def test_read():
         print(f"Test reading file {file} {cross if data is None else check}")
 
 
+def test_read_nan():
+    """
+    Test reading products as float32 arrays with NaN against masked arrays
+    """
+    download_data_if_not_exists()
+
+    check = blib.cosmetics.check
+
+    for file in TEST_FILES:
+        file = os.path.join(TEST_FILE_FOLDER, file)
+        data = radar.read(file, u8=True)
+        nan = radar.read(file, u8=True, masked=False)
+        for symbol, value in nan["products"].items():
+            assert not np.ma.isMaskedArray(value) and value.dtype == np.float32
+            expected = np.ma.filled(np.ma.asarray(data["products"][symbol], dtype=np.float32), np.nan)
+            assert np.array_equal(value, expected, equal_nan=True)
+            assert np.array_equal(nan["u8"][symbol], data["u8"][symbol])
+        print(f"Test reading NaN products {file} {check}")
+
+
+def test_read_window():
+    """
+    Test reading a window of rays and gates against slicing the whole sweep
+    """
+    download_data_if_not_exists()
+
+    check = blib.cosmetics.check
+
+    for file in TEST_FILES:
+        file = os.path.join(TEST_FILE_FOLDER, file)
+        data = radar.read(file)
+        window = radar.read(file, max_range=30000.0, azimuth_range=(350.0, 10.0))
+        gates = data["ranges"] <= 30000.0
+        rays = np.mod(data["azimuths"] - 350.0, 360.0) <= 20.0
+        assert np.array_equal(window["ranges"], data["ranges"][gates])
+        assert np.array_equal(window["azimuths"], data["azimuths"][rays])
+        assert np.array_equal(window["elevations"], data["elevations"][rays])
+        for symbol, value in data["products"].items():
+            assert np.ma.allequal(window["products"][symbol], value[rays][:, gates])
+        print(f"Test reading a window of file {file} {check}")
+
+
+def test_read_window_wds():
+    """
+    Test reading a window of WDSS-II PhiDP in degrees, which is not taken for radians from the values in the window
+    """
+    check = blib.cosmetics.check
+
+    values = np.tile(np.linspace(2.0, 180.0, 50, dtype=np.float32), (360, 1))
+    with tempfile.TemporaryDirectory() as folder:
+        file = os.path.join(folder, "sweep.nc")
+        with netCDF4.Dataset(file, "w") as ncid:
+            for key, value in [("TypeName", "PhiDP"), ("DataType", "RadialSet"), ("CreatedBy", "test")]:
+                ncid.setncattr(key, value)
+            for key, value in [("Time", 1716994966), ("Latitude", 35.2), ("Longitude", -97.4), ("Elevation", 4.0)]:
+                ncid.setncattr(key, value)
+            for key, value in [("PRF-value", 1000.0), ("RangeToFirstGate", 0.0), ("GateSize", 150.0)]:
+                ncid.setncattr(key, value)
+            ncid.createDimension("Azimuth", 360)
+            ncid.createDimension("Gate", 50)
+            ncid.createVariable("Azimuth", "f4", ("Azimuth",))[:] = np.arange(360, dtype=np.float32) + 0.5
+            ncid.createVariable("Elevation", "f4", ("Azimuth",))[:] = np.full(360, 4.0, dtype=np.float32)
+            ncid.createVariable("PhiDP", "f4", ("Azimuth", "Gate"))[:] = values
+        data = radar.read(file)
+        assert np.ma.allclose(data["products"]["P"], values)
+        for window in [{"gate_slice": (0, 1)}, {"gate_slice": (0, 1), "azimuth_range": (350.0, 10.0)}]:
+            part = radar.read(file, **window)
+            rays = np.isin(data["azimuths"], part["azimuths"])
+            assert np.ma.allequal(part["products"]["P"], data["products"]["P"][rays, :1])
+    print(f"Test reading a window of WDSS-II PhiDP {check}")
+
+
+def test_iter_volume():
+    """
+    Test iterating over the sweeps of CF-Radial volumes, each sweep is the same as read() with sweep_index
+    """
+    download_data_if_not_exists()
+
+    check = blib.cosmetics.check
+
+    for file in TEST_FILES:
+        if not file.startswith("cfrad"):
+            continue
+        file = os.path.join(TEST_FILE_FOLDER, file)
+        sweeps = list(radar.iter_volume(file))
+        for sweep_index, data in enumerate(sweeps):
+            single = radar.read(file, sweep_index=sweep_index)
+            assert data["sweepElevation"] == single["sweepElevation"]
+            assert np.array_equal(data["azimuths"], single["azimuths"])
+            for symbol, value in data["products"].items():
+                assert np.ma.allequal(value, single["products"][symbol])
+        print(f"Test iter_volume {file} {len(sweeps)} sweep(s) {check}")
+
+    # A per-symbol file is not a volume, it is read as one sweep with its siblings
+    file = os.path.join(TEST_FILE_FOLDER, "PX-20240529-150246-E4.0-Z.nc")
+    sweeps = list(radar.iter_volume(file))
+    single = radar.read(file)
+    assert len(sweeps) == 1 and sweeps[0]["products"].keys() == single["products"].keys()
+    for symbol, value in single["products"].items():
+        assert np.ma.allequal(value, sweeps[0]["products"][symbol])
+    print(f"Test iter_volume {file} {check}")
+
+
+def test_read_cache():
+    """
+    Test reading with the cache, the second read is a hit with the same read-only arrays
+    """
+    download_data_if_not_exists()
+
+    check = blib.cosmetics.check
+
+    radar.cache_clear()
+    for file in TEST_FILES:
+        file = os.path.join(TEST_FILE_FOLDER, file)
+        data = radar.read(file)
+        first = radar.read(file, cache=True)
+        second = radar.read(file, cache=True)
+        for symbol, value in data["products"].items():
+            assert second["products"][symbol] is first["products"][symbol]
+            assert not second["products"][symbol].flags.writeable
+            assert np.ma.allequal(value, second["products"][symbol])
+        print(f"Test reading with cache {file} {check}")
+    info = radar.cache_info()
+    assert info.hits == len(TEST_FILES) and info.misses == len(TEST_FILES)
+    radar.cache_clear()
+
+
+def test_read_compact():
+    """
+    Test reading into a Sweep, the products are planes of one cube and the sweep survives a pickle
+    """
+    download_data_if_not_exists()
+
+    check = blib.cosmetics.check
+
+    for file in TEST_FILES:
+        file = os.path.join(TEST_FILE_FOLDER, file)
+        data = radar.read(file)
+        sweep = radar.read(file, compact=True)
+        assert sweep.cube.flags.c_contiguous
+        for symbol, value in data["products"].items():
+            assert np.shares_memory(sweep["products"][symbol], sweep.cube)
+            assert np.array_equal(np.ma.filled(value, np.nan), sweep["products"][symbol], equal_nan=True)
+        same = pickle.loads(pickle.dumps(sweep, protocol=5))
+        assert same.symbols == sweep.symbols
+        assert np.array_equal(same.cube, sweep.cube, equal_nan=True)
+        print(f"Test reading into a Sweep {file} {check}")
+
+
+def test_quantize():
+    """
+    Test quantizing all products of a sweep into one preallocated cube
+    """
+    download_data_if_not_exists()
+
+    check = blib.cosmetics.check
+
+    x = np.array([np.nan, -1.0, 0.5, 0.7, 0.8, 0.93, 0.95, 1.2], dtype=np.float32)
+    assert np.array_equal(radar.val2ind(x, symbol="R"), [0, 1, 26, 37, 67, 106, 126, 255])
+    for file in TEST_FILES:
+        file = os.path.join(TEST_FILE_FOLDER, file)
+        data = radar.read(file, u8=True)
+        products = data["products"]
+        cube = np.empty((len(products), len(data["azimuths"]), len(data["ranges"])), dtype=np.uint8)
+        output = radar.quantize(products, out=cube)
+        for k, (symbol, value) in enumerate(output.items()):
+            assert np.shares_memory(value, cube[k])
+            assert np.array_equal(value, data["u8"][symbol])
+        print(f"Test quantizing {file} {check}")
+
+
+def test_read_siblings():
+    """
+    Test reading a sweep from per-symbol files, which are found through the listing of the folder
+    """
+    download_data_if_not_exists()
+
+    check = blib.cosmetics.check
+
+    file = os.path.join(TEST_FILE_FOLDER, "PX-20240529-150246-E4.0-Z.nc")
+    data = radar.read(file, symbols=["Z"])
+    with tempfile.TemporaryDirectory() as folder:
+        prefix = os.path.join(folder, "PX-20240529-150246-E4.0")
+        radar.write(f"{prefix}-Z.nc", data)
+        single = radar.read(f"{prefix}-Z.nc", symbols=["Z", "V"])
+        assert list(single["products"]) == ["Z"]
+        sweep = dict(data, products={"V": data["products"]["Z"]})
+        # A new file changes the folder, which is listed again
+        radar.write(f"{prefix}-V.nc", sweep)
+        merged = radar.read(f"{prefix}-Z.nc", symbols=["Z", "V"])
+        assert sorted(merged["products"]) == ["V", "Z"]
+    print(f"Test reading siblings of {file} {check}")
+
+
+def test_read_tar():
+    """
+    Test reading a tarball in one pass, with members out of order and a symbol missing
+    """
+    download_data_if_not_exists()
+
+    check = blib.cosmetics.check
+
+    file = os.path.join(TEST_FILE_FOLDER, "PX-20240529-150246-E4.0.tar.xz")
+    data = radar.read(file)
+    with tempfile.TemporaryDirectory() as folder:
+        archive = os.path.join(folder, "PX-20240529-150246-E4.0.tar.xz")
+        with tarfile.open(file) as source, tarfile.open(archive, "w:xz") as target:
+            members = {m.name[-4]: m for m in source.getmembers()}
+            for symbol in ["R", "V", "Z", "D", "P"]:
+                target.addfile(members[symbol], source.extractfile(members[symbol]))
+        sweep, tarinfo = radar.read(archive, want_tarinfo=True)
+        assert tarinfo == radar.read_tarinfo(archive)
+        assert sorted(tarinfo) == ["D", "P", "R", "V", "Z"]
+        assert sorted(sweep["products"]) == ["D", "P", "R", "V", "Z"]
+        for symbol, value in sweep["products"].items():
+            assert np.ma.allequal(value, data["products"][symbol])
+        # With tarinfo, the pass ends after the last wanted member
+        for symbols in [["Z"], ["W", "R"], ["V", "D"]]:
+            subset = radar.read(archive, symbols=symbols, tarinfo=tarinfo)
+            assert sorted(subset["products"]) == sorted(s for s in symbols if s in tarinfo)
+            for symbol, value in subset["products"].items():
+                assert np.ma.allequal(value, data["products"][symbol])
+    print(f"Test reading {file} {check}")
+
+
+def test_write_encoding():
+    """
+    Test writing with compression, chunks and packings, values come back within half a step
+    """
+    download_data_if_not_exists()
+
+    check = blib.cosmetics.check
+
+    file = os.path.join(TEST_FILE_FOLDER, "PX-20240529-150246-E4.0-Z.nc")
+    data = radar.read(file, symbols=["Z"])
+    z = data["products"]["Z"]
+    encodings = [
+        ({"complevel": 4, "chunks": 8}, 0.005),
+        ({"packing": "u1", "complevel": 4, "chunks": "sweep"}, 0.25),
+        ({"packing": "f4", "complevel": 1}, 0.0),
+    ]
+    with tempfile.TemporaryDirectory() as folder:
+        for k, (encoding, tolerance) in enumerate(encodings):
+            output = os.path.join(folder, f"sweep-{k}.nc")
+            radar.write(output, data, **encoding)
+            back = radar.read(output, cache=False)["products"]["Z"]
+            assert np.array_equal(np.ma.getmaskarray(back), np.ma.getmaskarray(z) | ~np.isfinite(z))
+            assert np.ma.max(np.ma.abs(back - z)) <= tolerance + 1.0e-4
+            print(f"Test writing {encoding} {os.path.getsize(output):,d} B {check}")
+        # A misspelled option is an error, not a silent default
+        output = os.path.join(folder, "sweep.nc")
+        writes = [
+            lambda: radar.write(output, data, complvl=9),
+            lambda: radar.write_bytes(data, complvl=9),
+            lambda: radar.write_volume(output, [data], complvl=9),
+            lambda: radar.SweepWriter(output, data, complvl=9),
+        ]
+        for write in writes:
+            try:
+                write()
+            except TypeError:
+                continue
+            raise AssertionError("complvl=9 did not raise a TypeError")
+        assert not os.path.exists(output)
+        print(f"Test writing with an unknown encoding option {check}")
+
+
+def test_read_packed_fill():
+    """
+    Test reading packed products without a declared fill, which are masked as netCDF4 masks them
+    """
+    download_data_if_not_exists()
+
+    check = blib.cosmetics.check
+
+    file = os.path.join(TEST_FILE_FOLDER, "PX-20240529-150246-E4.0-Z.nc")
+    data = radar.read(file, symbols=["Z"])
+    with tempfile.TemporaryDirectory() as folder:
+        for kind in ["u1", "i1", "i2"]:
+            output = os.path.join(folder, f"sweep-{kind}.nc")
+            radar.write(output, data)
+            with netCDF4.Dataset(output, "a") as ncid:
+                dimensions = ncid.variables["DBZ"].dimensions
+                ncid.renameVariable("DBZ", "DBZ_PACKED")
+                variable = ncid.createVariable("DBZ", kind, dimensions, fill_value=False)
+                variable.scale_factor = np.float32(0.5)
+                variable.add_offset = np.float32(-32.0)
+                info = np.iinfo(kind)
+                codes = np.array([info.min, info.min + 1, 0, 1, info.max - 1, info.max], dtype=kind)
+                variable.set_auto_maskandscale(False)
+                variable[:] = np.resize(codes, variable.shape)
+            with netCDF4.Dataset(output) as ncid:
+                expected = ncid.variables["DBZ"][:]
+            z = radar.read(output, symbols=["Z"])["products"]["Z"]
+            assert np.array_equal(np.ma.getmaskarray(z), np.ma.getmaskarray(expected))
+            assert np.ma.allclose(z, expected)
+            nan = radar.read(output, symbols=["Z"], masked=False)["products"]["Z"]
+            assert np.array_equal(nan, np.ma.filled(expected.astype(np.float32), np.nan), equal_nan=True)
+            print(f"Test reading packed {kind} without a fill {check}")
+
+
+def test_write_phidp():
+    """
+    Test writing PhiDP beyond the 327.67 degrees of 0.01-degree codes, which the offset of the i2 packing keeps
+    """
+    download_data_if_not_exists()
+
+    check = blib.cosmetics.check
+
+    file = os.path.join(TEST_FILE_FOLDER, "PX-20240529-150246-E4.0-Z.nc")
+    data = radar.read(file, symbols=["Z"])
+    z = data["products"]["Z"]
+    values = np.linspace(-100.0, 500.0, z.size, dtype=np.float32).reshape(z.shape)
+    p = np.ma.array(values, mask=np.ma.getmaskarray(z))
+    with tempfile.TemporaryDirectory() as folder:
+        output = os.path.join(folder, "sweep.nc")
+        radar.write(output, dict(data, products={"P": p}))
+        back = radar.read(output)["products"]["P"]
+        assert np.array_equal(np.ma.getmaskarray(back), np.ma.getmaskarray(p))
+        assert np.ma.max(back) > 327.67
+        assert np.ma.max(np.ma.abs(back - p)) <= 0.005 + 1.0e-4
+    print(f"Test writing PhiDP up to {np.ma.max(back):.2f} {check}")
+
+
+def test_write_native():
+    """
+    Test writing a native sweep, which is read back as views of a memory map
+    """
+    download_data_if_not_exists()
+
+    check = blib.cosmetics.check
+
+    file = os.path.join(TEST_FILE_FOLDER, "PX-20240529-150246-E4.0-Z.nc")
+    data = radar.read(file, symbols=["Z"], masked=False)
+    with tempfile.TemporaryDirectory() as folder:
+        output = os.path.join(folder, "PX-20240529-150246-E4.0.sweep")
+        radar.write(output, data, format="native")
+        sweep = radar.read(output, compact=True)
+        assert isinstance(sweep, radar.Sweep)
+        assert np.array_equal(sweep["products"]["Z"], data["products"]["Z"], equal_nan=True)
+        back = radar.read(output)
+        assert np.array_equal(np.ma.getmaskarray(back["products"]["Z"]), np.isnan(data["products"]["Z"]))
+        assert back["sweepElevation"] == data["sweepElevation"]
+        del sweep, back
+    # Views of a buffer are read-only, finite = True leaves the content of the caller as it is
+    data["products"]["Z"][:, :10] = np.nan
+    content = bytearray(radar.write_bytes(data, format="native"))
+    original = bytes(content)
+    for compact in [False, True]:
+        back = radar.read(content, finite=True, compact=compact)
+        assert not np.any(np.isnan(back["products"]["Z"]))
+        assert content == original
+    print(f"Test writing native {file} {check}")
+
+
+def test_write_bytes():
+    """
+    Test writing a sweep to memory and reading sources from memory
+    """
+    download_data_if_not_exists()
+
+    check = blib.cosmetics.check
+
+    file = os.path.join(TEST_FILE_FOLDER, "PX-20240529-150246-E4.0-Z.nc")
+    data = radar.read(file, symbols=["Z"])
+    for encoding in [{}, {"packing": "u1", "complevel": 4}, {"format": "native"}]:
+        content = radar.write_bytes(data, **encoding)
+        back = radar.read(content)
+        assert np.array_equal(np.ma.getmaskarray(back["products"]["Z"]), np.ma.getmaskarray(data["products"]["Z"]))
+        print(f"Test writing {encoding} to {len(content):,d} B {check}")
+    # Stripped NEXRAD files need the other files of the volume
+    files = ["BS1-20230616-020024-E6.4.txz", "cfrad.20150625_050022_PX1000_v35_s1.nc", "KTLX20250217_204640_V06"]
+    for file in files:
+        file = os.path.join(TEST_FILE_FOLDER, file)
+        with open(file, "rb") as fid:
+            data = radar.read(fid.read())
+        assert data["products"]
+        print(f"Test reading {file} from memory {check}")
+
+
+def test_sweep_writer():
+    """
+    Test streaming the rays of a sweep into a file, which is read back as it grows
+    """
+    download_data_if_not_exists()
+
+    check = blib.cosmetics.check
+
+    file = os.path.join(TEST_FILE_FOLDER, "PX-20240529-150246-E4.0-Z.nc")
+    data = radar.read(file, symbols=["Z"])
+    count = len(data["azimuths"])
+    with tempfile.TemporaryDirectory() as folder:
+        output = os.path.join(folder, "PX-20240529-150246-E4.0-Z.nc")
+        with radar.SweepWriter(output, data, flush=64) as writer:
+            for k in range(0, count, 50):
+                rays = slice(k, k + 50)
+                writer.append(data["azimuths"][rays], data["elevations"][rays], {"Z": data["products"]["Z"][rays]})
+        back = radar.read(output)
+        assert np.array_equal(back["azimuths"], data["azimuths"])
+        assert np.array_equal(np.ma.getmaskarray(back["products"]["Z"]), np.ma.getmaskarray(data["products"]["Z"]))
+        assert np.ma.allclose(back["products"]["Z"], data["products"]["Z"], atol=0.01)
+        with netCDF4.Dataset(output) as nc:
+            assert nc.dimensions["time"].isunlimited()
+            assert nc.variables["sweep_end_ray_index"][0] == count - 1
+    print(f"Test SweepWriter {file} {check}")
+
+
+def test_write_volume():
+    """
+    Test writing the sweeps of a volume to one file
+    """
+    download_data_if_not_exists()
+
+    check = blib.cosmetics.check
+
+    file = os.path.join(TEST_FILE_FOLDER, "KTLX20250217_204640_V06")
+    sweeps = radar.read_volume(file)
+    with tempfile.TemporaryDirectory() as folder:
+        output = os.path.join(folder, "KTLX20250217_204640_V06.nc")
+        radar.write_volume(output, sweeps)
+        with netCDF4.Dataset(output) as nc:
+            counts = [len(sweep["azimuths"]) for sweep in sweeps]
+            assert nc.dimensions["sweep"].size == len(sweeps)
+            assert list(nc.variables["sweep_end_ray_index"][:] + 1) == list(np.cumsum(counts))
+        for sweep, back in zip(sweeps, radar.read_volume(output)):
+            assert np.array_equal(back["azimuths"], sweep["azimuths"])
+            assert back["sweepElevation"] == np.float32(sweep["sweepElevation"])
+            for symbol, value in sweep["products"].items():
+                assert np.array_equal(np.ma.getmaskarray(back["products"][symbol]), np.ma.getmaskarray(value))
+                assert np.ma.allclose(back["products"][symbol], value, atol=0.01)
+    print(f"Test writing volume {file} {check}")
+
+
+def test_open():
+    """
+    Test the lazy handle against reading the whole sweep
+    """
+    download_data_if_not_exists()
+
+    check = blib.cosmetics.check
+
+    for file in TEST_FILES:
+        file = os.path.join(TEST_FILE_FOLDER, file)
+        data = radar.read(file)
+        with radar.open(file) as sweep:
+            assert sweep.keys() == data.keys()
+            assert sweep["time"] == data["time"]
+            assert list(sweep["products"]) == list(data["products"])
+            for symbol, value in data["products"].items():
+                assert not sweep["products"].is_loaded(symbol)
+                assert np.ma.allequal(sweep["products"][symbol], value)
+        assert sweep.closed
+        print(f"Test opening file {file} {check}")
+
+
+def test_read_many():
+    """
+    Test reading in a pool of processes against reading one at a time
+    """
+    download_data_if_not_exists()
+
+    check = blib.cosmetics.check
+
+    files = [os.path.join(TEST_FILE_FOLDER, file) for file in TEST_FILES]
+    output = list(radar.read_many(files, workers=2, ordered=True))
+    assert [path for path, _ in output] == files
+    for file, data in output:
+        single = radar.read(file)
+        assert data["products"].keys() == single["products"].keys()
+        for symbol, value in data["products"].items():
+            assert np.array_equal(np.ma.getmaskarray(value), np.ma.getmaskarray(single["products"][symbol]))
+            assert np.ma.allequal(value, single["products"][symbol])
+        print(f"Test read_many {file} {check}")
+
+
 # Example usage
 if __name__ == "__main__":
 
     test_read()
+    test_read_nan()
+    test_read_window()
+    test_read_window_wds()
+    test_iter_volume()
+    test_read_cache()
+    test_read_compact()
+    test_quantize()
+    test_read_siblings()
+    test_read_tar()
+    test_write_encoding()
+    test_read_packed_fill()
+    test_write_phidp()
+    test_write_native()
+    test_write_bytes()
+    test_sweep_writer()
+    test_write_volume()
+    test_open()
+    test_read_many()